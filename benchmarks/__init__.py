@@ -0,0 +1 @@
+# Local stand-ins and measurement helpers of the benchmarks (see benchmarks/pipelines.py)
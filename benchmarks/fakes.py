@@ -0,0 +1,108 @@
+# Local stand-ins for the Google Sheets and ElevenLabs HTTP APIs
+import contextlib
+import json
+import re
+from unittest import mock
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+
+SHEETS_HOST = 'sheets.googleapis.com'
+ELEVENLABS_HOST = 'api.elevenlabs.io'
+
+# Colors of the formatted runs in the fake sheet, cycled word by word
+RUN_COLORS = [
+    {'red': 1.0, 'green': 0.2, 'blue': 0.2},
+    {'red': 0.2, 'green': 0.4, 'blue': 1.0},
+    {'red': 1.0, 'green': 1.0, 'blue': 1.0},
+]
+
+
+def formatted_row(text, colored_words=3):
+    """
+    Sheets API rowData entry for ``text`` with the first ``colored_words`` words colored,
+    the way hook writers highlight the opening of a line.
+    """
+    runs = []
+    position = 0
+    for i, word in enumerate(text.split()[:colored_words]):
+        start = text.index(word, position)
+        runs.append({'startIndex': start, 'format': {'foregroundColor': RUN_COLORS[i % len(RUN_COLORS)]}})
+        position = start + len(word)
+    if runs and position < len(text):
+        runs.append({'startIndex': position, 'format': {}})
+    return {'values': [{'effectiveValue': {'stringValue': text}, 'textFormatRuns': runs}]}
+
+
+class FakeAPIAdapter(BaseAdapter):
+    """
+    requests transport adapter that answers the Sheets and ElevenLabs calls of the
+    pipelines from canned data, and refuses every other host so a benchmark never
+    reaches the network.
+
+    hook_texts: rows of the fake sheet
+    voiceovers: dict mapping each hook text to the MP3 bytes returned for it
+    """
+
+    def __init__(self, hook_texts, voiceovers):
+        super().__init__()
+        self.hook_texts = hook_texts
+        self.voiceovers = {voice_key(text): audio for text, audio in voiceovers.items()}
+        self.calls = {'sheets': 0, 'tts': 0}
+
+    def send(self, request, **kwargs):
+        url = urlparse(request.url)
+        if url.hostname == SHEETS_HOST:
+            self.calls['sheets'] += 1
+            if 'values:batchGet' in url.path:
+                body = {'valueRanges': [{'values': [[text] for text in self.hook_texts]}]}
+            else:
+                body = {'sheets': [{'data': [{'rowData': [formatted_row(text) for text in self.hook_texts]}]}]}
+            return self._response(request, 200, json.dumps(body).encode(), 'application/json')
+
+        if url.hostname == ELEVENLABS_HOST:
+            self.calls['tts'] += 1
+            voiceover = self.voiceovers.get(voice_key(json.loads(request.body)['text']))
+            if voiceover is None:
+                return self._response(request, 400, b'{"detail": "unknown text"}', 'application/json')
+            return self._response(request, 200, voiceover, 'audio/mpeg')
+
+        raise requests.exceptions.ConnectionError(f"Benchmarks don't reach {url.hostname}")
+
+    def close(self):
+        pass
+
+    @staticmethod
+    def _response(request, status_code, content, content_type):
+        response = requests.Response()
+        response.status_code = status_code
+        response.headers = CaseInsensitiveDict({
+            'Content-Type': content_type, 'Content-Length': str(len(content))
+        })
+        response._content = content
+        response._content_consumed = True
+        response.url = request.url
+        response.request = request
+        response.encoding = 'utf-8'
+        return response
+
+
+def voice_key(text):
+    """
+    Words of ``text`` as the pipeline sends them to ElevenLabs (punctuation removed).
+    """
+    text = text.replace('-', ' ').replace('"', ' ').replace("'", ' ')
+    return ' '.join(re.sub(r'[^\w\s]', '', text).split())
+
+
+@contextlib.contextmanager
+def fake_http_apis(hook_texts, voiceovers):
+    """
+    Route the pipelines' requests calls to a FakeAPIAdapter while the block runs.
+    Yields the adapter, whose ``calls`` counts the answered requests.
+    """
+    adapter = FakeAPIAdapter(hook_texts, voiceovers)
+    with mock.patch.object(requests.Session, 'get_adapter', lambda session, url: adapter):
+        yield adapter
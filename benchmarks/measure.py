@@ -0,0 +1,199 @@
+# Resource measurement, stage timing and baseline comparison of benchmark runs
+import contextlib
+import functools
+import importlib
+import json
+import os
+import resource
+import statistics
+import sys
+import threading
+import time
+from unittest import mock
+
+# Lower is better for these metrics, higher for the *_per_minute throughputs
+COST_METRICS = ('wall_seconds', 'cpu_seconds', 'peak_rss_bytes', 'peak_child_rss_bytes')
+
+
+class StageTimer:
+    """
+    Times calls to pipeline functions, grouped by stage name, from any thread.
+
+    Stages running concurrently (rows rendered in parallel, overlapping uploads) all
+    count their own time, so stage seconds can add up to more than the wall time.
+    """
+
+    def __init__(self):
+        self.stages = {}
+        self._lock = threading.Lock()
+
+    def wrap(self, stage, func):
+        @functools.wraps(func)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self._record(stage, time.perf_counter() - start)
+        return timed
+
+    def patch(self, stack, stage, target):
+        """
+        Time every call of ``target`` ('package.module.function' or
+        'package.module.Class.method') under ``stage`` until ``stack`` is closed.
+        Functions are patched where the pipeline looks them up.
+        """
+        owner_path, attribute = target.rsplit('.', 1)
+        owner = _resolve(owner_path)
+        stack.enter_context(
+            mock.patch.object(owner, attribute, self.wrap(stage, getattr(owner, attribute)))
+        )
+
+    def report(self):
+        with self._lock:
+            return {
+                stage: {
+                    'calls': len(durations),
+                    'seconds': round(sum(durations), 4),
+                    'max_seconds': round(max(durations), 4),
+                }
+                for stage, durations in sorted(self.stages.items())
+            }
+
+    def _record(self, stage, seconds):
+        with self._lock:
+            self.stages.setdefault(stage, []).append(seconds)
+
+
+def _resolve(path):
+    parts = path.split('.')
+    for split in range(len(parts), 0, -1):
+        try:
+            obj = importlib.import_module('.'.join(parts[:split]))
+        except ImportError:
+            continue
+        for name in parts[split:]:
+            obj = getattr(obj, name)
+        return obj
+    raise ImportError(path)
+
+
+class ResourceUsage:
+    """
+    Wall time, CPU time (this process and the ffmpeg processes it waited for) and peak
+    RSS of a measured block. Peak RSS is the high-water mark of the whole process, so
+    every scenario runs in a fresh process (see benchmarks.pipelines).
+    """
+
+    def __enter__(self):
+        self._wall = time.perf_counter()
+        self._cpu = self._cpu_seconds()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.wall_seconds = time.perf_counter() - self._wall
+        self.cpu_seconds = self._cpu_seconds() - self._cpu
+        self.peak_rss_bytes = _maxrss_bytes(resource.RUSAGE_SELF)
+        self.peak_child_rss_bytes = _maxrss_bytes(resource.RUSAGE_CHILDREN)
+
+    @staticmethod
+    def _cpu_seconds():
+        times = os.times()
+        return times.user + times.system + times.children_user + times.children_system
+
+    def report(self):
+        return {
+            'wall_seconds': round(self.wall_seconds, 4),
+            'cpu_seconds': round(self.cpu_seconds, 4),
+            'peak_rss_bytes': self.peak_rss_bytes,
+            'peak_child_rss_bytes': self.peak_child_rss_bytes,
+        }
+
+
+def _maxrss_bytes(who):
+    maxrss = resource.getrusage(who).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return maxrss if sys.platform == 'darwin' else maxrss * 1024
+
+
+def summarize(samples):
+    """
+    Median of every numeric metric over repeated runs of a scenario, with the samples.
+    """
+    summary = {}
+    for metric, value in samples[0].items():
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            summary[metric] = statistics.median(sample[metric] for sample in samples)
+    summary['samples'] = samples
+    return summary
+
+
+def compare(report, baseline, tolerance):
+    """
+    Compare the scenario summaries of ``report`` with ``baseline``.
+
+    A metric regresses when it is worse than the baseline by more than ``tolerance``
+    (a fraction, 0.1 = 10%). Scenarios run with a different configuration are skipped.
+    Returns (rows of {'scenario', 'metric', 'baseline', 'current', 'change', 'regression'},
+    list of skipped scenarios).
+    """
+    rows = []
+    skipped = []
+    for scenario, current in report['scenarios'].items():
+        previous = baseline.get('scenarios', {}).get(scenario)
+        if previous is None or previous.get('config') != current.get('config'):
+            skipped.append(scenario)
+            continue
+        for metric, value in current['summary'].items():
+            before = previous['summary'].get(metric)
+            if not isinstance(value, (int, float)) or not before:
+                continue
+            change = (value - before) / before
+            if metric in COST_METRICS or metric.endswith('_seconds'):
+                regression = change > tolerance
+            elif metric.endswith('_per_minute'):
+                regression = change < -tolerance
+            else:
+                continue
+            rows.append({
+                'scenario': scenario,
+                'metric': metric,
+                'baseline': before,
+                'current': value,
+                'change': round(change, 4),
+                'regression': regression,
+            })
+    return rows, skipped
+
+
+def print_comparison(rows, skipped, out=sys.stdout):
+    for scenario in skipped:
+        out.write(f"{scenario}: no baseline with the same configuration, not compared\n")
+    for row in rows:
+        flag = 'REGRESSION' if row['regression'] else ''
+        out.write(
+            f"{row['scenario']:<12} {row['metric']:<28} {row['baseline']:>14.4g} "
+            f"{row['current']:>14.4g} {row['change']:>+8.1%} {flag}\n"
+        )
+
+
+def load_json(path):
+    with open(path) as json_file:
+        return json.load(json_file)
+
+
+def write_json(path, data):
+    with open(path, 'w') as json_file:
+        json.dump(data, json_file, indent=2, sort_keys=True)
+        json_file.write('\n')
+
+
+@contextlib.contextmanager
+def patched_stages(timer, stages):
+    """
+    Time every (stage, target) pair of ``stages`` with ``timer`` while the block runs.
+    """
+    with contextlib.ExitStack() as stack:
+        for stage, target in stages:
+            timer.patch(stack, stage, target)
+        yield timer
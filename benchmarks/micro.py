@@ -0,0 +1,203 @@
+# Micro-benchmarks of the per-row fixed costs of the hooks render
+#
+# Times split_hook_text, process_text_format_runs, crop_to_aspect_ratio and
+# create_custom_text_clip for all four aspect ratios, short and long hooks and heavily
+# formatted color runs, and compares them with a stored baseline.
+#
+#   python -m benchmarks.micro                     # compare with benchmarks/baselines/micro.json
+#   python -m benchmarks.micro --update-baseline   # record the baseline on this machine
+#   python -m benchmarks.micro --filter crop
+#
+# Each case is warmed up, then timed with timeit (garbage collection off): the loop
+# count is calibrated so one repeat takes at least --min-time seconds, and the fastest
+# of --repeat repeats is the per-call figure compared with the baseline. The minimum is
+# the least disturbed by other load on the machine; the median is reported alongside.
+import argparse
+import fnmatch
+import logging
+import os
+import statistics
+import sys
+import timeit
+from datetime import datetime, timezone
+from pathlib import Path
+
+from .measure import load_json, write_json
+from .sources import HOOK_WORDS
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), 'baselines', 'micro.json')
+
+# Output sizes of the aspect ratio options, as in hooks.tools.processor.process
+ASPECT_RATIOS = {
+    'option1': (1080, 1080, 0),
+    'option2': (1080, 1350, 0),
+    'option3': (1080, 1920, 1),
+    'option4': (1920, 1080, 0),
+}
+
+RUN_COLORS = [(255, 51, 51), (51, 102, 255), (255, 255, 255), (0, 0, 0)]
+
+
+def hook_text(words, second_part_words=0):
+    text = ' '.join(HOOK_WORDS[i % len(HOOK_WORDS)] for i in range(words))
+    if second_part_words:
+        text += ' - ' + ' '.join(HOOK_WORDS[-1 - i % len(HOOK_WORDS)] for i in range(second_part_words))
+    return text
+
+
+def format_runs(text, every_word=True):
+    """
+    Sheets textFormatRuns for ``text``: one run per word when ``every_word``,
+    otherwise none.
+    """
+    if not every_word:
+        return []
+    runs = []
+    position = 0
+    for i, word in enumerate(text.split()):
+        start = text.index(word, position)
+        red, green, blue = RUN_COLORS[i % len(RUN_COLORS)]
+        runs.append({
+            'startIndex': start,
+            'format': {'foregroundColor': {'red': red / 255, 'green': green / 255, 'blue': blue / 255}},
+        })
+        position = start + len(word)
+    return runs
+
+
+HOOKS = {
+    'short': hook_text(6),
+    'long': hook_text(28, second_part_words=12),
+}
+
+
+def build_cases():
+    """
+    Return {case name: callable}; every callable runs one call of the helper under test.
+    """
+    from moviepy.editor import ColorClip
+
+    from hooks.tools.spreadsheet_extractor import process_text_format_runs
+    from hooks.tools.utils import split_hook_text
+    from hooks.tools.video_processors import create_custom_text_clip, crop_to_aspect_ratio
+
+    cases = {}
+    for length, text in HOOKS.items():
+        cases[f'split_hook_text[{length}]'] = lambda text=text: split_hook_text(text)
+        for formatting, every_word in (('plain', False), ('colored', True)):
+            runs = format_runs(text, every_word)
+            cases[f'process_text_format_runs[{length},{formatting}]'] = (
+                lambda text=text, runs=runs: process_text_format_runs(text, runs)
+            )
+
+    # A landscape phone upload; the crop includes rendering one frame, as the encoder would
+    source = ColorClip(size=(1280, 720), color=(40, 90, 160), duration=2)
+    for option, (width, height, _) in ASPECT_RATIOS.items():
+        cases[f'crop_to_aspect_ratio[{option}]'] = (
+            lambda width=width, height=height: crop_to_aspect_ratio(source, width, height).get_frame(0)
+        )
+
+    for length, text in HOOKS.items():
+        word_color_data = [process_text_format_runs(text, format_runs(text))]
+        for option, (width, height, is_tiktok) in ASPECT_RATIOS.items():
+            cases[f'create_custom_text_clip[{option},{length}]'] = (
+                lambda text=text, word_color_data=word_color_data, width=width, height=height, is_tiktok=is_tiktok:
+                create_custom_text_clip(
+                    text, width, height, (72, 90, 255), (255, 255, 255), None, word_color_data, is_tiktok
+                )
+            )
+    return cases
+
+
+def time_case(func, repeat, min_time):
+    """
+    Per-call seconds of ``func``: (fastest, median) over ``repeat`` timed repeats, and
+    the calibrated number of calls per repeat.
+    """
+    func()  # warm up caches, fonts and lazy imports
+    timer = timeit.Timer(func)
+    number = 1
+    while True:
+        elapsed = timer.timeit(number)
+        if elapsed >= min_time or number >= 1_000_000:
+            break
+        number *= 10 if elapsed < min_time / 10 else 2
+    per_call = [elapsed / number for elapsed in timer.repeat(repeat, number)]
+    return min(per_call), statistics.median(per_call), number
+
+
+def setup():
+    from django.conf import settings
+    if not settings.configured:
+        settings.configure(BASE_DIR=BASE_DIR)
+    # The helpers log at DEBUG on every call; records are still formatted but not
+    # written to the terminal, whose speed would otherwise show up in the timings
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(logging.StreamHandler(open(os.devnull, 'w')))
+    root.setLevel(logging.DEBUG)
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Micro-benchmarks of the hooks text and layout helpers")
+    parser.add_argument('--filter', default='*', help="glob over case names, e.g. 'crop*'")
+    parser.add_argument('--repeat', type=int, default=7)
+    parser.add_argument('--min-time', type=float, default=0.2, help="seconds per timed repeat")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--update-baseline', action='store_true', help="write the results as the baseline")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="allowed slowdown, 0.25 = 25%%")
+    parser.add_argument('--output', help="also write the results here")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    setup()
+    cases = {
+        name: func for name, func in build_cases().items()
+        if fnmatch.fnmatchcase(name, args.filter if '*' in args.filter else f'*{args.filter}*')
+    }
+
+    baseline = {}
+    if os.path.exists(args.baseline) and not args.update_baseline:
+        baseline = load_json(args.baseline).get('cases', {})
+    elif not args.update_baseline:
+        sys.stdout.write(f"No baseline at {args.baseline}, record one with --update-baseline\n")
+
+    results = {}
+    regressions = 0
+    for name, func in cases.items():
+        fastest, median, number = time_case(func, args.repeat, args.min_time)
+        results[name] = {'seconds': fastest, 'median_seconds': median, 'loops': number}
+        line = f"{name:<48} {fastest * 1e6:>12.1f}us  (median {median * 1e6:.1f}us, {number} loops)"
+        previous = baseline.get(name)
+        if previous:
+            change = (fastest - previous['seconds']) / previous['seconds']
+            line += f"  {change:+.1%}"
+            if change > args.tolerance:
+                line += " REGRESSION"
+                regressions += 1
+        sys.stdout.write(line + '\n')
+
+    report = {
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'repeat': args.repeat,
+        'min_time': args.min_time,
+        'cases': results,
+    }
+    if args.output:
+        write_json(args.output, report)
+    if args.update_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        if os.path.exists(args.baseline):
+            # Keep the cases that were filtered out of this run
+            report['cases'] = {**load_json(args.baseline).get('cases', {}), **results}
+        write_json(args.baseline, report)
+        sys.stdout.write(f"Baseline written to {args.baseline}\n")
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
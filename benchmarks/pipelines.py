@@ -0,0 +1,297 @@
+# End-to-end throughput benchmarks of the hooks render and merger pipelines
+#
+# Runs hooks.tools.processor (through process_files) and merger.views.process_videos
+# on synthetic sources, with Google Sheets and ElevenLabs answered by local fakes
+# (benchmarks.fakes) and S3 by moto, and reports wall time, CPU time, peak RSS,
+# throughput and per-stage timings as JSON.
+#
+#   pip install -r requirements.txt -r benchmarks/requirements.txt
+#   python -m benchmarks.pipelines --rows 6 --short 2 --large 2 --output report.json
+#   python -m benchmarks.pipelines --baseline report.json --fail-on-regression
+#
+# Every run happens in a fresh process with an empty media cache and database, so peak
+# RSS is per run and source downloads are cold. Numbers are only comparable between
+# runs on the same machine.
+import argparse
+import multiprocessing
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import traceback
+import uuid
+from datetime import datetime, timezone
+
+from .measure import (
+    ResourceUsage, StageTimer, compare, load_json, patched_stages, print_comparison,
+    summarize, write_json,
+)
+from .sources import generate_inputs
+
+HOOKS_STAGES = [
+    ('source_fetch', 'hooks_app.media_cache.MediaCache.fetch'),
+    ('sheet_fetch', 'hooks.tools.processor.fetch_google_sheet_data'),
+    ('sheet_formatting', 'hooks.tools.processor.extract_word_color_data'),
+    ('tts', 'hooks.tools.processor.process_audios'),
+    ('render', 'hooks.tools.processor.process_audio_on_videos'),
+    ('thumbnails', 'hooks_app.thumbnails.render_thumbnails'),
+    ('upload', 'hooks_app.storage.UploadStage._upload'),
+]
+
+# concatenate_pair also runs inside single-decode batches of one
+MERGER_STAGES = [
+    ('source_fetch', 'hooks_app.media_cache.MediaCache.fetch'),
+    ('probe', 'merger.views.probe_media'),
+    ('preprocess', 'merger.views.preprocess_source'),
+    ('fused_merge', 'merger.views.merge_videos_fused'),
+    ('concatenate', 'merger.views.concatenate_videos_multi_output'),
+    ('concatenate_pair', 'merger.views.concatenate_videos'),
+    ('thumbnails', 'hooks_app.thumbnails.render_thumbnails'),
+    ('upload', 'hooks_app.storage.UploadStage._upload'),
+]
+
+SCENARIO_KEYS = {
+    'hooks': ('rows', 'words_per_hook', 'aspect_ratio', 'size', 'duration'),
+    'merger': ('short', 'large', 'size', 'duration', 'short_duration'),
+}
+
+
+def run_hooks(config, inputs):
+    """
+    Render ``config['rows']`` hooks through process_files and upload them like
+    background_processing does.
+    """
+    from django.conf import settings
+
+    from hooks.models import Hook, Task
+    from hooks.tools.processor import process_files
+    from hooks_app.storage import UploadStage, VideoLinkRecorder, get_s3_client
+    from .fakes import fake_http_apis
+
+    task_id = f"benchmark_{uuid.uuid4().hex[:12]}"
+    source_key = f"hooks_videos/{os.path.basename(inputs['hook_video'])}"
+    get_s3_client().upload_file(inputs['hook_video'], settings.AWS_STORAGE_BUCKET_NAME, source_key)
+    Hook.objects.create(
+        hooks_content=source_key,
+        google_sheets_link='https://docs.google.com/spreadsheets/d/benchmark/edit',
+        eleven_labs_api_key='benchmark',
+        voice_id='benchmark',
+        task_id=task_id,
+        parallel_processing=True,
+        dimension=config['aspect_ratio'],
+    )
+    Task.objects.create(task_id=task_id, aspect_ratio=config['aspect_ratio'])
+    voiceovers = {}
+    for text, path in inputs['voiceovers'].items():
+        with open(path, 'rb') as voiceover:
+            voiceovers[text] = voiceover.read()
+
+    temp_dir = tempfile.mkdtemp(prefix=f"task_{task_id}_")
+    timer = StageTimer()
+    recorder = VideoLinkRecorder(Task.objects.filter(task_id=task_id))
+    try:
+        with fake_http_apis(inputs['hook_texts'], voiceovers) as apis, \
+                patched_stages(timer, HOOKS_STAGES), ResourceUsage() as usage:
+            with UploadStage(on_uploaded=recorder, thumbnails=True) as uploads:
+                def upload_video(video_file_path):
+                    video_file_name = os.path.basename(video_file_path)
+                    uploads.submit(
+                        video_file_path, f"output_videos/task_{task_id}/{video_file_name}", video_file_name
+                    )
+
+                process_files(
+                    temp_dir, task_id, False, config['aspect_ratio'], on_video_ready=upload_video
+                )
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    outputs = len(recorder.video_links)
+    return dict(
+        usage.report(),
+        outputs=outputs,
+        hooks_per_minute=round(outputs / usage.wall_seconds * 60, 4),
+        api_calls=dict(apis.calls),
+        stages=timer.report(),
+    )
+
+
+def run_merger(config, inputs):
+    """
+    Merge every short source with every large source through process_videos.
+    """
+    from django.conf import settings
+
+    from hooks_app.storage import get_s3_client, s3_object_url
+    from merger.models import MergeTask
+    from merger.views import process_videos
+
+    task_id = f"benchmark_{uuid.uuid4().hex[:12]}"
+    bucket_name = settings.AWS_STORAGE_BUCKET_NAME
+
+    def upload_source(path, role):
+        s3_key = f"merger_uploads/{task_id}/{role}/{os.path.basename(path)}"
+        get_s3_client().upload_file(path, bucket_name, s3_key)
+        return s3_object_url(bucket_name, s3_key)
+
+    MergeTask.objects.create(
+        task_id=task_id,
+        short_video_path=[upload_source(path, 'short') for path in inputs['short_videos']],
+        large_video_paths=[upload_source(path, 'large') for path in inputs['large_videos']],
+        total_frames=1,
+    )
+
+    timer = StageTimer()
+    with patched_stages(timer, MERGER_STAGES), ResourceUsage() as usage:
+        process_videos(task_id)
+
+    merge_task = MergeTask.objects.get(task_id=task_id)
+    if merge_task.status != 'completed':
+        raise RuntimeError(f"Merge task ended as '{merge_task.status}'")
+    outputs = len(merge_task.video_links or [])
+    return dict(
+        usage.report(),
+        outputs=outputs,
+        merges_per_minute=round(outputs / usage.wall_seconds * 60, 4),
+        stages=timer.report(),
+    )
+
+
+SCENARIOS = {'hooks': run_hooks, 'merger': run_merger}
+
+
+def _scenario_process(scenario, config, inputs, run_dir, results):
+    """
+    Body of the process running one sample: fresh database, bucket and media cache.
+    """
+    try:
+        os.environ['DJANGO_SETTINGS_MODULE'] = 'benchmarks.settings'
+        os.environ['BENCHMARK_WORK_DIR'] = run_dir
+        import django
+        django.setup()
+
+        from django.conf import settings
+        from django.core.management import call_command
+        from moto import mock_aws
+
+        with mock_aws():
+            from hooks_app.storage import get_s3_client
+            call_command('migrate', verbosity=0)
+            get_s3_client().create_bucket(Bucket=settings.AWS_STORAGE_BUCKET_NAME)
+            results.put(SCENARIOS[scenario](config, inputs))
+    except Exception:
+        results.put({'error': traceback.format_exc()})
+
+
+def run_sample(scenario, config, inputs, work_dir):
+    run_dir = tempfile.mkdtemp(prefix=f"{scenario}_", dir=work_dir)
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    process = context.Process(
+        target=_scenario_process, args=(scenario, config, inputs, run_dir, results)
+    )
+    try:
+        process.start()
+        result = results.get()
+        process.join()
+    finally:
+        shutil.rmtree(run_dir, ignore_errors=True)
+    return result
+
+
+def host_info():
+    def command_output(command):
+        try:
+            return subprocess.run(
+                command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True
+            ).stdout.splitlines()[0]
+        except (OSError, IndexError):
+            return None
+
+    return {
+        'platform': platform.platform(),
+        'python': platform.python_version(),
+        'cpu_count': os.cpu_count(),
+        'ffmpeg': command_output(['ffmpeg', '-version']),
+        'commit': command_output(['git', 'rev-parse', '--short', 'HEAD']),
+    }
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="End-to-end benchmarks of the render and merge pipelines")
+    parser.add_argument('--scenario', choices=['all'] + list(SCENARIOS), default='all')
+    parser.add_argument('--rows', type=int, default=6, help="hooks rendered per run")
+    parser.add_argument('--words-per-hook', type=int, default=8)
+    parser.add_argument('--aspect-ratio', choices=['option1', 'option2', 'option3', 'option4'], default='option1')
+    parser.add_argument('--short', type=int, default=2, help="short merger sources")
+    parser.add_argument('--large', type=int, default=2, help="large merger sources")
+    parser.add_argument('--size', default='1280x720', help="resolution of the sources")
+    parser.add_argument('--duration', type=int, default=10, help="seconds of the hook and large sources")
+    parser.add_argument('--short-duration', type=int, default=3, help="seconds of the short sources")
+    parser.add_argument('--repeat', type=int, default=1, help="runs per scenario, medians are reported")
+    parser.add_argument('--work-dir', default=os.path.join(tempfile.gettempdir(), 'hooks_benchmarks'))
+    parser.add_argument('--output', help="write the JSON report here")
+    parser.add_argument('--baseline', help="JSON report to compare against")
+    parser.add_argument('--tolerance', type=float, default=0.1, help="allowed regression, 0.1 = 10%%")
+    parser.add_argument('--fail-on-regression', action='store_true')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    config = {
+        'rows': args.rows,
+        'words_per_hook': args.words_per_hook,
+        'aspect_ratio': args.aspect_ratio,
+        'short': args.short,
+        'large': args.large,
+        'size': args.size,
+        'duration': args.duration,
+        'short_duration': args.short_duration,
+    }
+    os.makedirs(args.work_dir, exist_ok=True)
+    inputs = generate_inputs(args.work_dir, config)
+
+    report = {
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'host': host_info(),
+        'scenarios': {},
+    }
+    failed = False
+    scenarios = list(SCENARIOS) if args.scenario == 'all' else [args.scenario]
+    for scenario in scenarios:
+        samples = []
+        for _ in range(args.repeat):
+            sample = run_sample(scenario, config, inputs, args.work_dir)
+            if 'error' in sample:
+                sys.stderr.write(f"{scenario} failed:\n{sample['error']}\n")
+                failed = True
+                break
+            samples.append(sample)
+        if samples:
+            report['scenarios'][scenario] = {
+                'config': {key: config[key] for key in SCENARIO_KEYS[scenario]},
+                'summary': summarize(samples),
+            }
+
+    if args.output:
+        write_json(args.output, report)
+    for scenario, result in report['scenarios'].items():
+        summary = result['summary']
+        throughput = {k: v for k, v in summary.items() if k.endswith('_per_minute')}
+        sys.stdout.write(
+            f"{scenario}: {summary['outputs']:g} outputs in {summary['wall_seconds']:.1f}s "
+            f"(cpu {summary['cpu_seconds']:.1f}s, peak rss {summary['peak_rss_bytes'] / 2 ** 20:.0f}MB) {throughput}\n"
+        )
+
+    if args.baseline:
+        rows, skipped = compare(report, load_json(args.baseline), args.tolerance)
+        print_comparison(rows, skipped)
+        if args.fail_on_regression and any(row['regression'] for row in rows):
+            return 1
+    return 2 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,42 @@
+# Django settings of the benchmark runs: the application settings with every external
+# service replaced by a local stand-in (SQLite, in-memory cache, moto S3)
+import os
+import tempfile
+
+# The application settings read the database from the environment
+for name in ('DB_NAME', 'DB_USER', 'DB_PASSWORD', 'DB_HOST'):
+    os.environ.setdefault(name, 'benchmark')
+
+from hooks_app.settings import *  # noqa: E402,F401,F403
+from hooks_app.settings import CREDENTIALS  # noqa: E402
+
+BENCHMARK_WORK_DIR = os.getenv(
+    'BENCHMARK_WORK_DIR', os.path.join(tempfile.gettempdir(), 'hooks_benchmarks')
+)
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(BENCHMARK_WORK_DIR, 'benchmark.sqlite3'),
+        # Worker threads write progress concurrently
+        'OPTIONS': {'timeout': 30},
+    }
+}
+
+CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}
+}
+
+# Requests to S3 are served by moto inside the benchmark process
+AWS_ACCESS_KEY_ID = 'benchmark'
+AWS_SECRET_ACCESS_KEY = 'benchmark'
+AWS_STORAGE_BUCKET_NAME = 'hooks-benchmark'
+AWS_S3_REGION_NAME = 'us-east-1'
+
+# Answered by benchmarks.fakes
+CREDENTIALS = {**CREDENTIALS, 'GOOGLE_API_KEY': 'benchmark'}
+
+MEDIA_CACHE_DIR = os.path.join(BENCHMARK_WORK_DIR, 'media_cache')
+WORKSPACE_ROOT = os.path.join(BENCHMARK_WORK_DIR, 'workspaces')
+WORKSPACE_MIN_FREE_BYTES = 0
+LOCAL_DOWNLOAD_ROOT = os.path.join(BENCHMARK_WORK_DIR, 'media')
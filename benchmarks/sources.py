@@ -0,0 +1,112 @@
+# Synthetic benchmark inputs generated with ffmpeg's lavfi sources
+import os
+import subprocess
+
+# Words the fake hook texts are drawn from, deterministically
+HOOK_WORDS = (
+    'stop scrolling this simple trick changed how our customers see every morning '
+    'you will not believe what happened when we tried the new routine for thirty days'
+).split()
+
+# Speaking rate of the fake voiceovers, close to ElevenLabs' default voices
+SECONDS_PER_WORD = 0.35
+
+
+def hook_texts(rows, words_per_hook=8):
+    """
+    ``rows`` distinct hook texts of ``words_per_hook`` words.
+    """
+    texts = []
+    for row in range(rows):
+        words = [HOOK_WORDS[(row * 3 + i) % len(HOOK_WORDS)] for i in range(words_per_hook)]
+        texts.append(f"{' '.join(words).capitalize()} {row + 1}")
+    return texts
+
+
+def synthetic_video(path, duration, size='1280x720', rate=30, frequency=440):
+    """
+    Write an H.264/AAC test pattern with a sine tone, like a phone upload, to ``path``.
+    """
+    _run([
+        'ffmpeg', '-y', '-loglevel', 'error',
+        '-f', 'lavfi', '-i', f'testsrc=size={size}:rate={rate}:duration={duration}',
+        '-f', 'lavfi', '-i', f'sine=frequency={frequency}:sample_rate=44100:duration={duration}',
+        '-c:v', 'libx264', '-preset', 'veryfast', '-pix_fmt', 'yuv420p',
+        '-c:a', 'aac', '-shortest',
+        path
+    ])
+    return path
+
+
+def synthetic_voiceover(path, text):
+    """
+    Write an MP3 tone as long as ``text`` takes to speak to ``path``.
+    """
+    duration = max(1.0, len(text.split()) * SECONDS_PER_WORD)
+    _run([
+        'ffmpeg', '-y', '-loglevel', 'error',
+        '-f', 'lavfi', '-i', f'sine=frequency=220:sample_rate=44100:duration={duration:.2f}',
+        '-c:a', 'libmp3lame', '-b:a', '128k',
+        path
+    ])
+    return path
+
+
+def generate_inputs(work_dir, config):
+    """
+    Generate the sources of a benchmark run below ``work_dir``, once per configuration.
+    Inputs are made before the measured runs so their encoding doesn't count.
+
+    Returns a dict with the hook video, the hook texts with their voiceover files, and
+    the short and large merger sources.
+    """
+    inputs_dir = os.path.join(work_dir, 'inputs')
+    os.makedirs(inputs_dir, exist_ok=True)
+
+    def cached(name, make):
+        path = os.path.join(inputs_dir, name)
+        if not os.path.exists(path):
+            stem, extension = os.path.splitext(path)
+            # ffmpeg picks the container from the extension
+            partial = f"{stem}.part{extension}"
+            make(partial)
+            os.replace(partial, path)
+        return path
+
+    size = config['size']
+    duration = config['duration']
+    texts = hook_texts(config['rows'], config['words_per_hook'])
+    return {
+        'hook_video': cached(
+            f"hook_{size}_{duration}s.mp4",
+            lambda path: synthetic_video(path, duration, size)
+        ),
+        'hook_texts': texts,
+        'voiceovers': {
+            text: cached(
+                f"voice_{config['words_per_hook']}w_{i}.mp3",
+                lambda path, text=text: synthetic_voiceover(path, text)
+            )
+            for i, text in enumerate(texts)
+        },
+        'short_videos': [
+            cached(
+                f"short_{i}_{size}_{config['short_duration']}s.mp4",
+                lambda path, i=i: synthetic_video(path, config['short_duration'], size, frequency=330 + i * 10)
+            )
+            for i in range(config['short'])
+        ],
+        'large_videos': [
+            cached(
+                f"large_{i}_{size}_{duration}s.mp4",
+                lambda path, i=i: synthetic_video(path, duration, size, frequency=550 + i * 10)
+            )
+            for i in range(config['large'])
+        ],
+    }
+
+
+def _run(command):
+    result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"{' '.join(command)} failed: {result.stderr.strip()}")
@@ -1,4 +1,5 @@
 from django.contrib import admin
+from hooks_app.admin import TimelineAdminMixin
 from .models import Hook, Task
 
 # Register the Hook model with the admin site
@@ -9,6 +10,6 @@ class HookAdmin(admin.ModelAdmin):
 
 # Register the Task model with the admin site
 @admin.register(Task)
-class TaskAdmin(admin.ModelAdmin):
+class TaskAdmin(TimelineAdminMixin, admin.ModelAdmin):
     # Define the fields to display in the admin list view for Task
-    list_display = ['task_id', 'status', 'video_links']
\ No newline at end of file
+    list_display = ['task_id', 'status', 'queued_at', 'video_links']
@@ -0,0 +1,19 @@
+from django.db import migrations, models
+
+class Migration(migrations.Migration):
+  dependencies = [
+    ('hooks', '0004_alter_hook_hooks_content'),
+  ]
+
+  operations = [
+    migrations.AddField(
+      model_name='task',
+      name='is_preview',
+      field=models.BooleanField(default=False),
+    ),
+    migrations.AddField(
+      model_name='task',
+      name='preview_of',
+      field=models.CharField(blank=True, max_length=255, null=True),
+    ),
+  ]
@@ -0,0 +1,19 @@
+from django.db import migrations, models
+
+class Migration(migrations.Migration):
+  dependencies = [
+    ('hooks', '0005_task_preview'),
+  ]
+
+  operations = [
+    migrations.AddField(
+      model_name='task',
+      name='queued_at',
+      field=models.DateTimeField(blank=True, null=True),
+    ),
+    migrations.AddField(
+      model_name='task',
+      name='timeline',
+      field=models.JSONField(blank=True, null=True),
+    ),
+  ]
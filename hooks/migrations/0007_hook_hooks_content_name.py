@@ -0,0 +1,14 @@
+from django.db import migrations, models
+
+class Migration(migrations.Migration):
+  dependencies = [
+    ('hooks', '0006_task_timeline'),
+  ]
+
+  operations = [
+    migrations.AddField(
+      model_name='hook',
+      name='hooks_content_name',
+      field=models.CharField(blank=True, max_length=500, null=True),
+    ),
+  ]
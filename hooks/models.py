@@ -1,6 +1,12 @@
 from django.db import models
 from django.core.exceptions import ValidationError
 
+# Allowed video MIME types
+VALID_VIDEO_MIME_TYPES = [
+    'video/mp4', 'video/x-m4v', 'video/quicktime', 
+    'video/x-msvideo', 'video/x-ms-wmv'
+]
+
 def validate_video_file(value):
     """
     Validate the uploaded video file to ensure it is of an allowed MIME type.
@@ -11,15 +17,10 @@ def validate_video_file(value):
     Raises:
         ValidationError: If the file's MIME type is not in the list of valid types.
     """
-    # Allowed video MIME types
-    valid_mime_types = [
-        'video/mp4', 'video/x-m4v', 'video/quicktime', 
-        'video/x-msvideo', 'video/x-ms-wmv'
-    ]
     file_mime_type = value.file.content_type
 
     # Raise an error if the file type is not valid
-    if file_mime_type not in valid_mime_types:
+    if file_mime_type not in VALID_VIDEO_MIME_TYPES:
         raise ValidationError(
             f'Unsupported file type: {file_mime_type}. Please upload a valid video file.'
         )
@@ -36,6 +37,9 @@ class Hook(models.Model):
         null=True,
         validators=[validate_video_file]
     )
+    # File name the video was uploaded as; a deduplicated upload is stored under the
+    # key of the first upload of the same content
+    hooks_content_name = models.CharField(max_length=500, blank=True, null=True)
     google_sheets_link = models.URLField(max_length=500, blank=True, null=True)
     eleven_labs_api_key = models.CharField(max_length=255, blank=True, null=True)
     voice_id = models.CharField(max_length=255, blank=True, null=True)
@@ -69,6 +73,12 @@ class Task(models.Model):
     status = models.CharField(max_length=20, default='processing')
     aspect_ratio = models.CharField(max_length=255, default='option1')
     video_links = models.JSONField(null=True, blank=True)
+    # Low-resolution preview of the first rows of another task's hook
+    is_preview = models.BooleanField(default=False)
+    preview_of = models.CharField(max_length=255, blank=True, null=True)
+    # When the render was requested, and the stage spans of its run (see hooks_app.timeline)
+    queued_at = models.DateTimeField(null=True, blank=True)
+    timeline = models.JSONField(null=True, blank=True)
 
     def __str__(self) -> str:
         """Return a string representation of the Task object."""
@@ -0,0 +1,90 @@
+// Direct-to-S3 uploads with presigned multipart URLs.
+// The server hands out one presigned URL per part; parts are PUT straight to S3 in
+// parallel and the collected ETags are sent back to complete the upload.
+// Note: the bucket CORS configuration must allow PUT and expose the ETag header.
+
+const DirectUpload = (function() {
+  const PARALLEL_PARTS = 4;
+
+  async function postJson(url, body, csrfToken) {
+    const res = await fetch(url, {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json',
+        'X-CSRFToken': csrfToken,
+      },
+      body: JSON.stringify(body),
+    });
+
+    const data = await res.json();
+    if (!res.ok) {
+      throw new Error(data.error || 'Upload failed');
+    }
+    return data;
+  }
+
+  // Uploads the parts of one file, calling onBytes(n) as parts finish.
+  async function uploadParts(file, upload, onBytes) {
+    const parts = [];
+    let nextPart = 0;
+
+    async function worker() {
+      while (nextPart < upload.partUrls.length) {
+        const index = nextPart++;
+        const start = index * upload.partSize;
+        const blob = file.slice(start, Math.min(start + upload.partSize, file.size));
+
+        const res = await fetch(upload.partUrls[index], {
+          method: 'PUT',
+          body: blob,
+        });
+        if (!res.ok) {
+          throw new Error(`Part ${index + 1} failed with status ${res.status}`);
+        }
+
+        parts.push({
+          PartNumber: index + 1,
+          ETag: res.headers.get('ETag'),
+        });
+        onBytes(blob.size);
+      }
+    }
+
+    const workers = [];
+    for (let i = 0; i < Math.min(PARALLEL_PARTS, upload.partUrls.length); i++) {
+      workers.push(worker());
+    }
+    await Promise.all(workers);
+
+    return parts;
+  }
+
+  // Uploads `files` (a list of {file, ...extra}) whose multipart uploads were created by
+  // the start endpoint, reporting overall progress as a percentage.
+  async function uploadAll(files, uploads, onProgress) {
+    const totalBytes = files.reduce((sum, entry) => sum + entry.file.size, 0) || 1;
+    let sentBytes = 0;
+
+    function onBytes(n) {
+      sentBytes += n;
+      if (onProgress) {
+        onProgress(Math.round((sentBytes / totalBytes) * 100));
+      }
+    }
+
+    return Promise.all(uploads.map(async (upload, i) => {
+      const parts = await uploadParts(files[i].file, upload, onBytes);
+      return {
+        key: upload.key,
+        uploadId: upload.uploadId,
+        role: upload.role,
+        parts,
+      };
+    }));
+  }
+
+  return {
+    postJson,
+    uploadAll,
+  };
+})();
@@ -1,3 +1,138 @@
-from django.test import TestCase
+import io
+import os
+import shutil
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+from django.test import AsyncRequestFactory, SimpleTestCase, override_settings
+
+from hooks_app import downloads, ffmpeg
+
+
+class ZipDownloadStreamingTests(SimpleTestCase):
+    """
+    The ZIP of a task's outputs must start going out before every output is read.
+    """
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.videos = []
+        for i in range(6):
+            file_name = f'hook_{i}.mp4'
+            with open(os.path.join(self.root, file_name), 'wb') as video_file:
+                video_file.write(os.urandom(64 * 1024))
+            self.videos.append({'file_name': file_name, 'video_link': file_name})
+
+    async def test_first_chunk_is_sent_before_the_last_source_is_read(self):
+        opened = []
+        open_video_link = downloads.open_video_link
+
+        def tracking_open(video_link):
+            opened.append(video_link)
+            return open_video_link(video_link)
+
+        request = AsyncRequestFactory().get('/hooks/download_zip/')
+        with override_settings(LOCAL_DOWNLOAD_ROOT=self.root), \
+                mock.patch.object(downloads, 'open_video_link', tracking_open):
+            response = downloads.zip_download_response(request, self.videos, 'hook_videos.zip')
+            self.assertTrue(response.is_async)
+            chunks = aiter(response)
+            first_chunk = await anext(chunks)
+            opened_at_first_chunk = len(opened)
+            rest = [chunk async for chunk in chunks]
+
+        self.assertTrue(first_chunk.startswith(b'PK'))
+        self.assertEqual(opened_at_first_chunk, 1)
+        self.assertEqual(len(opened), len(self.videos))
+        self.assertTrue(rest)
+
+
+class FakeFFmpegProcess:
+    def __init__(self, stdout, stderr='', returncode=0):
+        self.stdout = io.StringIO(stdout)
+        self.stderr = io.StringIO(stderr)
+        self.returncode = returncode
+
+    def wait(self):
+        return self.returncode
+
+
+class RunFFmpegTests(SimpleTestCase):
+    """
+    ffmpeg's -progress blocks are parsed into typed stats.
+    """
+
+    PROGRESS = (
+        'frame=10\nfps=25.0\nout_time_us=400000\ntotal_size=1024\nspeed=1.5x\nprogress=continue\n'
+        'frame=20\nfps=N/A\nout_time_us=800000\ntotal_size=2048\nspeed=N/A\nprogress=end\n'
+    )
+
+    def run_ffmpeg(self, process, **kwargs):
+        with mock.patch.object(ffmpeg.subprocess, 'Popen', return_value=process) as popen:
+            result = ffmpeg.run_ffmpeg(['ffmpeg', '-i', 'in.mp4', 'out.mp4'], **kwargs)
+        return result, popen.call_args[0][0]
+
+    def test_progress_is_requested_on_stdout(self):
+        _, command = self.run_ffmpeg(FakeFFmpegProcess(''))
+        self.assertEqual(
+            command, ['ffmpeg', '-progress', 'pipe:1', '-nostats', '-i', 'in.mp4', 'out.mp4']
+        )
+
+    def test_every_block_is_reported(self):
+        updates = []
+        result, _ = self.run_ffmpeg(FakeFFmpegProcess(self.PROGRESS), on_progress=updates.append)
+
+        self.assertEqual(updates[0], {
+            'frame': 10, 'fps': 25.0, 'out_time_us': 400000, 'total_size': 1024,
+            'speed': 1.5, 'progress': 'continue',
+        })
+        self.assertEqual(updates[1], {
+            'frame': 20, 'fps': None, 'out_time_us': 800000, 'total_size': 2048,
+            'speed': None, 'progress': 'end',
+        })
+        self.assertEqual(result.stats, updates[1])
+        self.assertTrue(result.ok)
+
+    def test_incomplete_block_is_not_reported(self):
+        updates = []
+        result, _ = self.run_ffmpeg(
+            FakeFFmpegProcess('frame=10\nfps=25.0\n'), on_progress=updates.append
+        )
+        self.assertEqual(updates, [])
+        self.assertEqual(result.stats, {})
+
+    def test_only_the_stderr_tail_is_kept(self):
+        result, _ = self.run_ffmpeg(
+            FakeFFmpegProcess('', stderr='line 1\nline 2\nline 3\n', returncode=1), stderr_lines=2
+        )
+        self.assertFalse(result.ok)
+        self.assertEqual(result.stderr_tail, 'line 2\nline 3\n')
+
+
+class ParseRangeTests(SimpleTestCase):
+    FILE_SIZE = 1000
+
+    def test_no_usable_header_serves_the_whole_file(self):
+        for header in (None, '', 'bytes=-', 'items=0-99', 'bytes=0-99,200-299'):
+            with self.subTest(header=header):
+                self.assertIsNone(downloads.parse_range(header, self.FILE_SIZE))
+
+    def test_satisfiable_ranges(self):
+        cases = {
+            'bytes=0-99': (0, 99),
+            'bytes=500-': (500, 999),
+            'bytes=900-5000': (900, 999),
+            'bytes=-100': (900, 999),
+            'bytes=-5000': (0, 999),
+            'bytes=999-999': (999, 999),
+        }
+        for header, expected in cases.items():
+            with self.subTest(header=header):
+                self.assertEqual(downloads.parse_range(header, self.FILE_SIZE), expected)
+
+    def test_unsatisfiable_ranges(self):
+        for header in ('bytes=1000-', 'bytes=1000-1100', 'bytes=50-10', 'bytes=-0'):
+            with self.subTest(header=header):
+                with self.assertRaises(ValueError):
+                    downloads.parse_range(header, self.FILE_SIZE)
@@ -1,11 +1,21 @@
 # Utility functions used to process audios
+import hashlib
 import os
 import re
 import requests
 import logging
 
+from botocore.exceptions import BotoCoreError, ClientError
+from django.conf import settings
+
+from hooks_app.media_cache import get_media_cache
+from hooks_app.metrics import record_cache_lookup, time_stage
+from hooks_app.storage import upload_to_s3
+
 logging.basicConfig(level=logging.DEBUG)
 
+TTS_MODEL_ID = "eleven_monolingual_v1"
+
 def text_to_speech_file(api_key, text: str, save_file_path: str, voice_id: str, remove_punctuation: bool = True) -> bool:
     if remove_punctuation:
         text = text.replace('-', ' ').replace('"', ' ').replace("'", ' ')
@@ -19,14 +29,15 @@ def text_to_speech_file(api_key, text: str, save_file_path: str, voice_id: str,
     }
     data = {
         "text": text,
-        "model_id": "eleven_monolingual_v1",
+        "model_id": TTS_MODEL_ID,
         "voice_settings": {
             "stability": 0.5,
             "similarity_boost": 0.75
         }
     }
 
-    response = requests.post(url, json=data, headers=headers)
+    with time_stage('tts'):
+        response = requests.post(url, json=data, headers=headers)
 
     if response.status_code != 200:
         logging.error(f"API request failed with status code {response.status_code}: {response.text}")
@@ -39,6 +50,37 @@ def text_to_speech_file(api_key, text: str, save_file_path: str, voice_id: str,
 
     return True, voice_id
 
+def cached_text_to_speech_file(api_key, text, save_file_path, voice_id):
+    """
+    Text to speech through a bucket-wide cache keyed by model, voice and text, so the
+    same line is only voiced once: a preview and its full render, or a re-submitted
+    sheet, reuse the audio instead of calling ElevenLabs again.
+    """
+    cache_key = hashlib.sha256(f"{TTS_MODEL_ID}|{voice_id}|{text}".encode()).hexdigest()
+    s3_key = f"tts_cache/{cache_key}.mp3"
+    media_cache = get_media_cache()
+    try:
+        cached_path = media_cache.fetch(settings.AWS_STORAGE_BUCKET_NAME, s3_key)
+        media_cache.link_into(cached_path, save_file_path)
+        logging.info(f"Reusing cached voiceover {s3_key}")
+        record_cache_lookup('tts', True)
+        return True, voice_id
+    except ClientError as err:
+        record_cache_lookup('tts', False)
+        if err.response.get('Error', {}).get('Code') not in ('404', 'NoSuchKey'):
+            logging.warning(f"Could not read cached voiceover {s3_key}, generating it: {err}")
+    except (BotoCoreError, OSError) as err:
+        # The cache is an optimization, any storage or disk failure falls back to live TTS
+        record_cache_lookup('tts', False)
+        logging.warning(f"Could not read cached voiceover {s3_key}, generating it: {err}")
+
+    status, voice_name = text_to_speech_file(api_key, text, save_file_path, voice_id)
+    try:
+        upload_to_s3(save_file_path, settings.AWS_STORAGE_BUCKET_NAME, s3_key)
+    except Exception as err:
+        logging.warning(f"Could not cache voiceover {s3_key}: {err}")
+    return status, voice_name
+
 def process_audios(api_key, row, hook_number, hook_text, input_df, idx, output_audios_folder, voice_id):
     print(voice_id)
     if row['Audio Filename'] in (None, '') or not os.path.exists(os.path.join(output_audios_folder, row['Audio Filename'])):
@@ -46,7 +88,7 @@ def process_audios(api_key, row, hook_number, hook_text, input_df, idx, output_a
         audio_filename = os.path.join(output_audios_folder, f'hook_{hook_number}.mp3')
         # import pdb;pdb.set_trace()
         try:
-            status, voice_name = text_to_speech_file(api_key, hook_text, audio_filename, voice_id)
+            status, voice_name = cached_text_to_speech_file(api_key, hook_text, audio_filename, voice_id)
             row['Voice'] = voice_name
             row['Audio Filename'] = os.path.basename(audio_filename)
             input_df.at[idx, 'Voice'] = voice_name
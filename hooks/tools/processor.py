@@ -7,6 +7,7 @@ from tqdm import tqdm
 import pandas as pd
 from moviepy.editor import AudioFileClip
 
+from django.conf import settings
 from django.core.cache import cache
 from django.http import JsonResponse
 
@@ -18,6 +19,11 @@ from .audio_processors import process_audios
 from .video_processors import process_audio_on_videos
 
 from hooks.models import Task
+from hooks_app.dedupe import dedupe_stored_upload
+from hooks_app.media_cache import get_media_cache
+from hooks_app.scratch import get_scratch_space
+from hooks_app.storage import parse_s3_url, s3_object_url
+from hooks_app.timeline import bind, track
 
 logging.basicConfig(level=logging.DEBUG)
 canceled_tasks = set()
@@ -35,6 +41,11 @@ def process(params):
 
     word_color_data = extract_word_color_data(google_sheet_link)
 
+    # Previews only render the first rows
+    render_options = params.get('render_options') or {}
+    if render_options.get('max_rows'):
+      input_df = input_df.head(render_options['max_rows']).copy()
+
     for idx, row in input_df.iterrows():
       hook_text = row['Hook Text']
 
@@ -49,7 +60,7 @@ def process(params):
     default_text_color = params['default_text_color']
 
     input_videos_folder = os.path.join(INPUT_DIR, 'video')
-    output_audios_folder = os.path.join(OUTPUT_DIR, 'audios')
+    output_audios_folder = params.get('audio_dir') or os.path.join(OUTPUT_DIR, 'audios')
     output_videos_folder = os.path.join(OUTPUT_DIR, 'videos')
     is_tiktok = 0
     if params['aspect_ratio'] == 'option1':
@@ -94,10 +105,11 @@ def process(params):
       hook_text = row['Hook Text']
       hook_number = idx_1 + 1
 
-      process_audios(
-        ELEVENLABS_API_KEY, row, hook_number, hook_text, input_df, idx_1,
-        output_audios_folder, voice_id
-      )
+      with track(f'row {hook_number}'):
+        process_audios(
+          ELEVENLABS_API_KEY, row, hook_number, hook_text, input_df, idx_1,
+          output_audios_folder, voice_id
+        )
       logging.info('Audio proccessed successfully')
 
     current_thread_count = 0
@@ -127,13 +139,14 @@ def process(params):
         return handle_task_cancellation(temp_dir, task_id)
 
       hook_job = threading.Thread(
-        target=process_audio_on_videos,
+        target=bind(process_audio_on_videos, f'row {hook_number}'),
         args=(
           row, video_files_to_use, idx, input_df, hook_number, hook_text,
           num_videos_to_use, audio_clip, OUT_VIDEO_WIDTH, OUT_VIDEO_HEIGHT,
           output_videos_folder, total_rows, task_id, top_box_color,
           default_text_color, word_color_data, None, params['add_watermark'],
-          is_tiktok
+          is_tiktok, params.get('on_video_ready'), output_audios_folder,
+          render_options
         )
       )
       hook_job.start()
@@ -178,11 +191,34 @@ def process(params):
     logging.error(f"Error during processing ---> {str(e)}")
     delete_temp_dir(params.get('temp_dir', ''))
 
+def dedupe_hooks_content(hook_object, local_path):
+  """
+  Point the hook at the stored copy of its video when the same footage was uploaded
+  before. Direct uploads reach the bucket without being hashed, so this runs once the
+  video is on local disk; form uploads were deduplicated on upload already.
+  """
+  bucket_name = settings.AWS_STORAGE_BUCKET_NAME
+  s3_key = hook_object.hooks_content.name
+  try:
+    _, stored_key = parse_s3_url(
+      dedupe_stored_upload(s3_object_url(bucket_name, s3_key), local_path)
+    )
+  except Exception as e:
+    logging.warning(f"Could not deduplicate {s3_key}: {e}")
+    return
+  if stored_key != s3_key:
+    Hook.objects.filter(pk=hook_object.pk).update(hooks_content=stored_key)
+
 def process_files(
-  temp_dir, task_id, add_watermark=False, aspect_ratio='option1'
+  temp_dir, task_id, add_watermark=False, aspect_ratio='option1', on_video_ready=None,
+  render_options=None, hook_task_id=None
 ):
+  """
+  hook_task_id: task id of the Hook to render when it differs from ``task_id``, as for
+                previews; cancellation and the temp dir cache entry stay under ``task_id``
+  """
 
-  hook_object = Hook.objects.filter(task_id=task_id).first()
+  hook_object = Hook.objects.filter(task_id=hook_task_id or task_id).first()
   if not hook_object:
     return JsonResponse({"error": "Invalid Task id"})
 
@@ -204,22 +240,23 @@ def process_files(
 
   # Create directories for input/output files
   input_videos_folder = os.path.join(temp_dir, 'input', 'video')
-  output_audios_folder = os.path.join(temp_dir, 'output', 'audios')
   output_videos_folder = os.path.join(temp_dir, 'output', 'videos')
 
   # Ensure the directories exist
   os.makedirs(input_videos_folder, exist_ok=True)
-  os.makedirs(output_audios_folder, exist_ok=True)
   os.makedirs(output_videos_folder, exist_ok=True)
 
-  # Save the video file
+  # Link the video file from the node-local media cache (downloaded once per node)
   video_files_paths = []
-  video_file_name = os.path.basename(video_files.name)
+  video_file_name = hook_object.hooks_content_name or os.path.basename(video_files.name)
   video_file_path = os.path.join(input_videos_folder, video_file_name)
   os.makedirs(os.path.dirname(video_file_path), exist_ok=True)
-  with open(video_file_path, 'wb+') as destination:
-    for chunk in video_files.chunks():
-      destination.write(chunk)
+  media_cache = get_media_cache()
+  cached_video_path = media_cache.fetch(
+    settings.AWS_STORAGE_BUCKET_NAME, video_files.name
+  )
+  media_cache.link_into(cached_video_path, video_file_path)
+  dedupe_hooks_content(hook_object, cached_video_path)
   video_files_paths.append(video_file_path)
 
   # Fetch the data from Google Sheets
@@ -254,8 +291,16 @@ def process_files(
     "google_sheet_link": google_sheet_link,
     "add_watermark": add_watermark,
     "aspect_ratio": aspect_ratio,
+    "on_video_ready": on_video_ready,
+    "render_options": render_options,
   }
   cache.set(task_id, temp_dir, timeout=600)
 
-  video_links, credits_used = process(params)
+  # TTS audio and the muxing temp audio are small and short-lived, keep them in RAM if they fit
+  audio_scratch_bytes = len(input_df) * getattr(settings, 'SCRATCH_AUDIO_BYTES_PER_HOOK', 2 * 1024 * 1024)
+  with get_scratch_space().directory(
+    f"{task_id}_audio_", audio_scratch_bytes, spill_dir=temp_dir
+  ) as audio_dir:
+    params["audio_dir"] = audio_dir
+    video_links, credits_used = process(params)
   return video_links, credits_used
@@ -3,6 +3,8 @@ import requests
 import logging
 from django.conf import settings
 
+from hooks_app.metrics import time_stage
+
 # setup logging
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
@@ -35,7 +37,8 @@ def fetch_google_sheet_data(google_sheet_link):
     url = f"https://sheets.googleapis.com/v4/spreadsheets/{spreadsheet_id}/values:batchGet?ranges=Sheet1&key={settings.CREDENTIALS['GOOGLE_API_KEY']}"
     logger.info(f"Fetching data from URL: {url}")
 
-    response = requests.get(url)
+    with time_stage('sheet_fetch'):
+      response = requests.get(url)
     response.raise_for_status()  # Raises an exception for 4xx/5xx responses
 
     data = response.json()
@@ -71,7 +74,8 @@ def fetch_google_sheet_data_with_formatting(spreadsheet_id, api_key):
   )
 
   try:
-    response = requests.get(url)
+    with time_stage('sheet_fetch'):
+      response = requests.get(url)
     response.raise_for_status()
     return response.json()
   except requests.exceptions.RequestException as e:
@@ -10,8 +10,19 @@ from .font_utils import setup_fontconfig
 import numpy as np
 from django.conf import settings
 
+from hooks_app.metrics import FFMPEG_PROCESSES, time_stage
+
 logging.basicConfig(level=logging.DEBUG)
 
+def scaled_size(width, height, scale):
+  """
+  Frame size of a render at ``scale``, rounded down to the even dimensions libx264
+  needs for yuv420p.
+  """
+  if not scale or scale == 1:
+    return width, height
+  return int(width * scale) // 2 * 2, int(height * scale) // 2 * 2
+
 def crop_to_aspect_ratio(video_clip, target_width, target_height):
   original_width, original_height = video_clip.size
   target_aspect_ratio = target_width / target_height
@@ -43,9 +54,15 @@ def crop_to_aspect_ratio(video_clip, target_width, target_height):
 
 def create_custom_text_clip(
   hook_text, OUT_VIDEO_WIDTH, OUT_VIDEO_HEIGHT, top_box_color, text_color,
-  font_size, word_color_data, is_tiktok
+  font_size, word_color_data, is_tiktok, scale=1
 ):
+  """
+  scale: size of the render relative to OUT_VIDEO_WIDTH x OUT_VIDEO_HEIGHT (previews);
+         the layout is that of the full size render, drawn at the reduced size
+  """
   try:
+    scale = scale or 1
+    frame_width, frame_height = scaled_size(OUT_VIDEO_WIDTH, OUT_VIDEO_HEIGHT, scale)
     orig_hook_text_parts = split_hook_text(hook_text)
     hook_text = ' '.join(
       [word['text'] for cell in word_color_data for word in cell]
@@ -54,16 +71,17 @@ def create_custom_text_clip(
     logging.info(f"Hook text parts: {hook_text_parts}")
     x_multiplier = OUT_VIDEO_WIDTH / 360
     y_multiplier = OUT_VIDEO_HEIGHT / 450
-    min_red_area_h = int(round(40 * y_multiplier))
+    min_red_area_h = int(round(40 * y_multiplier * scale))
     fontsize1 = int(round(15 * x_multiplier))
     if is_tiktok == 1:
       fontsize1 += 18
     if OUT_VIDEO_WIDTH == 1920 and OUT_VIDEO_HEIGHT == 1080:
       fontsize1 -= 20
+    fontsize1 = max(1, int(round(fontsize1 * scale)))
 
-    max_width = OUT_VIDEO_WIDTH - 100
+    max_width = int((OUT_VIDEO_WIDTH - 100) * scale)
     logging.info(f'Variables created successfully')
-    x_margin = 5
+    x_margin = max(1, int(round(5 * scale)))
 
     # Setup Fontconfig for custom font
     font_path = os.path.abspath(
@@ -125,20 +143,20 @@ def create_custom_text_clip(
 
     # Get the dimensions of the first text clip
     text_clip1_w, text_clip1_h = text_clip1.size
-    if text_clip1_h > (min_red_area_h - 10):
-      min_red_area_h = text_clip1_h + 10
+    if text_clip1_h > (min_red_area_h - 10 * scale):
+      min_red_area_h = int(round(text_clip1_h + 10 * scale))
 
     # Create background clip for the first part
     bg_clip1 = ColorClip(
-      size=(OUT_VIDEO_WIDTH, min_red_area_h), color=top_box_color
+      size=(frame_width, min_red_area_h), color=top_box_color
     )
 
     text_clip1_y_offset = (min_red_area_h-text_clip1_h) / 2
 
     if is_tiktok == 1:
-      padding_top = 380
+      padding_top = int(round(380 * scale))
       bg_clip1 = ColorClip(
-        size=(OUT_VIDEO_WIDTH, int(min_red_area_h + ((padding_top//2)))),
+        size=(frame_width, int(min_red_area_h + ((padding_top//2)))),
         color=top_box_color
       )
       text_clip1_y_offset += (padding_top / 2)
@@ -146,8 +164,8 @@ def create_custom_text_clip(
       padding_left = 0
       padding_right = 0
       # Yeni video boyutlarını padding ile hesaplayın
-      adjusted_width = OUT_VIDEO_WIDTH - padding_left - padding_right
-      adjusted_height = OUT_VIDEO_HEIGHT
+      adjusted_width = frame_width - padding_left - padding_right
+      adjusted_height = frame_height
 
       # Klipleri CompositeVideoClip içinde konumlandırın
       final_clip = CompositeVideoClip(
@@ -159,7 +177,7 @@ def create_custom_text_clip(
             ("center", text_clip1_y_offset)
           ),  # TextClip için yukarıdan padding ekliyoruz
         ],
-        size=(OUT_VIDEO_WIDTH, OUT_VIDEO_HEIGHT)
+        size=(frame_width, frame_height)
       )
     else:
       final_clip = CompositeVideoClip(
@@ -167,12 +185,12 @@ def create_custom_text_clip(
           bg_clip1.set_position((0, 0)),
           text_clip1.set_position(("center", text_clip1_y_offset)),
         ],
-        size=(OUT_VIDEO_WIDTH, OUT_VIDEO_HEIGHT)
+        size=(frame_width, frame_height)
       )
 
     # Process the second part (after the hyphen) if it exists
     if len(hook_text_parts) > 1:
-      min_white_area_h = int(round(30 * y_multiplier))
+      min_white_area_h = int(round(30 * y_multiplier * scale))
       fontsize2 = int(round(15 * 0.6 * x_multiplier))
 
       if is_tiktok == 1:
@@ -181,6 +199,7 @@ def create_custom_text_clip(
         fontsize2 -= 20 * 0.6
       else:
         fontsize2 += 6
+      fontsize2 = max(1, fontsize2 * scale)
       second_part_text = hook_text_parts[1]
 
       # Build Pango-formatted text string with color for the second part
@@ -205,7 +224,7 @@ def create_custom_text_clip(
       # Create TextClip for the second part with Pango-formatted text
       text_clip2 = TextClip(
         pango_text2.strip(),
-        size=(OUT_VIDEO_WIDTH - (x_margin*2), 0),
+        size=(frame_width - (x_margin*2), 0),
         method='pango',  # Enable Pango markup
         fontsize=fontsize2,
         color='black',  # Default color, overridden by Pango markup
@@ -217,7 +236,7 @@ def create_custom_text_clip(
 
       # Create background clip for the second part
       bg_clip2 = ColorClip(
-        size=(OUT_VIDEO_WIDTH, min_white_area_h), color=(255, 255, 255)
+        size=(frame_width, min_white_area_h), color=(255, 255, 255)
       )
 
       text_clip2_y_offset = min_red_area_h + (min_white_area_h-text_clip2_h) / 2
@@ -229,7 +248,7 @@ def create_custom_text_clip(
           text_clip1.set_position(('center', text_clip1_y_offset)),
           text_clip2.set_position((x_margin, text_clip2_y_offset)),
         ],
-        size=(OUT_VIDEO_WIDTH, OUT_VIDEO_HEIGHT)
+        size=(frame_width, frame_height)
       )
 
     # Clean up the temporary Fontconfig directory
@@ -263,7 +282,10 @@ def process_audio_on_videos(
   word_color_data,
   audio_file=None,
   add_watermark=False,
-  is_tiktok=False
+  is_tiktok=False,
+  on_complete=None,
+  scratch_folder=None,
+  render_options=None
 ):
   # Remove underscores from the hook text for display
   cleaned_hook_text = hook_text.replace('_', '')
@@ -280,6 +302,12 @@ def process_audio_on_videos(
     )
     num_videos_to_use = 1
 
+  # Previews are composed at their reduced size (same layout as the full render) and
+  # encoded faster
+  render_options = render_options or {}
+  scale = render_options.get('scale') or 1
+  frame_width, frame_height = scaled_size(OUT_VIDEO_WIDTH, OUT_VIDEO_HEIGHT, scale)
+
   each_video_duration = audio_clip.duration / num_videos_to_use
   video_clips = []
   logging.debug(
@@ -306,7 +334,7 @@ def process_audio_on_videos(
 
       # Apply cropping to maintain aspect ratio without distortion
       video_clip = crop_to_aspect_ratio(
-        video_clip, OUT_VIDEO_WIDTH, OUT_VIDEO_HEIGHT
+        video_clip, frame_width, frame_height
       )
 
       # Add the clip to the list of video clips
@@ -339,10 +367,11 @@ def process_audio_on_videos(
   logging.info(f"Specific word color data: {specific_word_color_data}")
   # Pass specific_word_color_data to the custom text clip creation
   logging.info('Using the create_custom_text_clip method')
-  custom_text_clip = create_custom_text_clip(
-    cleaned_hook_text, OUT_VIDEO_WIDTH, OUT_VIDEO_HEIGHT, top_box_color,
-    default_text_color, auto_font_size, specific_word_color_data, is_tiktok
-  )
+  with time_stage('overlay_render'):
+    custom_text_clip = create_custom_text_clip(
+      cleaned_hook_text, OUT_VIDEO_WIDTH, OUT_VIDEO_HEIGHT, top_box_color,
+      default_text_color, auto_font_size, specific_word_color_data, is_tiktok, scale
+    )
   logging.info('Used the create_custom_text_clip method')
 
   logging.info('Adding watermark to final video')
@@ -350,7 +379,7 @@ def process_audio_on_videos(
   final_clip = None
   if add_watermark:
     watermark = ImageClip("hooks/tools/watermark.png")
-    width = custom_text_clip.size[0] + 650
+    width = custom_text_clip.size[0] + 650 * scale
     height = width * (watermark.size[1] / watermark.size[0])
     watermark = watermark.resize(height=height, width=width)
     watermark = watermark.set_position("center").set_duration(
@@ -381,12 +410,22 @@ def process_audio_on_videos(
   output_video_filename = os.path.join(output_videos_folder, f'hook_{idx}.mp4')
   logging.info(f"{output_videos_folder},'---------->output_videos_folder")
 
-  final_clip.write_videofile(
-    output_video_filename,
-    temp_audiofile=os.path.join(output_videos_folder, f"temp-audio_{idx}.m4a"),
-    remove_temp=False,
-    codec='libx264',
-    audio_codec="aac"
-  )
+  with FFMPEG_PROCESSES.track_inprogress(), time_stage('encode') as encode:
+    final_clip.write_videofile(
+      output_video_filename,
+      fps=render_options.get('fps'),
+      preset=render_options.get('preset', 'medium'),
+      # The muxing temp audio goes to scratch space and is removed once muxing finishes
+      temp_audiofile=os.path.join(scratch_folder or output_videos_folder, f"temp-audio_{idx}.m4a"),
+      remove_temp=True,
+      codec='libx264',
+      audio_codec="aac"
+    )
+    encode['bytes'] = os.path.getsize(output_video_filename)
+    encode['media_seconds'] = final_clip.duration
 
   logging.info(f"Video processing completed successfully")
+
+  # Hand the finished hook over (e.g. to the upload stage) while the others still render
+  if on_complete:
+    on_complete(output_video_filename)
@@ -9,12 +9,23 @@ urlpatterns = [
     # URL pattern for uploading a hook
     path('upload/', views.upload_hook, name='upload'),
 
+    # URL patterns for presigned multipart uploads straight from the browser to S3
+    path('direct-upload/start/', views.direct_upload_start, name='direct_upload_start'),
+    path('direct-upload/complete/', views.direct_upload_complete, name='direct_upload_complete'),
+    path('direct-upload/abort/', views.direct_upload_abort, name='direct_upload_abort'),
+
     # URL pattern for processing a task with a specific task_id and aspect_ratio
     path('processing/<str:task_id>/<str:aspect_ratio>/', views.processing, name='processing'),
 
+    # URL pattern to render a previewed task at full quality
+    path('promote_preview/<str:task_id>/', views.promote_preview, name='promote_preview'),
+
     # URL pattern to check the status of a task using task_id
     path('check_status/<str:task_id>/', views.check_task_status, name='check_status'),
 
+    # URL pattern for the Server-Sent Events stream of a task's status
+    path('events/<str:task_id>/', views.task_events, name='task_events'),
+
     # URL pattern to download a zip file associated with a task_id
     path('download_zip/<str:task_id>/', views.download_zip, name='download_zip'),
 
@@ -3,91 +3,109 @@ import tempfile
 import os
 import shutil
 from django.shortcuts import render, redirect
+from django.urls import reverse
 from django.contrib.auth.decorators import login_required
-from django.http import HttpResponse, FileResponse
+from django.http import Http404, HttpResponse, StreamingHttpResponse
 from django.conf import settings
-from urllib.parse import urlparse
 from .forms import HookForm
-from botocore.exceptions import NoCredentialsError
 from .tools.utils import generate_task_id
 from .tools.processor import process_files
 
 from django.http import JsonResponse
 from django.shortcuts import get_object_or_404
+from django.utils import timezone
 from django.core.exceptions import SuspiciousOperation
-from .models import Task
+from .models import Task, VALID_VIDEO_MIME_TYPES
 from account.models import Plan
 import threading
-import zipfile
-import io
-import boto3
+from concurrent.futures import ThreadPoolExecutor
+import json
+import uuid
 import requests
 from .tools.spreadsheet_extractor import fetch_google_sheet_data
 from django.conf import settings
+from django.views.decorators.http import require_POST
+from hooks_app.dedupe import find_media_object, register_media_object
+from hooks_app.downloads import download_response, zip_download_response
+from hooks_app.events import TaskStatePoller, is_authenticated, task_event_stream
+from hooks_app.metrics import QUEUE_DEPTH
+from hooks_app.thumbnails import result_page
+from hooks_app.timeline import TaskTimeline
+from hooks_app.storage import (
+  UploadStage, VideoLinkRecorder, start_multipart_upload, complete_multipart_upload,
+  abort_multipart_upload, parse_upload_size,
+)
 
 logging.basicConfig(level=logging.DEBUG)
 
 
-# Creating a connection to the aws s3 bucket 
-# aws_access_key_id: aws secret key 
-# aws_secret_access_key: aws s3 secret key
-# region_name: aws region obtained from aws bucket name
-s3_client = boto3.client(
-    's3',
-    aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
-    aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
-    region_name=settings.AWS_S3_REGION_NAME
+
+def preview_render_options():
+    """Render settings of preview tasks: the first rows, scaled down, encoded fast."""
+    return {
+        'max_rows': getattr(settings, 'HOOKS_PREVIEW_ROWS', 3),
+        'scale': getattr(settings, 'HOOKS_PREVIEW_SCALE', 0.5),
+        'fps': getattr(settings, 'HOOKS_PREVIEW_FPS', 15),
+        'preset': getattr(settings, 'HOOKS_PREVIEW_PRESET', 'ultrafast'),
+    }
+
+
+# Previews run on their own small pool so they never wait behind full renders
+preview_executor = ThreadPoolExecutor(
+    max_workers=getattr(settings, 'HOOKS_PREVIEW_WORKERS', 2),
+    thread_name_prefix='hooks-preview'
 )
 
 
 
-def upload_to_s3(file_path, bucket_name, s3_key):
-    """Upload a file to an S3 bucket and return the URL."""
-    try:
-        s3_client.upload_file(file_path, bucket_name, s3_key)
-        file_url = f"https://{bucket_name}.s3.{settings.AWS_S3_REGION_NAME}.amazonaws.com/{s3_key}" # bucket url to save the video file
-        logging.info(f"Video uploaded to S3: {file_url}")
-        return file_url
-    except Exception as e:
-        logging.error(f"Error uploading to S3: {e}")
-        raise
-      
-      
-      
-
-def background_processing(task_id, user_sub, aspect_ratio):
-    """Background processing for the given task."""
+def background_processing(task_id, user_sub, aspect_ratio, preview_of=None):
+    """
+    Background processing for the given task.
+    preview_of: task id of the hook to preview; the preview task renders a few low-resolution
+                rows of it and uses no credits
+    """
     try:
-        temp_dir = tempfile.mkdtemp(prefix=f"task_{task_id}_")
-        logging.info(f"Temporary directory created: {temp_dir}")
-        video_links, credits_used = process_files(
-            temp_dir,
-            task_id,
-            user_sub.plan.name.lower() == 'free',
-            aspect_ratio
-        )
-        logging.info(f"Video Links: {video_links}")
-        logging.info(f"Credits Used: {credits_used}")
-        user_sub.hooks -= credits_used
-        user_sub.save()
-        logging.info(f"User credits reduced by {credits_used}. New credit balance: {user_sub.hooks}")
-        updated_video_links = []
-        for video in video_links: # looping through all the video link and upload them to s3 server
-            video_file_path = video.get('video_link') 
-            video_file_name = video.get('file_name')
-            if video_file_path:
-                s3_key = f"output_videos/task_{task_id}/{video_file_name}"
-                video_url = upload_to_s3(video_file_path, settings.AWS_STORAGE_BUCKET_NAME, s3_key)
-                updated_video_links.append({
-                    "file_name": video_file_name,
-                    "video_link": video_url
-                })  # appending each return url into updated_video_links llst
-        task = Task.objects.get(task_id=task_id)
-        task.status = 'completed'
-        task.video_links = updated_video_links
-        task.aspect_ratio = aspect_ratio
-        task.save()
-        logging.info(f"Task {task_id} updated to 'completed' with video URLs.")
+        # Stage spans of every row, saved on the task when the run ends
+        with TaskTimeline(Task.objects.filter(task_id=task_id)).activate():
+            temp_dir = tempfile.mkdtemp(prefix=f"task_{task_id}_")
+            logging.info(f"Temporary directory created: {temp_dir}")
+            # Each hook is uploaded as soon as it is rendered, while the others keep rendering
+            recorder = VideoLinkRecorder(Task.objects.filter(task_id=task_id))
+            with UploadStage(on_uploaded=recorder, thumbnails=True) as uploads:
+                def upload_video(video_file_path):
+                    video_file_name = os.path.basename(video_file_path)
+                    s3_key = f"output_videos/task_{task_id}/{video_file_name}"
+                    uploads.submit(video_file_path, s3_key, video_file_name)
+
+                video_links, credits_used = process_files(
+                    temp_dir,
+                    task_id,
+                    user_sub.plan.name.lower() == 'free',
+                    aspect_ratio,
+                    on_video_ready=upload_video,
+                    render_options=preview_render_options() if preview_of else None,
+                    hook_task_id=preview_of
+                )
+            logging.info(f"Video Links: {video_links}")
+            if preview_of:
+                logging.info(f"Preview of {preview_of} rendered, no credits used")
+            else:
+                logging.info(f"Credits Used: {credits_used}")
+                user_sub.hooks -= credits_used
+                user_sub.save()
+                logging.info(f"User credits reduced by {credits_used}. New credit balance: {user_sub.hooks}")
+            # Keep the links in sheet order
+            uploaded = {video['file_name']: video for video in recorder.video_links}
+            updated_video_links = [
+                uploaded[video.get('file_name')] for video in video_links
+                if video.get('file_name') in uploaded
+            ]
+            task = Task.objects.get(task_id=task_id)
+            task.status = 'completed'
+            task.video_links = updated_video_links
+            task.aspect_ratio = aspect_ratio
+            task.save()
+            logging.info(f"Task {task_id} updated to 'completed' with video URLs.")
 
 
     except Exception as e:
@@ -114,12 +132,6 @@ def upload_hook(request):
 
   hook = None
   if request.method == 'POST':
-    task_id = generate_task_id()
-    logging.info(f'Task ID generated --> {task_id}')
-
-    Task.objects.create(task_id=task_id, status='processing')
-    logging.info(f'A Task object created for task id --> {task_id}')
-
     parallel_processing = True
 
     form = HookForm(request.POST, request.FILES)
@@ -128,22 +140,143 @@ def upload_hook(request):
     ]
     is_valid_form = form.is_valid() and \
                     is_valid_resolution
+    hooks_content_key = request.POST.get('hooks_content_key')
+    if hooks_content_key and not hooks_content_key.startswith(HOOKS_DIRECT_UPLOAD_PREFIX):
+      is_valid_form = False
+    if is_valid_form and not request.FILES.get('hooks_content') and not hooks_content_key:
+      # hooks_content is optional on the model, but there is nothing to render without it
+      form.add_error('hooks_content', 'Please upload a hooks video.')
+      is_valid_form = False
     if is_valid_form:
+      task_id = generate_task_id()
+      logging.info(f'Task ID generated --> {task_id}')
+
+      Task.objects.create(task_id=task_id, status='processing')
+      logging.info(f'A Task object created for task id --> {task_id}')
+
       hook = form.save(commit=False)
+      if hooks_content_key and not hook.hooks_content:
+        # The browser already uploaded the video straight to S3
+        hook.hooks_content = hooks_content_key
+      # Footage uploaded before (by any task) isn't stored again
+      uploaded_content = request.FILES.get('hooks_content')
+      hook.hooks_content_name = os.path.basename(
+        uploaded_content.name if uploaded_content else hooks_content_key
+      )
+      content_sha256 = getattr(uploaded_content, 'sha256', None)
+      stored_copy = find_media_object(content_sha256)
+      if stored_copy:
+        logging.info(f'Reusing stored hooks video {stored_copy.s3_key}')
+        hook.hooks_content = stored_copy.s3_key
       hook.task_id = task_id
       hook.parallel_processing = parallel_processing
       hook.dimension = request.POST.get('resolution')
       hook.save()
+      if content_sha256 and not stored_copy:
+        register_media_object(content_sha256, hook.hooks_content.name, uploaded_content.size)
 
-      return redirect(
-        'hooks:processing', task_id=task_id, aspect_ratio=hook.dimension
+      processing_url = reverse(
+        'hooks:processing', kwargs={'task_id': task_id, 'aspect_ratio': hook.dimension}
       )
+      if request.POST.get('preview'):
+        processing_url += '?preview=1'
+      return redirect(processing_url)
     else:
-      return render(request, 'upload_hook.html', {'form': form, 'hook': hook})
+      return render(request, 'upload_hook.html', {
+        'form': form, 'hook': hook, 'preview_rows': settings.HOOKS_PREVIEW_ROWS
+      })
   else:
     form = HookForm()
 
-  return render(request, 'upload_hook.html', {'form': form, 'hook': hook})
+  return render(request, 'upload_hook.html', {
+    'form': form, 'hook': hook, 'preview_rows': settings.HOOKS_PREVIEW_ROWS
+  })
+
+
+
+# S3 prefix of hook videos uploaded directly from the browser
+HOOKS_DIRECT_UPLOAD_PREFIX = 'hooks_videos/direct/'
+
+
+
+@require_POST
+@login_required
+def direct_upload_start(request):
+  """
+  Start a presigned multipart upload so the browser sends the hooks video straight to S3.
+  Expects JSON: {"name", "size", "type"}
+  """
+  try:
+    body = json.loads(request.body)
+  except ValueError:
+    return JsonResponse({'error': 'Invalid request body.'}, status=400)
+
+  content_type = body.get('type')
+  if content_type not in VALID_VIDEO_MIME_TYPES:
+    return JsonResponse(
+      {'error': f'Unsupported file type: {content_type}. Please upload a valid video file.'},
+      status=400
+    )
+
+  size = parse_upload_size(body.get('size'))
+  if size is None:
+    return JsonResponse({'error': 'Invalid file size.'}, status=400)
+
+  file_name = os.path.basename(body.get('name') or 'video.mp4').replace(' ', '_')
+  s3_key = f"{HOOKS_DIRECT_UPLOAD_PREFIX}{uuid.uuid4()}/{file_name}"
+  upload = start_multipart_upload(s3_key, size, content_type)
+  return JsonResponse(upload)
+
+
+
+@require_POST
+@login_required
+def direct_upload_complete(request):
+  """
+  Complete a direct upload. The returned key is then submitted with the hook form.
+  Expects JSON: {"key", "uploadId", "parts": [{"PartNumber", "ETag"}]}
+  """
+  try:
+    body = json.loads(request.body)
+  except ValueError:
+    return JsonResponse({'error': 'Invalid request body.'}, status=400)
+
+  s3_key = body.get('key', '')
+  if not s3_key.startswith(HOOKS_DIRECT_UPLOAD_PREFIX) or not body.get('uploadId'):
+    return JsonResponse({'error': 'Invalid upload key.'}, status=400)
+  try:
+    complete_multipart_upload(s3_key, body['uploadId'], body.get('parts', []))
+  except Exception as e:
+    logging.error(f"Error completing upload {s3_key}: {e}")
+    # No task exists before the hook form is submitted; only the stored parts are left over
+    try:
+      abort_multipart_upload(s3_key, body['uploadId'])
+    except Exception as e:
+      logging.error(f"Error aborting upload {s3_key}: {e}")
+    return JsonResponse({'error': 'Error completing the upload.'}, status=500)
+  return JsonResponse({'key': s3_key})
+
+
+
+@require_POST
+@login_required
+def direct_upload_abort(request):
+  """
+  Abort a failed direct upload so no orphaned parts stay stored.
+  Expects JSON: {"key", "uploadId"}
+  """
+  try:
+    body = json.loads(request.body)
+  except ValueError:
+    return JsonResponse({'error': 'Invalid request body.'}, status=400)
+
+  s3_key = body.get('key', '')
+  if s3_key.startswith(HOOKS_DIRECT_UPLOAD_PREFIX):
+    try:
+      abort_multipart_upload(s3_key, body['uploadId'])
+    except Exception as e:
+      logging.error(f"Error aborting upload {s3_key}: {e}")
+  return JsonResponse({'key': s3_key})
 
 
 
@@ -159,6 +292,25 @@ def processing(request, task_id, aspect_ratio):
       "You don't have enough credits, buy and try again!", status=404
     )
 
+  if request.GET.get('preview'):
+    # Low-resolution preview of the first rows under its own task, on the preview queue
+    preview_task_id = generate_task_id()
+    Task.objects.create(
+      task_id=preview_task_id, status='processing', aspect_ratio=aspect_ratio,
+      is_preview=True, preview_of=task_id, queued_at=timezone.now()
+    )
+    QUEUE_DEPTH.labels('preview').inc()
+    preview_executor.submit(
+      background_processing, preview_task_id, user_sub, aspect_ratio, task_id
+    ).add_done_callback(lambda _: QUEUE_DEPTH.labels('preview').dec())
+    return render(
+      request, 'processing.html', {
+        'task_id': preview_task_id,
+        'aspect_ratio': aspect_ratio,
+      }
+    )
+
+  Task.objects.filter(task_id=task_id).update(queued_at=timezone.now())
   thread = threading.Thread(
     target=background_processing, args=(task_id, user_sub, aspect_ratio)
   )
@@ -173,6 +325,19 @@ def processing(request, task_id, aspect_ratio):
 
 
 
+@login_required
+def promote_preview(request, task_id):
+  """
+  Start the full render of a previewed hook. The voiceovers come from the TTS cache
+  filled by the preview, so only the video is rendered again.
+  """
+  preview = get_object_or_404(Task, task_id=task_id, is_preview=True)
+  return redirect(
+    'hooks:processing', task_id=preview.preview_of, aspect_ratio=preview.aspect_ratio
+  )
+
+
+
 @login_required
 def check_task_status(request, task_id):
   task = get_object_or_404(Task, task_id=task_id)
@@ -184,6 +349,37 @@ def check_task_status(request, task_id):
       'video_links': task.video_links if task.status == 'completed' else None
     }
   )
+
+
+
+def fetch_task_states(task_ids):
+  return {
+    task['task_id']: task for task in
+    Task.objects.filter(task_id__in=task_ids).values('task_id', 'status', 'video_links')
+  }
+
+
+# One status query per interval for all open task_events streams
+task_state_poller = TaskStatePoller(fetch_task_states)
+
+
+async def task_events(request, task_id):
+  """
+  Server-Sent Events stream with the task status and newly finished videos.
+  Replaces client polling of check_task_status; runs as an async view under ASGI.
+  """
+  if not await is_authenticated(request):
+    return HttpResponse("Authentication required", status=401)
+
+  if task_id not in await task_state_poller.fetch([task_id]):
+    return HttpResponse("Task not found.", status=404)
+
+  response = StreamingHttpResponse(
+    task_event_stream(task_state_poller, task_id), content_type='text/event-stream'
+  )
+  response['Cache-Control'] = 'no-cache'
+  response['X-Accel-Buffering'] = 'no'  # disable proxy buffering (nginx)
+  return response
   
   
   
@@ -197,79 +393,39 @@ def processing_successful(request, task_id):
     request, 'processing_successful.html', {
       'task_id': task_id,
       'video_links': task.video_links,
+      'page_obj': result_page(task.video_links, request.GET.get('page')),
       'plans': Plan.objects.all(),
+      'is_preview': task.is_preview,
     }
   )
   
 
 
-def generate_presigned_url(bucket_name, object_name, expiration=3600):
-    try:
-        # Generate a presigned URL to download the S3 object
-        response = s3_client.generate_presigned_url('get_object',
-                                                    Params={'Bucket': bucket_name, 'Key': object_name},
-                                                    ExpiresIn=expiration)
-    except NoCredentialsError:
-        return None
-    
-    return response
-  
-
-
+@login_required
 def download_video(request):
     """
-    View to download a video from the S3 bucket.
-
-    # Get the video path from the request query parameters
-    videopath = request.GET.get('videopath', None)
-    if not videopath this get the video path from the the frontend as the query parameters
+    Download one output video of a task.
+    Redirects to a short-lived presigned S3 URL instead of streaming the file through
+    the web worker; local outputs are served with Range support.
     """
-  
     videopath = request.GET.get('videopath', None)
     if not videopath:
         return HttpResponse("No video path provided", status=400)
-    parsed_url = urlparse(videopath)
-    bucket_name = parsed_url.netloc.split('.')[0]
-    object_key = parsed_url.path.lstrip('/')
-    presigned_url = generate_presigned_url(bucket_name, object_key)
-    if not presigned_url:
-        return HttpResponse("Unable to generate download link", status=500)
-    try:
-        response = requests.get(presigned_url, stream=True)
-        if response.status_code == 200:
-            content_type = response.headers.get('Content-Type', 'application/octet-stream')
-            response_stream = HttpResponse(response.iter_content(chunk_size=1024), content_type=content_type)
-            response_stream['Content-Disposition'] = f'attachment; filename="{os.path.basename(object_key)}"'
-            return response_stream
-        else:
-            return HttpResponse("Failed to download video from S3", status=response.status_code)
-    except Exception as e:
-        return HttpResponse(f"Error while downloading the file: {str(e)}", status=500)   
+    # Only links recorded on a task can be downloaded
+    if not Task.objects.filter(video_links__contains=[{'video_link': videopath}]).exists():
+        raise Http404("Unknown video")
+    return download_response(request, videopath, "output_videos/")
 
 
 
 
+@login_required
 def download_zip(request, task_id):
   task = get_object_or_404(Task, task_id=task_id)
   videos = task.video_links
 
-  zip_buffer = io.BytesIO()
-
-  with zipfile.ZipFile(zip_buffer, 'w') as zip_file:
-    for idx, video in enumerate(videos):
-      if os.path.exists(video['video_link']):
-        file_name = os.path.basename(video['video_link'])
-
-        # Add the file to the zip archive
-        zip_file.write(video['video_link'], file_name)
-
-  zip_buffer.seek(0)
-
-  # Create a response with the zip file for downloading
-  response = HttpResponse(zip_buffer, content_type='application/zip')
-  response['Content-Disposition'] = f'attachment; filename="hook_videos.zip"'
-
-  return response
+  # Streamed straight from storage, see zip_stream
+  return zip_download_response(request, videos or [], 'hook_videos.zip')
 
 
 
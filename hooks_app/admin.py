@@ -0,0 +1,55 @@
+# Admin helpers shared by the hooks and merger task models
+import json
+
+from django.contrib import admin
+from django.http import HttpResponse
+from django.utils.html import format_html, format_html_join
+
+from .timeline import chrome_trace
+
+
+class TimelineAdminMixin:
+    """
+    Admin of task models with ``queued_at`` and ``timeline`` fields: shows the timeline
+    on the change page and exports the selected tasks as a Chrome trace.
+    """
+    actions = ['export_chrome_trace']
+    exclude = ['timeline']
+    readonly_fields = ['timeline_table']
+
+    @admin.display(description='Timeline')
+    def timeline_table(self, obj):
+        timeline = obj.timeline
+        if not timeline:
+            return '-'
+        summary = format_html(
+            '<p>Node {} (pid {}), queued {}s, ran {}s{}</p>',
+            timeline['node'], timeline['pid'],
+            timeline['queued_seconds'] if timeline['queued_seconds'] is not None else '?',
+            timeline['total_seconds'],
+            f", {timeline['dropped_events']} events dropped" if timeline.get('dropped_events') else '',
+        )
+        rows = format_html_join(
+            '', '<tr><td>{}</td><td>{}</td><td>{}</td><td>{}</td><td>{}</td><td>{}</td></tr>',
+            (
+                (
+                    event['track'], event['stage'], f"{event['start']:.3f}", f"{event['seconds']:.3f}",
+                    event.get('bytes', ''), f"{event['speed']}x" if 'speed' in event else '',
+                )
+                for event in sorted(timeline['events'], key=lambda event: (event['track'], event['start']))
+            )
+        )
+        return format_html(
+            '{}<table><thead><tr><th>Track</th><th>Stage</th><th>Start (s)</th><th>Seconds</th>'
+            '<th>Bytes</th><th>Speed</th></tr></thead><tbody>{}</tbody></table>',
+            summary, rows
+        )
+
+    @admin.action(description='Export timelines as Chrome trace')
+    def export_chrome_trace(self, request, queryset):
+        timelines = {
+            task.task_id: task.timeline for task in queryset.order_by('queued_at') if task.timeline
+        }
+        response = HttpResponse(json.dumps(chrome_trace(timelines)), content_type='application/json')
+        response['Content-Disposition'] = 'attachment; filename="timeline_trace.json"'
+        return response
@@ -9,8 +9,14 @@ https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
 
 import os
 
+from django.conf import settings
+from django.contrib.staticfiles.handlers import ASGIStaticFilesHandler
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'hooks_app.settings')
 
 application = get_asgi_application()
+
+# Serve static files the way runserver does while DEBUG is on
+if settings.DEBUG:
+    application = ASGIStaticFilesHandler(application)
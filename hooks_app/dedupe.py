@@ -0,0 +1,122 @@
+# Content-addressed storage of uploaded sources, shared by the hooks and merger uploads
+import hashlib
+import logging
+import os
+
+from botocore.exceptions import BotoCoreError, ClientError
+from django.apps import apps
+from django.conf import settings
+from django.db import IntegrityError
+
+from .storage import get_s3_client, parse_s3_url, s3_object_url, upload_to_s3
+
+logger = logging.getLogger(__name__)
+
+# Size of the reads while hashing local copies of direct uploads
+HASH_READ_CHUNK_SIZE = 8 * 1024 * 1024
+
+
+def _media_objects():
+    # Stored in the merger app, whose preprocessed renditions hang off it
+    return apps.get_model('merger', 'MediaObject').objects
+
+
+def _object_exists(s3_key):
+    try:
+        get_s3_client().head_object(Bucket=settings.AWS_STORAGE_BUCKET_NAME, Key=s3_key)
+        return True
+    except ClientError:
+        return False
+
+
+def file_sha256(path):
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as source:
+        while chunk := source.read(HASH_READ_CHUNK_SIZE):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def find_media_object(sha256):
+    """
+    Return the MediaObject already stored with this content, or None.
+    Entries whose object has been deleted from the bucket are dropped.
+    """
+    if not sha256:
+        return None
+    media_object = _media_objects().filter(sha256=sha256).first()
+    if media_object and not _object_exists(media_object.s3_key):
+        logger.warning(f"Stored copy {media_object.s3_key} is gone, forgetting it")
+        media_object.delete()
+        return None
+    return media_object
+
+
+def register_media_object(sha256, s3_key, size=0):
+    """
+    Record ``s3_key`` as the stored copy of the content ``sha256``.
+    """
+    if not sha256:
+        return None
+    try:
+        media_object, _ = _media_objects().get_or_create(
+            sha256=sha256, defaults={'s3_key': s3_key, 'size': size}
+        )
+    except IntegrityError:
+        # Registered by a concurrent upload of the same content
+        media_object = _media_objects().get(sha256=sha256)
+    return media_object
+
+
+def store_upload(uploaded_file, s3_key):
+    """
+    Store an uploaded file at ``s3_key`` and return its URL, unless the same content was
+    stored before: then the existing object is returned and nothing is uploaded.
+    Its probe and renditions are reused along with it. The object key may therefore
+    name another upload; callers keep the file name they show separately.
+
+    uploaded_file: spooled upload with the ``sha256`` set by HashingTemporaryFileUploadHandler
+    """
+    sha256 = getattr(uploaded_file, 'sha256', None)
+    media_object = find_media_object(sha256)
+    if media_object:
+        logger.info(f"Reusing stored copy of {uploaded_file.name}: {media_object.s3_key}")
+        return s3_object_url(settings.AWS_STORAGE_BUCKET_NAME, media_object.s3_key)
+
+    url = upload_to_s3(uploaded_file.temporary_file_path(), settings.AWS_STORAGE_BUCKET_NAME, s3_key)
+    register_media_object(sha256, s3_key, uploaded_file.size)
+    return url
+
+
+def dedupe_stored_upload(s3_url, local_path):
+    """
+    Deduplicate a source that reached the bucket without passing through Django (direct
+    multipart uploads), by hashing its local copy ``local_path``.
+
+    Returns the URL to use from now on: the copy stored before when the content is
+    known, in which case the duplicate is deleted, or ``s3_url``, which is registered
+    for later uploads. Sources registered already are returned without hashing.
+    """
+    if media_object_for_url(s3_url):
+        return s3_url
+    bucket_name, s3_key = parse_s3_url(s3_url)
+    sha256 = file_sha256(local_path)
+    media_object = find_media_object(sha256)
+    if media_object is None or media_object.s3_key == s3_key:
+        register_media_object(sha256, s3_key, os.path.getsize(local_path))
+        return s3_url
+
+    logger.info(f"{s3_key} duplicates the stored copy {media_object.s3_key}, deleting it")
+    try:
+        get_s3_client().delete_object(Bucket=bucket_name, Key=s3_key)
+    except (BotoCoreError, ClientError) as e:
+        logger.warning(f"Could not delete duplicate upload {s3_key}: {e}")
+    return s3_object_url(settings.AWS_STORAGE_BUCKET_NAME, media_object.s3_key)
+
+
+def media_object_for_url(s3_url):
+    """
+    MediaObject stored at a bucket URL, or None for content that wasn't deduplicated.
+    """
+    _, s3_key = parse_s3_url(s3_url)
+    return _media_objects().filter(s3_key=s3_key).first()
@@ -0,0 +1,304 @@
+# Download responses that never proxy video bytes through the application
+import logging
+import mimetypes
+import os
+import re
+import time
+import zipfile
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.handlers.asgi import ASGIRequest
+from django.http import (
+    FileResponse, Http404, HttpResponse, HttpResponseRedirect, StreamingHttpResponse
+)
+
+from .metrics import record_s3_transfer
+from .storage import get_s3_client, parse_s3_url
+
+logger = logging.getLogger(__name__)
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+# Size of the reads from storage while building ZIP archives
+ZIP_READ_CHUNK_SIZE = 1024 * 1024
+
+
+def presigned_download_url(bucket_name, object_key, file_name=None):
+    """
+    Return a presigned GET URL that makes the browser save the object as ``file_name``.
+
+    URLs are cached per object for most of their lifetime, so repeated clicks on the
+    result page don't sign a new URL each time and keep hitting the browser cache.
+    """
+    file_name = file_name or os.path.basename(object_key)
+    return _cached_presigned_url(
+        f"presigned:{bucket_name}/{object_key}:{file_name}",
+        {
+            'Bucket': bucket_name,
+            'Key': object_key,
+            'ResponseContentDisposition': f'attachment; filename="{file_name}"',
+        }
+    )
+
+
+def presigned_view_url(s3_url):
+    """
+    Return a presigned GET URL for showing a stored object inline, e.g. the poster of
+    an output as an <img>. Cached like presigned_download_url.
+    """
+    bucket_name, object_key = parse_s3_url(s3_url)
+    return _cached_presigned_url(
+        f"presigned-view:{bucket_name}/{object_key}",
+        {'Bucket': bucket_name, 'Key': object_key}
+    )
+
+
+def _cached_presigned_url(cache_key, params):
+    expiration = getattr(settings, 'DOWNLOAD_URL_EXPIRATION', 3600)
+    url = cache.get(cache_key)
+    if url is None:
+        url = get_s3_client().generate_presigned_url(
+            'get_object', Params=params, ExpiresIn=expiration
+        )
+        # Stop handing the URL out well before it expires
+        cache.set(cache_key, url, timeout=int(expiration * 0.8))
+    return url
+
+
+class _RangeFile:
+    """
+    Read-only view of ``length`` bytes of a file starting at ``start``, for FileResponse.
+    """
+
+    def __init__(self, path, start, length):
+        self._file = open(path, 'rb')
+        self._file.seek(start)
+        self._remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self._remaining:
+            size = self._remaining
+        data = self._file.read(size)
+        self._remaining -= len(data)
+        return data
+
+    def close(self):
+        self._file.close()
+
+
+def parse_range(header, file_size):
+    """
+    Parse a single-range ``Range: bytes=start-end`` header.
+    Returns (start, end) inclusive, None when there is no usable header (serve the whole
+    file), or raises ValueError for an unsatisfiable range.
+    """
+    match = RANGE_RE.match(header or '')
+    if not match:
+        return None
+    start, end = match.groups()
+    if not start and not end:
+        return None
+    if not start:
+        # Suffix range: the last N bytes
+        length = int(end)
+        if length == 0:
+            raise ValueError("Empty suffix range")
+        return max(file_size - length, 0), file_size - 1
+    start = int(start)
+    end = min(int(end), file_size - 1) if end else file_size - 1
+    if start > end or start >= file_size:
+        raise ValueError("Range not satisfiable")
+    return start, end
+
+
+def local_file_response(request, path, file_name=None):
+    """
+    Serve a local file as an attachment with HTTP Range support.
+
+    With DOWNLOAD_SENDFILE_HEADER set (e.g. X-Accel-Redirect), the transfer is handed to
+    the front web server, which also handles ranges; paths are sent relative to
+    LOCAL_DOWNLOAD_ROOT under DOWNLOAD_SENDFILE_PREFIX.
+    """
+    file_name = file_name or os.path.basename(path)
+    content_type = mimetypes.guess_type(file_name)[0] or 'application/octet-stream'
+
+    sendfile_header = getattr(settings, 'DOWNLOAD_SENDFILE_HEADER', None)
+    if sendfile_header:
+        relative_path = os.path.relpath(path, settings.LOCAL_DOWNLOAD_ROOT)
+        response = HttpResponse(content_type=content_type)
+        response[sendfile_header] = settings.DOWNLOAD_SENDFILE_PREFIX + relative_path
+        response['Content-Disposition'] = f'attachment; filename="{file_name}"'
+        return response
+
+    file_size = os.path.getsize(path)
+    try:
+        byte_range = parse_range(request.headers.get('Range'), file_size)
+    except ValueError:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{file_size}'
+        return response
+
+    if byte_range is None:
+        response = FileResponse(
+            open(path, 'rb'), as_attachment=True, filename=file_name, content_type=content_type
+        )
+    else:
+        start, end = byte_range
+        length = end - start + 1
+        response = FileResponse(
+            _RangeFile(path, start, length), status=206,
+            as_attachment=True, filename=file_name, content_type=content_type
+        )
+        response['Content-Length'] = str(length)
+        response['Content-Range'] = f'bytes {start}-{end}/{file_size}'
+    response['Accept-Ranges'] = 'bytes'
+    return response
+
+
+def download_response(request, video_link, key_prefix, file_name=None):
+    """
+    Response for downloading one task output.
+
+    S3 outputs are answered with a redirect to a short-lived presigned URL, so S3 serves
+    the bytes (and any Range requests) directly. Outputs of local-storage deployments
+    are served from LOCAL_DOWNLOAD_ROOT. Only objects in the configured bucket under
+    ``key_prefix`` and files inside the download root can be reached.
+    """
+    if video_link.startswith(('http://', 'https://')):
+        bucket_name, object_key = parse_s3_url(video_link)
+        if bucket_name != settings.AWS_STORAGE_BUCKET_NAME or not object_key.startswith(key_prefix):
+            raise Http404("Unknown video")
+        return HttpResponseRedirect(presigned_download_url(bucket_name, object_key, file_name))
+
+    path = local_download_path(video_link)
+    if path is None:
+        raise Http404("Unknown video")
+    return local_file_response(request, path, file_name)
+
+
+def local_download_path(video_link):
+    """
+    Absolute path of a local output below LOCAL_DOWNLOAD_ROOT, or None if the link points
+    outside of it or the file is missing.
+    """
+    root = os.path.realpath(settings.LOCAL_DOWNLOAD_ROOT)
+    path = os.path.realpath(os.path.join(root, video_link))
+    if os.path.commonpath([root, path]) != root or not os.path.isfile(path):
+        return None
+    return path
+
+
+def open_video_link(video_link):
+    """
+    Open a task output for reading in chunks.
+    Returns (size, iterator over byte chunks), or None when the output doesn't exist.
+    """
+    if video_link.startswith(('http://', 'https://')):
+        bucket_name, object_key = parse_s3_url(video_link)
+        try:
+            obj = get_s3_client().get_object(Bucket=bucket_name, Key=object_key)
+        except get_s3_client().exceptions.NoSuchKey:
+            return None
+        record_s3_transfer('download', obj['ContentLength'])
+        return obj['ContentLength'], obj['Body'].iter_chunks(chunk_size=ZIP_READ_CHUNK_SIZE)
+
+    path = local_download_path(video_link)
+    if path is None:
+        return None
+
+    def read_chunks():
+        with open(path, 'rb') as video_file:
+            while chunk := video_file.read(ZIP_READ_CHUNK_SIZE):
+                yield chunk
+
+    return os.path.getsize(path), read_chunks()
+
+
+class _ZipStreamBuffer:
+    """
+    Write-only, unseekable file for zipfile that collects the written bytes until the
+    generator hands them out. zipfile writes data descriptors when it can't seek back.
+    """
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def zip_stream(videos):
+    """
+    Generate a ZIP archive of task outputs while reading them from storage.
+
+    Entries are ZIP_STORED, since MP4s don't compress, so each chunk read from storage
+    is sent on right away: memory stays at about one read chunk however large the task
+    is, and the first bytes go out before the first object has finished downloading.
+
+    videos: task video_links, a list of {'file_name', 'video_link'}
+    """
+    buffer = _ZipStreamBuffer()
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_STORED) as archive:
+        for video in videos:
+            video_link = video.get('video_link')
+            if not video_link:
+                continue
+            source = open_video_link(video_link)
+            if source is None:
+                logger.warning(f"Video file for zipping not found: {video_link}")
+                continue
+            size, chunks = source
+
+            info = zipfile.ZipInfo(
+                video.get('file_name') or os.path.basename(video_link),
+                date_time=time.localtime()[:6]
+            )
+            info.compress_type = zipfile.ZIP_STORED
+            # A known size lets zipfile decide on ZIP64 up front
+            info.file_size = size
+            with archive.open(info, 'w') as entry:
+                for chunk in chunks:
+                    entry.write(chunk)
+                    yield buffer.drain()
+            yield buffer.drain()
+    # Central directory
+    yield buffer.drain()
+
+
+async def _iterate_in_thread(iterator):
+    """
+    Async generator over a sync iterator, advancing it one step at a time in a worker
+    thread so the event loop sends every chunk as soon as it is produced.
+    """
+    done = object()
+    next_chunk = sync_to_async(next, thread_sensitive=False)
+    while (chunk := await next_chunk(iterator, done)) is not done:
+        if chunk:
+            yield chunk
+
+
+def zip_download_response(request, videos, archive_name):
+    """
+    Streaming response with a ZIP archive of ``videos`` (see zip_stream).
+
+    Under ASGI the body must be an async iterator: Django reads a sync one to the end
+    before sending anything, which would hold the whole archive in memory.
+    """
+    content = zip_stream(videos)
+    if isinstance(request, ASGIRequest):
+        content = _iterate_in_thread(content)
+    response = StreamingHttpResponse(content, content_type='application/zip')
+    response['Content-Disposition'] = f'attachment; filename="{archive_name}"'
+    response['X-Accel-Buffering'] = 'no'  # disable proxy buffering (nginx)
+    return response
@@ -0,0 +1,154 @@
+# Server-Sent Events helpers shared by the hooks and merger status streams
+import asyncio
+import collections
+import contextlib
+import json
+import logging
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+# Statuses after which a task will not change anymore
+TERMINAL_STATUSES = ('completed', 'failed')
+
+
+async def is_authenticated(request):
+    """
+    Resolve ``request.user`` outside the event loop and check that it is logged in.
+    The lazy user object hits the session and user tables, which is sync-only in Django 4.2.
+    """
+    return await sync_to_async(lambda: request.user.is_authenticated)()
+
+
+def format_event(event, data):
+    """
+    Format a single SSE frame.
+    """
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+class TaskStatePoller:
+    """
+    Polls the state of every task with an open stream in one query per interval, so open
+    result pages cost one database round trip per interval however many there are.
+
+    fetch_states: sync callable taking a list of task ids and returning
+                  {task_id: state dict} for the tasks that exist (see task_event_stream)
+
+    The query runs on Django's shared sync thread and old connections are closed after
+    every poll, so idle streams hold neither an executor slot nor a database connection.
+    The poll loop only runs while streams are open.
+    """
+
+    def __init__(self, fetch_states):
+        self.fetch_states = fetch_states
+        self._watchers = collections.Counter()
+        self._states = {}
+        self._updated = None
+        self._loop_task = None
+
+    async def fetch(self, task_ids):
+        """
+        Fetch the states of ``task_ids`` right away, outside the poll loop.
+        """
+        return await sync_to_async(self._fetch)(list(task_ids))
+
+    def _fetch(self, task_ids):
+        try:
+            return self.fetch_states(task_ids)
+        finally:
+            close_old_connections()
+
+    @contextlib.contextmanager
+    def watching(self, task_id):
+        self._watchers[task_id] += 1
+        try:
+            yield
+        finally:
+            self._watchers[task_id] -= 1
+            if self._watchers[task_id] <= 0:
+                del self._watchers[task_id]
+
+    async def next_state(self, task_id):
+        """
+        Wait for the next poll and return the state of ``task_id``, None if it is gone.
+        The task must be watched (see watching).
+        """
+        if self._loop_task is None:
+            self._updated = asyncio.Event()
+            self._loop_task = asyncio.get_running_loop().create_task(self._poll())
+        updated = self._updated
+        await updated.wait()
+        return self._states.get(task_id)
+
+    async def _poll(self):
+        poll_interval = getattr(settings, 'TASK_EVENTS_POLL_INTERVAL', 1.0)
+        try:
+            while self._watchers:
+                try:
+                    self._states = await self.fetch(self._watchers)
+                except Exception as e:
+                    # Streams keep waiting and the next poll tries again
+                    logger.error(f"Could not poll task states: {e}")
+                else:
+                    updated, self._updated = self._updated, asyncio.Event()
+                    updated.set()
+                await asyncio.sleep(poll_interval)
+        finally:
+            self._loop_task = None
+
+
+async def task_event_stream(poller, task_id):
+    """
+    Push task updates to the browser until the task reaches a terminal status, whether
+    or not the client stays connected.
+
+    poller: TaskStatePoller whose states are dicts with at least ``status`` and
+            ``video_links`` (and optionally ``progress``)
+
+    Only changes are sent. New entries in ``video_links`` are sent as ``outputs`` so the
+    page can show finished videos while the rest of the task is still running.
+    """
+    poll_interval = getattr(settings, 'TASK_EVENTS_POLL_INTERVAL', 1.0)
+    heartbeat_interval = getattr(settings, 'TASK_EVENTS_HEARTBEAT_INTERVAL', 15.0)
+
+    # Ask the browser to wait a bit before reconnecting after a dropped connection
+    yield f"retry: {int(poll_interval * 1000) * 3}\n\n"
+
+    last_sent = None
+    seen_outputs = set()
+    last_write = time.monotonic()
+
+    with poller.watching(task_id):
+        while True:
+            state = await poller.next_state(task_id)
+            if state is None:
+                yield format_event('update', {'status': 'failed', 'progress': 0, 'outputs': []})
+                return
+
+            new_outputs = [
+                video for video in (state.get('video_links') or [])
+                if video.get('file_name') not in seen_outputs
+            ]
+            seen_outputs.update(video.get('file_name') for video in new_outputs)
+
+            snapshot = (state['status'], state.get('progress'))
+            if snapshot != last_sent or new_outputs:
+                yield format_event('update', {
+                    'status': state['status'],
+                    'progress': state.get('progress'),
+                    'outputs': new_outputs,
+                })
+                last_sent = snapshot
+                last_write = time.monotonic()
+            elif time.monotonic() - last_write >= heartbeat_interval:
+                # SSE comment line, keeps proxies from closing an idle connection
+                yield ": keepalive\n\n"
+                last_write = time.monotonic()
+
+            if state['status'] in TERMINAL_STATUSES:
+                return
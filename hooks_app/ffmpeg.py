@@ -0,0 +1,106 @@
+# Shared ffmpeg runner with machine-readable progress reporting
+import collections
+import logging
+import subprocess
+import threading
+
+from django.conf import settings
+
+from .metrics import FFMPEG_PROCESSES, time_stage
+
+logger = logging.getLogger(__name__)
+
+
+class FFmpegResult:
+    """
+    Outcome of an ffmpeg run.
+
+    returncode: exit status of the ffmpeg process
+    stderr_tail: last lines ffmpeg wrote to stderr, for error reports
+    stats: last progress block reported by ffmpeg (see parse_progress)
+    """
+
+    def __init__(self, returncode, stderr_tail, stats):
+        self.returncode = returncode
+        self.stderr_tail = stderr_tail
+        self.stats = stats
+
+    @property
+    def ok(self):
+        return self.returncode == 0
+
+
+def parse_progress(block):
+    """
+    Convert one ``-progress`` key/value block into typed values.
+    Missing or ``N/A`` values come back as None.
+    """
+    def to_number(value, cast):
+        try:
+            return cast(value)
+        except (TypeError, ValueError):
+            return None
+
+    speed = block.get('speed', '').rstrip('x').strip()
+    return {
+        'frame': to_number(block.get('frame'), int),
+        'fps': to_number(block.get('fps'), float),
+        'out_time_us': to_number(block.get('out_time_us'), int),
+        'total_size': to_number(block.get('total_size'), int),
+        'speed': to_number(speed, float),
+        'progress': block.get('progress'),
+    }
+
+
+def run_ffmpeg(command, on_progress=None, stderr_lines=None, stage='encode'):
+    """
+    Run an ffmpeg command and report structured progress.
+
+    The command is run with ``-progress pipe:1 -nostats`` so ffmpeg writes a small
+    key=value block to stdout for every progress update instead of rewriting a
+    human-readable status line on stderr. Only the last ``stderr_lines`` lines of
+    stderr are kept for error reporting.
+
+    command: ffmpeg argument list, starting with the ffmpeg binary
+    on_progress: optional callable receiving the dict from parse_progress for every update
+    stage: pipeline stage the run is recorded under in the metrics
+    """
+    stderr_lines = stderr_lines or getattr(settings, 'FFMPEG_STDERR_TAIL_LINES', 50)
+    command = [command[0], '-progress', 'pipe:1', '-nostats'] + list(command[1:])
+
+    with FFMPEG_PROCESSES.track_inprogress(), time_stage(stage) as details:
+        result = _run(command, on_progress, stderr_lines)
+        details['bytes'] = result.stats.get('total_size')
+        details['speed'] = result.stats.get('speed')
+    return result
+
+
+def _run(command, on_progress, stderr_lines):
+    process = subprocess.Popen(
+        command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True
+    )
+
+    # stderr is drained on its own thread so a chatty ffmpeg can never block on a full pipe
+    stderr_tail = collections.deque(maxlen=stderr_lines)
+    stderr_reader = threading.Thread(
+        target=lambda: stderr_tail.extend(process.stderr), daemon=True
+    )
+    stderr_reader.start()
+
+    stats = {}
+    block = {}
+    for line in process.stdout:
+        key, _, value = line.strip().partition('=')
+        if not key:
+            continue
+        block[key] = value
+        # Every progress block ends with progress=continue or progress=end
+        if key == 'progress':
+            stats = parse_progress(block)
+            block = {}
+            if on_progress:
+                on_progress(stats)
+
+    returncode = process.wait()
+    stderr_reader.join()
+    return FFmpegResult(returncode, ''.join(stderr_tail), stats)
@@ -0,0 +1,181 @@
+# Node-local cache of source media downloaded from S3
+import contextlib
+import fcntl
+import hashlib
+import logging
+import os
+import shutil
+import threading
+
+from boto3.s3.transfer import TransferConfig
+from django.conf import settings
+
+from .metrics import record_cache_lookup, record_s3_transfer, time_stage
+from .storage import get_s3_client, parse_s3_url
+
+logger = logging.getLogger(__name__)
+
+
+class MediaCache:
+    """
+    Disk cache of S3 objects shared by every worker on a node.
+
+    Entries are keyed by bucket, key and ETag, so a re-uploaded object gets a new entry
+    and each source crosses the network once per node. Misses are downloaded with
+    parallel ranged GETs. Concurrent requests for the same object wait for the first
+    download instead of starting their own: threads through an in-process lock,
+    processes through an flock on a sidecar lock file.
+
+    When the cache grows over its budget, least recently used entries are evicted.
+    Readers that already opened an evicted file keep reading it (POSIX unlink
+    semantics); callers that need the file for longer should link or copy it (see
+    link_into), or pin it while they use it (see fetch). Pinned entries hold a shared
+    flock on a sidecar pin file and are skipped by eviction in every process.
+    """
+
+    def __init__(self, root, max_bytes, download_concurrency=8):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.transfer_config = TransferConfig(
+            multipart_threshold=8 * 1024 * 1024,
+            multipart_chunksize=16 * 1024 * 1024,
+            max_concurrency=download_concurrency,
+        )
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+        self._evict_lock = threading.Lock()
+        os.makedirs(self.root, exist_ok=True)
+
+    def fetch_url(self, s3_url, pins=None):
+        """
+        Return a local path for the object behind a bucket URL, downloading it if needed.
+        """
+        bucket_name, object_key = parse_s3_url(s3_url)
+        return self.fetch(bucket_name, object_key, pins)
+
+    def fetch(self, bucket_name, object_key, pins=None):
+        """
+        Return a local path for s3://bucket_name/object_key, downloading it if needed.
+
+        pins: optional contextlib.ExitStack; the entry is not evicted until it is closed
+        """
+        head = get_s3_client().head_object(Bucket=bucket_name, Key=object_key)
+        etag = head['ETag'].strip('"')
+        size = head['ContentLength']
+
+        entry = hashlib.sha1(f"{bucket_name}/{object_key}:{etag}".encode()).hexdigest()
+        path = os.path.join(self.root, entry + os.path.splitext(object_key)[1].lower())
+
+        # Pinned before the entry is looked up, so it can't be evicted in between
+        if pins is not None:
+            pins.enter_context(self._pinned(path))
+
+        with self._entry_lock(entry), open(path + '.lock', 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                if os.path.exists(path):
+                    # Bump the mtime, eviction goes by least recently used
+                    os.utime(path)
+                    logger.info(f"Media cache hit: {object_key}")
+                    record_cache_lookup('media', True)
+                    return path
+
+                self._make_room(size)
+                partial_path = f"{path}.{os.getpid()}.part"
+                logger.info(f"Media cache miss, downloading: {object_key} ({size} bytes)")
+                record_cache_lookup('media', False)
+                try:
+                    with time_stage('source_fetch') as source_fetch:
+                        get_s3_client().download_file(
+                            bucket_name, object_key, partial_path, Config=self.transfer_config
+                        )
+                        source_fetch['bytes'] = size
+                    record_s3_transfer('download', size)
+                    os.replace(partial_path, path)
+                finally:
+                    if os.path.exists(partial_path):
+                        os.remove(partial_path)
+                return path
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def link_into(self, cached_path, destination):
+        """
+        Place a cached file at ``destination`` without going back to the network.
+        Hard links keep the data alive even if the entry gets evicted; falls back to a
+        copy when the destination is on another filesystem.
+        """
+        try:
+            os.link(cached_path, destination)
+        except OSError:
+            shutil.copyfile(cached_path, destination)
+        return destination
+
+    @contextlib.contextmanager
+    def _pinned(self, path):
+        with open(path + '.pin', 'a') as pin_file:
+            fcntl.flock(pin_file, fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(pin_file, fcntl.LOCK_UN)
+
+    def _entry_lock(self, entry):
+        with self._locks_guard:
+            return self._locks.setdefault(entry, threading.Lock())
+
+    def _make_room(self, incoming_bytes):
+        """
+        Evict least recently used entries until ``incoming_bytes`` fit in the budget.
+        """
+        with self._evict_lock:
+            entries = []
+            for name in os.listdir(self.root):
+                if name.endswith(('.lock', '.part', '.pin')):
+                    continue
+                full_path = os.path.join(self.root, name)
+                try:
+                    stat = os.stat(full_path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, full_path))
+
+            used_bytes = sum(size for _, size, _ in entries)
+            for _, size, full_path in sorted(entries):
+                if used_bytes + incoming_bytes <= self.max_bytes:
+                    break
+                # Pin files stay in place: a pin taken on a removed one would not be seen
+                with open(full_path + '.pin', 'a') as pin_file:
+                    try:
+                        fcntl.flock(pin_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    except BlockingIOError:
+                        logger.info(f"Media cache entry in use, not evicted: {full_path}")
+                        continue
+                    try:
+                        os.remove(full_path)
+                        used_bytes -= size
+                        logger.info(f"Media cache evicted: {full_path}")
+                    except FileNotFoundError:
+                        pass
+                    finally:
+                        fcntl.flock(pin_file, fcntl.LOCK_UN)
+
+
+_media_cache = None
+_media_cache_lock = threading.Lock()
+
+
+def get_media_cache():
+    """
+    Return the process-wide media cache configured from settings.
+    """
+    global _media_cache
+    if _media_cache is None:
+        with _media_cache_lock:
+            if _media_cache is None:
+                _media_cache = MediaCache(
+                    settings.MEDIA_CACHE_DIR,
+                    settings.MEDIA_CACHE_MAX_BYTES,
+                    getattr(settings, 'MEDIA_CACHE_DOWNLOAD_CONCURRENCY', 8),
+                )
+    return _media_cache
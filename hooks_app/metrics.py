@@ -0,0 +1,144 @@
+# Prometheus metrics of the render and merge pipelines
+import atexit
+import contextlib
+import hmac
+import ipaddress
+import os
+import time
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram,
+    generate_latest, multiprocess,
+)
+
+from .timeline import record_stage
+
+# With several worker processes, PROMETHEUS_MULTIPROC_DIR must point to an empty
+# directory shared by all of them (and be set before they start); every process then
+# writes its samples there and /metrics aggregates them.
+MULTIPROCESS = bool(os.environ.get('PROMETHEUS_MULTIPROC_DIR'))
+
+# From a sheet fetch (~100ms) to encoding a long merge (many minutes)
+STAGE_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+
+STAGE_SECONDS = Histogram(
+    'pipeline_stage_seconds',
+    'Duration of pipeline stages: sheet_fetch, tts, overlay_render, encode (including the '
+    'decode of the sources, which moviepy reads lazily), '
+    'remux, thumbnails, upload, source_fetch, ffprobe, workspace_wait',
+    ['stage'],
+    buckets=STAGE_BUCKETS,
+)
+QUEUE_DEPTH = Gauge(
+    'pipeline_queue_depth',
+    'Jobs waiting or running in a queue: workspace (waiting for disk space), '
+    'upload (output uploads), preview (preview renders)',
+    ['queue'],
+    multiprocess_mode='livesum',
+)
+FFMPEG_PROCESSES = Gauge(
+    'ffmpeg_processes',
+    'Running ffmpeg and ffprobe processes',
+    multiprocess_mode='livesum',
+)
+CACHE_REQUESTS = Counter(
+    'cache_requests_total',
+    'Cache lookups by cache (media, probe, tts, rendition) and result (hit, miss)',
+    ['cache', 'result'],
+)
+S3_BYTES = Counter(
+    's3_bytes_total',
+    'Bytes transferred to (upload) and from (download) S3',
+    ['direction'],
+)
+S3_POOL_CONNECTIONS = Gauge(
+    's3_pool_connections',
+    'Connections of the shared S3 client pool by state (in_use, idle, max)',
+    ['state'],
+    multiprocess_mode='livesum',
+)
+S3_POOL_FULL_DISCARDS = Counter(
+    's3_pool_full_discards_total',
+    'Connections discarded because the S3 connection pool was full',
+)
+
+if MULTIPROCESS:
+    # Drop the live gauges of this process from the aggregate once it exits
+    atexit.register(multiprocess.mark_process_dead, os.getpid())
+
+
+@contextlib.contextmanager
+def time_stage(stage):
+    """
+    Record the duration of the block in pipeline_stage_seconds, failed or not, and as a
+    span of the task timeline of the thread (see hooks_app.timeline).
+
+    Yields a dict the block may fill with ``bytes``, ``speed`` or ``media_seconds`` for
+    the timeline.
+    """
+    details = {}
+    started = time.time()
+    start = time.perf_counter()
+    try:
+        yield details
+    finally:
+        seconds = time.perf_counter() - start
+        STAGE_SECONDS.labels(stage).observe(seconds)
+        record_stage(stage, started, seconds, details)
+
+
+def record_cache_lookup(cache, hit):
+    CACHE_REQUESTS.labels(cache, 'hit' if hit else 'miss').inc()
+
+
+def record_s3_transfer(direction, size):
+    if size:
+        S3_BYTES.labels(direction).inc(size)
+
+
+def record_s3_pool(stats):
+    """
+    Publish the connection pool usage returned by hooks_app.storage.s3_pool_stats.
+    """
+    S3_POOL_CONNECTIONS.labels('in_use').set(stats['in_use'])
+    S3_POOL_CONNECTIONS.labels('idle').set(stats['idle'])
+    S3_POOL_CONNECTIONS.labels('max').set(stats['max_pool_connections'] * max(stats['pools'], 1))
+
+
+def _metrics_allowed(request):
+    """
+    Whether the request may read /metrics: it carries ``Authorization: Bearer <METRICS_TOKEN>``
+    or comes from one of METRICS_ALLOWED_NETWORKS. Without either setting nobody may.
+    """
+    token = getattr(settings, 'METRICS_TOKEN', None)
+    if token and hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return True
+    try:
+        address = ipaddress.ip_address(request.META.get('REMOTE_ADDR', ''))
+    except ValueError:
+        return False
+    return any(
+        address in ipaddress.ip_network(network, strict=False)
+        for network in getattr(settings, 'METRICS_ALLOWED_NETWORKS', [])
+    )
+
+
+def metrics_view(request):
+    """
+    Serve the metrics of every worker process in the Prometheus text format, to the
+    scrapers allowed by METRICS_TOKEN or METRICS_ALLOWED_NETWORKS (see _metrics_allowed).
+    """
+    if not _metrics_allowed(request):
+        return HttpResponseForbidden()
+
+    from .storage import s3_pool_stats
+    record_s3_pool(s3_pool_stats())
+
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return HttpResponse(generate_latest(registry), content_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,83 @@
+# RAM-backed scratch directories for small, short-lived intermediates
+import contextlib
+import logging
+import os
+import shutil
+import tempfile
+import threading
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class ScratchSpace:
+    """
+    Hands out scratch directories on a tmpfs (``/dev/shm``) while their estimated size
+    fits in a RAM budget, and on disk otherwise.
+
+    Intermediates that are written once, read back right away and thrown out (TTS audio,
+    muxing temp files) then never touch the disk. The budget is
+    accounted per process and also checked against the free space of the tmpfs, which
+    is shared with other processes.
+    """
+
+    def __init__(self, ram_root, ram_budget_bytes):
+        self.ram_root = ram_root
+        self.ram_budget_bytes = ram_budget_bytes
+        self._reserved_bytes = 0
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def directory(self, prefix, estimated_bytes, spill_dir=None):
+        """
+        Create a scratch directory for about ``estimated_bytes``, yield its path and
+        remove it with its contents afterwards.
+
+        spill_dir: where to create the directory when it doesn't fit in RAM
+                   (default: the system temp directory)
+        """
+        in_ram = self._reserve(estimated_bytes)
+        try:
+            path = tempfile.mkdtemp(prefix=prefix, dir=self.ram_root if in_ram else spill_dir)
+            logger.info(
+                f"Scratch directory {path} ({'RAM' if in_ram else 'disk'}, ~{estimated_bytes} bytes)"
+            )
+            try:
+                yield path
+            finally:
+                shutil.rmtree(path, ignore_errors=True)
+        finally:
+            if in_ram:
+                with self._lock:
+                    self._reserved_bytes -= estimated_bytes
+
+    def _reserve(self, estimated_bytes):
+        if not self.ram_root or not os.path.isdir(self.ram_root):
+            return False
+        with self._lock:
+            if self._reserved_bytes + estimated_bytes > self.ram_budget_bytes:
+                return False
+            if shutil.disk_usage(self.ram_root).free < estimated_bytes:
+                return False
+            self._reserved_bytes += estimated_bytes
+            return True
+
+
+_scratch_space = None
+_scratch_space_lock = threading.Lock()
+
+
+def get_scratch_space():
+    """
+    Return the process-wide scratch space configured from settings.
+    """
+    global _scratch_space
+    if _scratch_space is None:
+        with _scratch_space_lock:
+            if _scratch_space is None:
+                _scratch_space = ScratchSpace(
+                    getattr(settings, 'SCRATCH_RAM_DIR', '/dev/shm'),
+                    getattr(settings, 'SCRATCH_RAM_BUDGET_BYTES', 0),
+                )
+    return _scratch_space
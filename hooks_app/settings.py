@@ -1,4 +1,5 @@
 import os
+import tempfile
 from pathlib import Path
 from dotenv import dotenv_values,load_dotenv
 from django.contrib.messages import constants as messages
@@ -73,6 +74,11 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'hooks_app.wsgi.application'
+ASGI_APPLICATION = 'hooks_app.asgi.application'
+
+# Server-Sent Events task status streams (seconds)
+TASK_EVENTS_POLL_INTERVAL = 1.0
+TASK_EVENTS_HEARTBEAT_INTERVAL = 15.0
 
 # configuring the database connection to work for the porgres database
 DATABASES = {
@@ -131,8 +137,102 @@ if not os.path.exists(UPLOAD_FOLDER):
 if not os.path.exists(OUTPUT_FOLDER):
   os.makedirs(OUTPUT_FOLDER)
 
-DATA_UPLOAD_MAX_MEMORY_SIZE = 2 * 1024 * 1024 * 1024
-FILE_UPLOAD_MAX_MEMORY_SIZE = 1 * 1024 * 1024 * 1024
+# Per-task scratch workspaces of the merger. A task waits until the volume has room for
+# its estimated size (times WORKSPACE_SIZE_FACTOR) plus WORKSPACE_MIN_FREE_BYTES.
+WORKSPACE_ROOT = os.getenv('WORKSPACE_ROOT', OUTPUT_FOLDER)
+WORKSPACE_MIN_FREE_BYTES = int(os.getenv('WORKSPACE_MIN_FREE_BYTES', 2 * 1024 * 1024 * 1024))
+WORKSPACE_SIZE_FACTOR = 1.5
+WORKSPACE_POLL_INTERVAL = 5.0
+
+# RAM scratch tier (tmpfs) for small, short-lived intermediates; anything over the budget
+# spills to disk. Docker's default /dev/shm is 64MB, run render containers with --shm-size.
+SCRATCH_RAM_DIR = os.getenv('SCRATCH_RAM_DIR', '/dev/shm')
+SCRATCH_RAM_BUDGET_BYTES = int(os.getenv('SCRATCH_RAM_BUDGET_BYTES', 512 * 1024 * 1024))
+SCRATCH_AUDIO_BYTES_PER_HOOK = 2 * 1024 * 1024
+
+# Fast previews of hooks: the first rows only, scaled down and encoded with a fast preset,
+# on their own small worker pool
+HOOKS_PREVIEW_ROWS = 3
+HOOKS_PREVIEW_SCALE = 0.5
+HOOKS_PREVIEW_FPS = 15
+HOOKS_PREVIEW_PRESET = 'ultrafast'
+HOOKS_PREVIEW_WORKERS = 2
+
+# Poster (jpg or webp) and short muted preview clip of every output, shown on the result
+# pages instead of loading the full videos; results are listed RESULTS_PAGE_SIZE per page
+THUMBNAIL_POSTER_FORMAT = 'jpg'
+THUMBNAIL_WIDTH = 320
+THUMBNAIL_PREVIEW_SECONDS = 4
+THUMBNAIL_PREVIEW_FPS = 12
+THUMBNAIL_PREVIEW_CRF = 32
+RESULTS_PAGE_SIZE = 24
+
+# Node-local cache of source media downloaded from S3
+MEDIA_CACHE_DIR = os.getenv('MEDIA_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'media_cache'))
+MEDIA_CACHE_MAX_BYTES = int(os.getenv('MEDIA_CACHE_MAX_BYTES', 20 * 1024 * 1024 * 1024))
+MEDIA_CACHE_DOWNLOAD_CONCURRENCY = 8
+
+# /metrics (Prometheus) is denied unless one of these is set: METRICS_TOKEN, to require
+# "Authorization: Bearer <token>", or METRICS_ALLOWED_NETWORKS, comma-separated addresses
+# or CIDR ranges of the scrapers (e.g. "10.0.0.0/8"). Behind a proxy on the same host
+# every request comes from its address, so don't list that one.
+# With several worker processes, export PROMETHEUS_MULTIPROC_DIR (an empty directory,
+# cleared on every deploy) before they start so /metrics aggregates all of them.
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+METRICS_ALLOWED_NETWORKS = [
+    network.strip() for network in os.getenv('METRICS_ALLOWED_NETWORKS', '').split(',') if network.strip()
+]
+
+# Stage spans kept in the timeline of a task (shown in the admin, exported as Chrome trace)
+TIMELINE_MAX_EVENTS = 5000
+
+# Number of ffmpeg stderr lines kept for error reports
+FFMPEG_STDERR_TAIL_LINES = 50
+
+# Seconds between batched progress UPDATEs for merge tasks
+MERGER_PROGRESS_FLUSH_INTERVAL = 2.0
+
+# Uploaded files are streamed to a spool file in FILE_UPLOAD_CHUNK_SIZE chunks and never
+# held in memory; the memory limits below only apply to regular form fields.
+FILE_UPLOAD_HANDLERS = ['hooks_app.upload_handlers.HashingTemporaryFileUploadHandler']
+FILE_UPLOAD_CHUNK_SIZE = 1024 * 1024
+FILE_UPLOAD_TEMP_DIR = os.getenv('FILE_UPLOAD_TEMP_DIR')
+DATA_UPLOAD_MAX_MEMORY_SIZE = 10 * 1024 * 1024
+FILE_UPLOAD_MAX_MEMORY_SIZE = 2621440
+
+# Presigned multipart uploads from the browser straight to S3
+DIRECT_UPLOAD_PART_SIZE = 16 * 1024 * 1024
+DIRECT_UPLOAD_URL_EXPIRATION = 3600
+
+# Merges with at most this many short/large pairs skip the preprocessed intermediates
+MERGER_FUSED_MAX_PAIRS = 4
+
+# Single-decode merges: concurrent multi-output ffmpeg jobs, the memory they may use together
+# (default: half of the available memory) and the frames each encoder keeps in flight
+MERGER_MULTI_OUTPUT_JOBS = 2
+MERGER_MULTI_OUTPUT_MEMORY_BYTES = None
+MERGER_ENCODER_FRAMES_IN_FLIGHT = 60
+
+# Largest video accepted by the merger upload
+MERGER_MAX_UPLOAD_SIZE = 1 * 1024 * 1024 * 1024
+
+# Output uploads: files uploaded at once per task, and parallel parts per file
+UPLOAD_STAGE_WORKERS = 4
+UPLOAD_PART_CONCURRENCY = 4
+
+# Shared S3 client: connections kept per host (enough for every concurrent upload part
+# and a few concurrent cache downloads) and attempts per request with adaptive retries
+S3_MAX_POOL_CONNECTIONS = max(
+  50, UPLOAD_STAGE_WORKERS * UPLOAD_PART_CONCURRENCY + MEDIA_CACHE_DOWNLOAD_CONCURRENCY * 4
+)
+S3_MAX_ATTEMPTS = 10
+
+# Downloads: lifetime of presigned redirect URLs, and where local-storage outputs live.
+# Set DOWNLOAD_SENDFILE_HEADER (e.g. X-Accel-Redirect) to let the front server send local files.
+DOWNLOAD_URL_EXPIRATION = 3600
+LOCAL_DOWNLOAD_ROOT = os.path.join(BASE_DIR, 'media')
+DOWNLOAD_SENDFILE_HEADER = os.getenv('DOWNLOAD_SENDFILE_HEADER')
+DOWNLOAD_SENDFILE_PREFIX = os.getenv('DOWNLOAD_SENDFILE_PREFIX', '/protected-media/')
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 
 DOMAIN = 'http://91.108.112.100:6816'
@@ -0,0 +1,343 @@
+# Shared object storage helpers for the hooks and merger apps
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+import boto3
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
+from django.conf import settings
+
+from .metrics import QUEUE_DEPTH, S3_POOL_FULL_DISCARDS, record_s3_pool, record_s3_transfer, time_stage
+from .timeline import bind
+
+logger = logging.getLogger(__name__)
+
+_s3_client = None
+_s3_client_lock = threading.Lock()
+
+
+class _PoolFullCounter(logging.Filter):
+    """
+    Counts urllib3's "Connection pool is full" warnings, the sign of an undersized pool:
+    every such connection is thrown away and the next request pays a new TLS handshake.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.count = 0
+
+    def filter(self, record):
+        if record.getMessage().startswith('Connection pool is full'):
+            self.count += 1
+            S3_POOL_FULL_DISCARDS.inc()
+        return True
+
+
+_pool_full_counter = _PoolFullCounter()
+logging.getLogger('urllib3.connectionpool').addFilter(_pool_full_counter)
+
+
+def get_s3_client():
+    """
+    Return the process-wide S3 client, creating it on first use.
+
+    boto3 clients are thread-safe, so one instance, with one connection pool, is shared
+    by all worker threads and reuses its connections across uploads and downloads. The
+    pool is sized for the upload and download concurrency (S3_MAX_POOL_CONNECTIONS) and
+    throttled requests are retried with adaptive backoff.
+    """
+    global _s3_client
+    if _s3_client is None:
+        with _s3_client_lock:
+            if _s3_client is None:
+                _s3_client = boto3.client(
+                    's3',
+                    aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
+                    aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
+                    region_name=settings.AWS_S3_REGION_NAME,
+                    config=Config(
+                        max_pool_connections=getattr(settings, 'S3_MAX_POOL_CONNECTIONS', 50),
+                        retries={
+                            'mode': 'adaptive',
+                            'max_attempts': getattr(settings, 'S3_MAX_ATTEMPTS', 10),
+                        },
+                    )
+                )
+    return _s3_client
+
+
+def s3_pool_stats():
+    """
+    Connection pool usage of the shared S3 client.
+
+    Returns a dict with the pool size per host, the connections currently checked out
+    and idle (summed over hosts), and how many connections were discarded because the
+    pool was full. in_use staying at max_pool_connections means requests queue for a
+    connection.
+    """
+    stats = {
+        'max_pool_connections': getattr(settings, 'S3_MAX_POOL_CONNECTIONS', 50),
+        'pools': 0,
+        'in_use': 0,
+        'idle': 0,
+        'full_discards': _pool_full_counter.count,
+    }
+    if _s3_client is None:
+        return stats
+    # botocore keeps its urllib3 PoolManager private; report nothing if the layout changes
+    http_session = getattr(_s3_client._endpoint, 'http_session', None)
+    pools = getattr(getattr(http_session, '_manager', None), 'pools', None)
+    if pools is None:
+        return stats
+    for key in list(pools.keys()):
+        pool = pools.get(key)
+        queue = getattr(pool, 'pool', None)
+        if queue is None:
+            continue
+        stats['pools'] += 1
+        stats['in_use'] += pool.pool.maxsize - queue.qsize()
+        stats['idle'] += sum(1 for connection in list(queue.queue) if connection is not None)
+    return stats
+
+
+def upload_to_s3(file_path, bucket_name, s3_key):
+    """
+    Upload a local file to S3 with the shared client and return its URL.
+    """
+    with time_stage('upload') as upload:
+        get_s3_client().upload_file(file_path, bucket_name, s3_key)
+        upload['bytes'] = os.path.getsize(file_path)
+    record_s3_transfer('upload', upload['bytes'])
+    file_url = s3_object_url(bucket_name, s3_key)
+    logger.info(f"Uploaded to S3: {file_url}")
+    return file_url
+
+
+def parse_s3_url(s3_url):
+    """
+    Split a bucket URL (https://<bucket>.s3.<region>.amazonaws.com/<key>) into bucket and key.
+    Falls back to the configured bucket when the URL has no host.
+    """
+    parsed_url = urlparse(s3_url)
+    bucket_name = parsed_url.netloc.split('.')[0]
+    bucket_name = bucket_name if bucket_name else settings.AWS_STORAGE_BUCKET_NAME
+    object_key = parsed_url.path.lstrip('/')
+    return bucket_name, object_key
+
+
+def s3_object_url(bucket_name, s3_key):
+    """
+    Public URL of an object, in the format stored on tasks.
+    """
+    return f"https://{bucket_name}.s3.{settings.AWS_S3_REGION_NAME}.amazonaws.com/{s3_key}"
+
+
+def start_multipart_upload(s3_key, file_size, content_type='application/octet-stream'):
+    """
+    Start a multipart upload and presign one PUT URL per part so the browser can upload
+    the parts directly to S3, in parallel.
+
+    Returns a dict with the key, the upload id, the part size and the part URLs
+    (part N is uploaded to part_urls[N - 1]).
+    """
+    bucket_name = settings.AWS_STORAGE_BUCKET_NAME
+    part_size = getattr(settings, 'DIRECT_UPLOAD_PART_SIZE', 16 * 1024 * 1024)
+    # S3 allows at most 10000 parts per upload; grow the parts for very large files
+    part_size = max(part_size, -(-file_size // 10000))
+    part_count = max(1, -(-file_size // part_size))
+    expiration = getattr(settings, 'DIRECT_UPLOAD_URL_EXPIRATION', 3600)
+
+    client = get_s3_client()
+    upload = client.create_multipart_upload(
+        Bucket=bucket_name, Key=s3_key, ContentType=content_type
+    )
+    part_urls = [
+        client.generate_presigned_url(
+            'upload_part',
+            Params={
+                'Bucket': bucket_name,
+                'Key': s3_key,
+                'UploadId': upload['UploadId'],
+                'PartNumber': part_number,
+            },
+            ExpiresIn=expiration
+        )
+        for part_number in range(1, part_count + 1)
+    ]
+    return {
+        'key': s3_key,
+        'uploadId': upload['UploadId'],
+        'partSize': part_size,
+        'partUrls': part_urls,
+    }
+
+
+def parse_upload_size(value):
+    """
+    File size in bytes announced by the browser for a direct upload, or None when it is
+    missing, not a whole number or negative.
+    """
+    try:
+        size = int(value)
+    except (TypeError, ValueError):
+        return None
+    return size if size >= 0 else None
+
+
+def complete_multipart_upload(s3_key, upload_id, parts):
+    """
+    Assemble the uploaded parts into the final object and return its URL.
+    parts: list of {'PartNumber': int, 'ETag': str} as reported by the browser
+    """
+    bucket_name = settings.AWS_STORAGE_BUCKET_NAME
+    client = get_s3_client()
+    client.complete_multipart_upload(
+        Bucket=bucket_name,
+        Key=s3_key,
+        UploadId=upload_id,
+        MultipartUpload={
+            'Parts': sorted(
+                [{'PartNumber': int(part['PartNumber']), 'ETag': part['ETag']} for part in parts],
+                key=lambda part: part['PartNumber']
+            )
+        }
+    )
+    return s3_object_url(bucket_name, s3_key)
+
+
+def abort_multipart_upload(s3_key, upload_id):
+    """
+    Discard an unfinished multipart upload and its stored parts.
+    """
+    get_s3_client().abort_multipart_upload(
+        Bucket=settings.AWS_STORAGE_BUCKET_NAME, Key=s3_key, UploadId=upload_id
+    )
+
+
+class UploadStage:
+    """
+    Uploads output files to S3 as soon as they are handed over, on a bounded thread pool,
+    while the rest of the task keeps rendering.
+
+    on_uploaded: optional callable receiving {'file_name', 'video_link'} for every finished
+                 upload, called from the upload threads (e.g. to record the link on the task)
+    thumbnails: also upload the poster and preview clip of every output, adding their
+                links as 'poster_link' and 'preview_link'. Files that the pipeline did not
+                write next to the output (see hooks_app.thumbnails) are rendered here.
+
+    Usage:
+        with UploadStage(on_uploaded=record_link) as uploads:
+            uploads.submit(path, s3_key)
+    Leaving the block waits for all uploads and raises the first upload error.
+    """
+
+    def __init__(self, on_uploaded=None, max_workers=None, thumbnails=False):
+        self.on_uploaded = on_uploaded
+        self.thumbnails = thumbnails
+        self.bucket_name = settings.AWS_STORAGE_BUCKET_NAME
+        self.transfer_config = TransferConfig(
+            multipart_threshold=16 * 1024 * 1024,
+            multipart_chunksize=16 * 1024 * 1024,
+            max_concurrency=getattr(settings, 'UPLOAD_PART_CONCURRENCY', 4),
+        )
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers or getattr(settings, 'UPLOAD_STAGE_WORKERS', 4),
+            thread_name_prefix='upload-stage'
+        )
+        self._futures = []
+
+    def submit(self, file_path, s3_key, file_name=None):
+        """
+        Queue ``file_path`` for upload to ``s3_key``. Returns a future for the link dict.
+        The upload is recorded on the timeline track of the caller.
+        """
+        QUEUE_DEPTH.labels('upload').inc()
+        future = self._executor.submit(
+            bind(self._upload), file_path, s3_key, file_name or os.path.basename(file_path)
+        )
+        future.add_done_callback(lambda _: QUEUE_DEPTH.labels('upload').dec())
+        self._futures.append(future)
+        return future
+
+    def _upload(self, file_path, s3_key, file_name):
+        with time_stage('upload') as upload:
+            get_s3_client().upload_file(
+                file_path, self.bucket_name, s3_key, Config=self.transfer_config
+            )
+            upload['bytes'] = os.path.getsize(file_path)
+        record_s3_transfer('upload', upload['bytes'])
+        video = {
+            'file_name': file_name,
+            'video_link': s3_object_url(self.bucket_name, s3_key),
+        }
+        logger.info(f"Uploaded to S3: {video['video_link']}")
+        if self.thumbnails:
+            video.update(self._upload_thumbnails(file_path, s3_key))
+        pool = s3_pool_stats()
+        record_s3_pool(pool)
+        if pool['in_use'] >= pool['max_pool_connections']:
+            logger.warning(f"S3 connection pool saturated: {pool}")
+        if self.on_uploaded:
+            self.on_uploaded(video)
+        return video
+
+    def _upload_thumbnails(self, file_path, s3_key):
+        """
+        Best effort: an output without a poster is still listed on the result page.
+        """
+        from .thumbnails import render_thumbnails, thumbnail_paths
+
+        links = {}
+        local_files = thumbnail_paths(file_path)
+        if not all(os.path.exists(path) for path in local_files):
+            render_thumbnails(file_path)
+        for link_name, local_file, key in zip(
+            ('poster_link', 'preview_link'), local_files, thumbnail_paths(s3_key)
+        ):
+            if not os.path.exists(local_file):
+                continue
+            try:
+                get_s3_client().upload_file(local_file, self.bucket_name, key)
+                record_s3_transfer('upload', os.path.getsize(local_file))
+                links[link_name] = s3_object_url(self.bucket_name, key)
+            except Exception as e:
+                logger.warning(f"Could not upload {local_file}: {e}")
+        return links
+
+    def wait(self):
+        """
+        Wait for every queued upload and return the link dicts in submission order.
+        """
+        return [future.result() for future in self._futures]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            if exc_type is None:
+                self.wait()
+        finally:
+            self._executor.shutdown(wait=True)
+
+
+class VideoLinkRecorder:
+    """
+    UploadStage callback that records every finished output on its task right away,
+    so finished videos show up while the rest of the task is still running.
+
+    queryset: queryset selecting the task row, e.g. Task.objects.filter(task_id=task_id)
+    """
+
+    def __init__(self, queryset):
+        self.queryset = queryset
+        self.video_links = []
+        self._lock = threading.Lock()
+
+    def __call__(self, video):
+        with self._lock:
+            self.video_links.append(video)
+            self.queryset.update(video_links=list(self.video_links))
@@ -0,0 +1,117 @@
+# Poster frames and short preview clips of task outputs, for the result pages
+import logging
+import os
+
+from django.conf import settings
+from django.core.paginator import Paginator
+
+from .downloads import presigned_view_url
+from .ffmpeg import run_ffmpeg
+
+logger = logging.getLogger(__name__)
+
+# The poster is the most representative of the first frames (ffmpeg's thumbnail filter),
+# which skips the black or blank frame many videos start with
+POSTER_CANDIDATE_FRAMES = 30
+
+POSTER_CODECS = {
+    'jpg': ['-c:v', 'mjpeg', '-q:v', '4'],
+    'webp': ['-c:v', 'libwebp', '-quality', '75'],
+}
+
+
+def thumbnail_paths(video_file):
+    """
+    Paths of the poster and the preview clip of ``video_file`` (a local path or an S3 key).
+    """
+    stem = os.path.splitext(video_file)[0]
+    poster_format = getattr(settings, 'THUMBNAIL_POSTER_FORMAT', 'jpg')
+    return f"{stem}.poster.{poster_format}", f"{stem}.preview.mp4"
+
+
+def thumbnail_outputs(video_label, video_file, keep_main=True, source=None):
+    """
+    Filters and output options that write the poster and preview clip of ``video_file``
+    from the ``video_label`` stream of an ffmpeg filtergraph, so they come out of the
+    same decode as the video itself.
+
+    keep_main: also split off a copy of the stream for the video output itself
+    source: stream to read instead of ``[video_label]``, e.g. ``[0:v]``; the new labels
+            are still named after ``video_label``
+
+    Returns (filters, output arguments, label of the stream for the main output or None).
+    """
+    poster_file, preview_file = thumbnail_paths(video_file)
+    width = getattr(settings, 'THUMBNAIL_WIDTH', 320)
+    poster_format = getattr(settings, 'THUMBNAIL_POSTER_FORMAT', 'jpg')
+
+    main_label = f"{video_label}_main" if keep_main else None
+    branches = [f"[{video_label}_poster]", f"[{video_label}_preview]"]
+    if keep_main:
+        branches.insert(0, f"[{main_label}]")
+    filters = [
+        (source or f"[{video_label}]") + f"split={len(branches)}" + ''.join(branches),
+        f"[{video_label}_poster]trim=end_frame={POSTER_CANDIDATE_FRAMES},"
+        f"thumbnail={POSTER_CANDIDATE_FRAMES},scale={width}:-2[{video_label}_poster_out]",
+        f"[{video_label}_preview]trim=duration={getattr(settings, 'THUMBNAIL_PREVIEW_SECONDS', 4)},"
+        f"setpts=PTS-STARTPTS,fps={getattr(settings, 'THUMBNAIL_PREVIEW_FPS', 12)},"
+        f"scale={width}:-2,format=yuv420p[{video_label}_preview_out]",
+    ]
+    output_args = [
+        '-map', f'[{video_label}_poster_out]',
+        '-frames:v', '1',
+        '-update', '1',
+        *POSTER_CODECS[poster_format],
+        poster_file,
+        '-map', f'[{video_label}_preview_out]',
+        '-an',
+        '-c:v', 'libx264',
+        '-preset', 'veryfast',
+        '-crf', str(getattr(settings, 'THUMBNAIL_PREVIEW_CRF', 32)),
+        '-movflags', '+faststart',
+        preview_file,
+    ]
+    return filters, output_args, main_label
+
+
+def render_thumbnails(video_file):
+    """
+    Write the poster and preview clip of an existing video, for outputs that were not
+    encoded by an ffmpeg graph of ours (moviepy renders, remuxed or passed-through files).
+    Only the first seconds of the video are read.
+    Returns True on success.
+    """
+    filters, output_args, _ = thumbnail_outputs('thumb', video_file, keep_main=False, source='[0:v]')
+    command = [
+        'ffmpeg', '-y',
+        '-t', str(getattr(settings, 'THUMBNAIL_PREVIEW_SECONDS', 4)),
+        '-i', video_file,
+        '-filter_complex', ';'.join(filters),
+    ] + output_args
+
+    result = run_ffmpeg(command, stage='thumbnails')
+    if not result.ok:
+        logger.warning(f"Could not render thumbnails of {video_file}: {result.stderr_tail}")
+        for path in thumbnail_paths(video_file):
+            if os.path.exists(path):
+                os.remove(path)
+        return False
+    return True
+
+
+def result_page(video_links, page_number):
+    """
+    One page of a task's outputs for its result page, with browser URLs of their
+    posters and preview clips added as ``poster_url`` and ``preview_url``.
+    """
+    paginator = Paginator(video_links or [], getattr(settings, 'RESULTS_PAGE_SIZE', 24))
+    page = paginator.get_page(page_number)
+    page.object_list = [
+        dict(
+            video,
+            poster_url=presigned_view_url(video['poster_link']) if video.get('poster_link') else None,
+            preview_url=presigned_view_url(video['preview_link']) if video.get('preview_link') else None,
+        )
+        for video in page.object_list
+    ]
+    return page
@@ -0,0 +1,213 @@
+# Per-task performance timelines: stage spans of every row or pair, stored on the task
+import contextlib
+import functools
+import logging
+import os
+import socket
+import threading
+import time
+from datetime import datetime, timezone
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Timeline and track the current thread records into (see TaskTimeline.activate)
+_local = threading.local()
+
+# Track of the stages that belong to the task as a whole (sheet fetch, source downloads)
+TASK_TRACK = 'task'
+
+
+class TaskTimeline:
+    """
+    Stage spans of one task run, grouped into tracks ('row 3', 'pair intro_main', ...).
+
+    Stages are recorded by hooks_app.metrics.time_stage in whichever thread runs them;
+    threads started by the pipeline join the timeline through ``bind``. The timeline is
+    written to the ``timeline`` field of the task once the run ends (see ``save``).
+    """
+
+    def __init__(self, queryset):
+        self.queryset = queryset
+        self.node = socket.gethostname()
+        self.pid = os.getpid()
+        self.started = time.time()
+        self.queued_at = queryset.values_list('queued_at', flat=True).first()
+        self.max_events = getattr(settings, 'TIMELINE_MAX_EVENTS', 5000)
+        self.events = []
+        self.dropped_events = 0
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def activate(self, track=TASK_TRACK):
+        """
+        Record the stages run by this thread (and the threads it binds) until the block
+        ends, then save the timeline, whether the run succeeded or not.
+        """
+        previous = getattr(_local, 'timeline', None), getattr(_local, 'track', None)
+        _local.timeline, _local.track = self, track
+        try:
+            yield self
+        finally:
+            _local.timeline, _local.track = previous
+            self.save()
+
+    def record(self, track, stage, started, seconds, details=None):
+        """
+        Add a span of ``stage`` that began at ``started`` (time.time()) and took ``seconds``.
+
+        details: optional dict with ``bytes``, ``speed`` (x realtime) or ``media_seconds``
+                 (duration of the encoded media, the speed is derived from it)
+        """
+        event = {
+            'track': track,
+            'stage': stage,
+            'start': round(started - self.started, 4),
+            'seconds': round(seconds, 4),
+        }
+        details = details or {}
+        if details.get('bytes'):
+            event['bytes'] = details['bytes']
+        speed = details.get('speed')
+        if speed is None and details.get('media_seconds') and seconds > 0:
+            speed = details['media_seconds'] / seconds
+        if speed is not None:
+            event['speed'] = round(speed, 3)
+        with self._lock:
+            if len(self.events) < self.max_events:
+                self.events.append(event)
+            else:
+                self.dropped_events += 1
+
+    def as_dict(self):
+        with self._lock:
+            events = sorted(self.events, key=lambda event: event['start'])
+            dropped_events = self.dropped_events
+        finished = time.time()
+        return {
+            'node': self.node,
+            'pid': self.pid,
+            'queued_at': self.queued_at.isoformat() if self.queued_at else None,
+            'started_at': _isoformat(self.started),
+            'finished_at': _isoformat(finished),
+            'queued_seconds': (
+                round(self.started - self.queued_at.timestamp(), 4) if self.queued_at else None
+            ),
+            'total_seconds': round(finished - self.started, 4),
+            'events': events,
+            'dropped_events': dropped_events,
+        }
+
+    def save(self):
+        try:
+            self.queryset.update(timeline=self.as_dict())
+        except Exception as e:
+            logger.error(f"Could not save the timeline: {e}")
+
+
+def _isoformat(timestamp):
+    return datetime.fromtimestamp(timestamp, timezone.utc).isoformat()
+
+
+def current_timeline():
+    return getattr(_local, 'timeline', None)
+
+
+@contextlib.contextmanager
+def track(name):
+    """
+    Record the stages of the block under track ``name`` of the current timeline, if any.
+    """
+    previous = getattr(_local, 'track', None)
+    _local.track = name
+    try:
+        yield
+    finally:
+        _local.track = previous
+
+
+def bind(func, track_name=None):
+    """
+    Wrap ``func`` to record into the caller's timeline when it runs on another thread,
+    under ``track_name`` or the caller's track. Without a current timeline ``func`` is
+    returned as is.
+    """
+    timeline = current_timeline()
+    if timeline is None:
+        return func
+    track_name = track_name or getattr(_local, 'track', None) or TASK_TRACK
+
+    @functools.wraps(func)
+    def bound(*args, **kwargs):
+        previous = getattr(_local, 'timeline', None), getattr(_local, 'track', None)
+        _local.timeline, _local.track = timeline, track_name
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _local.timeline, _local.track = previous
+    return bound
+
+
+def record_stage(stage, started, seconds, details=None):
+    """
+    Add a stage span to the timeline of the current thread, if it has one.
+    """
+    timeline = current_timeline()
+    if timeline is not None:
+        timeline.record(getattr(_local, 'track', None) or TASK_TRACK, stage, started, seconds, details)
+
+
+def chrome_trace(timelines):
+    """
+    Convert {task_id: stored timeline} to the Chrome trace event format, loadable in
+    chrome://tracing and https://ui.perfetto.dev. Every task is a process with one thread
+    per track, its queue wait is a 'queued' span, and times start at the earliest queue time.
+    """
+    started = {
+        task_id: datetime.fromisoformat(timeline['started_at']).timestamp()
+        for task_id, timeline in timelines.items()
+    }
+    origin = min(
+        (started[task_id] - (timeline.get('queued_seconds') or 0) for task_id, timeline in timelines.items()),
+        default=0
+    )
+
+    trace_events = []
+    for pid, (task_id, timeline) in enumerate(timelines.items(), start=1):
+        started_us = (started[task_id] - origin) * 1e6
+        trace_events.append({
+            'name': 'process_name', 'ph': 'M', 'pid': pid,
+            'args': {'name': f"{task_id} on {timeline['node']} (pid {timeline['pid']})"},
+        })
+        tracks = {TASK_TRACK: 0}
+        for event in timeline['events']:
+            tracks.setdefault(event['track'], len(tracks))
+        for name, tid in tracks.items():
+            trace_events.append({
+                'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid, 'args': {'name': name},
+            })
+            trace_events.append({
+                'name': 'thread_sort_index', 'ph': 'M', 'pid': pid, 'tid': tid, 'args': {'sort_index': tid},
+            })
+
+        if timeline.get('queued_seconds'):
+            trace_events.append({
+                'name': 'queued', 'cat': 'queue', 'ph': 'X', 'pid': pid, 'tid': 0,
+                'ts': round(started_us - timeline['queued_seconds'] * 1e6),
+                'dur': round(timeline['queued_seconds'] * 1e6),
+            })
+        trace_events.append({
+            'name': 'run', 'cat': 'task', 'ph': 'X', 'pid': pid, 'tid': 0,
+            'ts': round(started_us), 'dur': round(timeline['total_seconds'] * 1e6),
+        })
+        for event in timeline['events']:
+            trace_events.append({
+                'name': event['stage'], 'cat': 'stage', 'ph': 'X', 'pid': pid,
+                'tid': tracks[event['track']],
+                'ts': round(started_us + event['start'] * 1e6),
+                'dur': round(event['seconds'] * 1e6),
+                'args': {key: event[key] for key in ('bytes', 'speed') if key in event},
+            })
+    return {'traceEvents': trace_events, 'displayTimeUnit': 'ms'}
+
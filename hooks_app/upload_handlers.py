@@ -0,0 +1,32 @@
+# Upload handlers shared by the hooks and merger upload views
+import hashlib
+
+from django.conf import settings
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+
+
+class HashingTemporaryFileUploadHandler(TemporaryFileUploadHandler):
+    """
+    Streams every uploaded file straight to a temporary spool file in fixed-size chunks,
+    whatever its size, and hashes it on the way.
+
+    Django's default handler chain keeps files below FILE_UPLOAD_MAX_MEMORY_SIZE in memory;
+    with large video uploads that means whole files in RAM. Here memory use per upload is
+    bounded by ``chunk_size``. The SHA-256 of the content is available on the uploaded
+    file as ``sha256`` once the upload completes.
+    """
+
+    chunk_size = getattr(settings, 'FILE_UPLOAD_CHUNK_SIZE', 1024 * 1024)
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.hasher = hashlib.sha256()
+
+    def receive_data_chunk(self, raw_data, start):
+        self.hasher.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        uploaded_file = super().file_complete(file_size)
+        uploaded_file.sha256 = self.hasher.hexdigest()
+        return uploaded_file
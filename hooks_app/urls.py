@@ -4,6 +4,8 @@ from django.conf import settings
 from django.conf.urls.static import static
 from django.contrib.auth import views as auth_views
 
+from .metrics import metrics_view
+
 # Define URL patterns for the application
 urlpatterns = [
     # Include URLs from the account app
@@ -11,6 +13,9 @@ urlpatterns = [
     
     # Admin site URL
     path("admin/", admin.site.urls),
+
+    # Prometheus metrics of the render and merge pipelines
+    path("metrics", metrics_view, name="metrics"),
     
     # Include URLs from the hooks app
     path("hooks/", include("hooks.urls", namespace="hooks")),
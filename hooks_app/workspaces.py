@@ -0,0 +1,209 @@
+# Per-task scratch directories with disk-space admission control
+import contextlib
+import fcntl
+import json
+import logging
+import os
+import shutil
+import socket
+import threading
+import time
+
+from django.conf import settings
+
+from .metrics import QUEUE_DEPTH, time_stage
+
+logger = logging.getLogger(__name__)
+
+OWNER_FILE = '.owner'
+
+
+def directory_size(path):
+    """
+    Bytes used by the files below ``path``.
+    """
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for name in filenames:
+            try:
+                total += os.lstat(os.path.join(dirpath, name)).st_size
+            except FileNotFoundError:
+                pass
+    return total
+
+
+class WorkspaceManager:
+    """
+    Hands out one scratch directory per task below ``root``.
+
+    A task states how much disk it expects to need. It is only admitted when the free
+    space of the volume, minus what already admitted tasks still expect to write and
+    a safety margin, covers the estimate; otherwise it waits until running tasks finish.
+    The admission check is serialized across processes with an flock on the root.
+
+    Every workspace records its owner (host, pid) and reservation in an ``.owner`` file,
+    which its process keeps locked (flock) until the workspace is released. Workspaces are
+    removed when the task leaves the ``workspace`` block; an ``.owner`` file that can be
+    locked again belongs to a process that is gone (after a crash or kill, even when a
+    restarted worker reuses its pid), and its workspace is removed by the next admission
+    check or cleanup_orphans.
+    """
+
+    def __init__(self, root, min_free_bytes=0, poll_interval=5.0):
+        self.root = root
+        self.min_free_bytes = min_free_bytes
+        self.poll_interval = poll_interval
+        self.hostname = socket.gethostname()
+        self._released = threading.Condition()
+        os.makedirs(self.root, exist_ok=True)
+
+    @contextlib.contextmanager
+    def workspace(self, task_id, required_bytes, on_wait=None):
+        """
+        Create a workspace for ``task_id`` once ``required_bytes`` fit on the volume,
+        yield its path and remove it afterwards.
+
+        on_wait: optional callable, called once if the task has to wait for disk space
+        """
+        with time_stage('workspace_wait'):
+            path, owner_file = self._admit(task_id, required_bytes, on_wait)
+        try:
+            yield path
+        finally:
+            shutil.rmtree(path, ignore_errors=True)
+            # Closing releases the owner lock
+            owner_file.close()
+            logger.info(f"Workspace removed: {path}")
+            with self._released:
+                self._released.notify_all()
+
+    def _admit(self, task_id, required_bytes, on_wait):
+        waiting = False
+        try:
+            while True:
+                with self._root_lock():
+                    available, active = self._available_bytes()
+                    if required_bytes > available and not active:
+                        # Nothing to wait for; an oversized task runs alone and may still fit
+                        logger.warning(
+                            f"Task {task_id} needs {required_bytes} bytes, only {available} available"
+                        )
+                    if required_bytes <= available or not active:
+                        path = os.path.join(self.root, f"task_{task_id}")
+                        shutil.rmtree(path, ignore_errors=True)
+                        os.makedirs(path)
+                        # Held open and locked for as long as the workspace is in use
+                        owner_file = open(os.path.join(path, OWNER_FILE), 'w')
+                        fcntl.flock(owner_file, fcntl.LOCK_EX)
+                        json.dump({
+                            'host': self.hostname,
+                            'pid': os.getpid(),
+                            'reserved_bytes': required_bytes,
+                            'created_at': time.time(),
+                        }, owner_file)
+                        owner_file.flush()
+                        logger.info(f"Workspace created: {path} ({required_bytes} bytes reserved)")
+                        return path, owner_file
+
+                if not waiting:
+                    waiting = True
+                    QUEUE_DEPTH.labels('workspace').inc()
+                    logger.info(
+                        f"Task {task_id} waits for disk space: needs {required_bytes} bytes, "
+                        f"{available} available"
+                    )
+                    if on_wait:
+                        on_wait()
+                # Woken early when a workspace of this process is released
+                with self._released:
+                    self._released.wait(self.poll_interval)
+        finally:
+            if waiting:
+                QUEUE_DEPTH.labels('workspace').dec()
+
+    def _available_bytes(self):
+        """
+        Free bytes on the volume that are not yet promised to admitted workspaces, and
+        the number of live workspaces. Orphaned workspaces found on the way are removed.
+        """
+        outstanding = 0
+        active = 0
+        for path, owner in self._workspaces():
+            if self._is_alive(path, owner):
+                active += 1
+                outstanding += max(0, owner.get('reserved_bytes', 0) - directory_size(path))
+            else:
+                shutil.rmtree(path, ignore_errors=True)
+                logger.warning(f"Removed orphaned workspace: {path}")
+        return shutil.disk_usage(self.root).free - outstanding - self.min_free_bytes, active
+
+    def cleanup_orphans(self):
+        """
+        Remove workspaces left behind by processes of this host that no longer run.
+        """
+        with self._root_lock():
+            for path, owner in self._workspaces():
+                if not self._is_alive(path, owner):
+                    shutil.rmtree(path, ignore_errors=True)
+                    logger.warning(f"Removed orphaned workspace: {path}")
+
+    def _workspaces(self):
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            if not name.startswith('task_') or not os.path.isdir(path):
+                continue
+            try:
+                with open(os.path.join(path, OWNER_FILE)) as owner_file:
+                    owner = json.load(owner_file)
+            except (OSError, ValueError):
+                # Workspaces are created under the root lock, so this one was never finished
+                owner = {}
+            yield path, owner
+
+    def _is_alive(self, path, owner):
+        if not owner:
+            return False
+        if owner.get('host') != self.hostname:
+            # Shared volume: only the owning host can tell
+            return True
+        # The owner holds the lock until it releases the workspace; the kernel drops it
+        # when the process dies
+        try:
+            with open(os.path.join(path, OWNER_FILE)) as owner_file:
+                fcntl.flock(owner_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return True
+        except OSError:
+            return False
+        return False
+
+    @contextlib.contextmanager
+    def _root_lock(self):
+        with open(os.path.join(self.root, '.lock'), 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+_workspace_manager = None
+_workspace_manager_lock = threading.Lock()
+
+
+def get_workspace_manager():
+    """
+    Return the process-wide workspace manager, removing orphaned workspaces on first use.
+    """
+    global _workspace_manager
+    if _workspace_manager is None:
+        with _workspace_manager_lock:
+            if _workspace_manager is None:
+                manager = WorkspaceManager(
+                    settings.WORKSPACE_ROOT,
+                    getattr(settings, 'WORKSPACE_MIN_FREE_BYTES', 0),
+                    getattr(settings, 'WORKSPACE_POLL_INTERVAL', 5.0),
+                )
+                manager.cleanup_orphans()
+                _workspace_manager = manager
+    return _workspace_manager
@@ -1,8 +1,9 @@
 from django.contrib import admin
+from hooks_app.admin import TimelineAdminMixin
 from .models import MergeTask
 
 # Register the MergeTask model with the admin site
 @admin.register(MergeTask)
-class TaskAdmin(admin.ModelAdmin):
+class TaskAdmin(TimelineAdminMixin, admin.ModelAdmin):
     # Define the fields to be displayed in the admin list view
-    list_display = ['task_id', 'status', 'short_video_path', 'large_video_paths', 'video_links']
\ No newline at end of file
+    list_display = ['task_id', 'status', 'queued_at', 'short_video_path', 'large_video_paths', 'video_links']
@@ -0,0 +1,18 @@
+from django.db import migrations, models
+
+class Migration(migrations.Migration):
+  dependencies = [
+    ('merger', '0004_rename_progress_mergetask_total_frames_done'),
+  ]
+
+  operations = [
+    migrations.CreateModel(
+      name='MediaProbe',
+      fields=[
+        ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+        ('cache_key', models.CharField(max_length=255, unique=True)),
+        ('metadata', models.JSONField()),
+        ('created_at', models.DateTimeField(auto_now_add=True)),
+      ],
+    ),
+  ]
@@ -0,0 +1,35 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+class Migration(migrations.Migration):
+  dependencies = [
+    ('merger', '0005_mediaprobe'),
+  ]
+
+  operations = [
+    migrations.CreateModel(
+      name='MediaObject',
+      fields=[
+        ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+        ('sha256', models.CharField(max_length=64, unique=True)),
+        ('s3_key', models.CharField(max_length=1024)),
+        ('size', models.BigIntegerField(default=0)),
+        ('created_at', models.DateTimeField(auto_now_add=True)),
+      ],
+    ),
+    migrations.CreateModel(
+      name='MediaRendition',
+      fields=[
+        ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+        ('width', models.IntegerField()),
+        ('height', models.IntegerField()),
+        ('profile', models.CharField(max_length=50)),
+        ('s3_key', models.CharField(max_length=1024)),
+        ('created_at', models.DateTimeField(auto_now_add=True)),
+        ('media_object', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='renditions', to='merger.mediaobject')),
+      ],
+      options={
+        'unique_together': {('media_object', 'width', 'height', 'profile')},
+      },
+    ),
+  ]
@@ -0,0 +1,19 @@
+from django.db import migrations, models
+
+class Migration(migrations.Migration):
+  dependencies = [
+    ('merger', '0006_mediaobject_mediarendition'),
+  ]
+
+  operations = [
+    migrations.AddField(
+      model_name='mergetask',
+      name='queued_at',
+      field=models.DateTimeField(blank=True, null=True),
+    ),
+    migrations.AddField(
+      model_name='mergetask',
+      name='timeline',
+      field=models.JSONField(blank=True, null=True),
+    ),
+  ]
@@ -0,0 +1,14 @@
+from django.db import migrations, models
+
+class Migration(migrations.Migration):
+  dependencies = [
+    ('merger', '0007_mergetask_timeline'),
+  ]
+
+  operations = [
+    migrations.AddField(
+      model_name='mergetask',
+      name='source_names',
+      field=models.JSONField(blank=True, null=True),
+    ),
+  ]
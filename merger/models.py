@@ -16,6 +16,10 @@ class MergeTask(models.Model):
     
     # Links to the videos, stored as JSON
     video_links = models.JSONField(null=True, blank=True)
+
+    # File names the sources were uploaded as, {"short": [...], "large": [...]}; the outputs
+    # are named after them, since a deduplicated source is stored under another upload's key
+    source_names = models.JSONField(null=True, blank=True)
     
     # Number of frames processed so far
     total_frames_done = models.IntegerField(default=0)
@@ -23,6 +27,75 @@ class MergeTask(models.Model):
     # Total number of frames in the video
     total_frames = models.IntegerField(default=0)
 
+    # When processing was requested
+    queued_at = models.DateTimeField(null=True, blank=True)
+
+    # Stage spans of the processing run, per source and pair (see hooks_app.timeline)
+    timeline = models.JSONField(null=True, blank=True)
+
+    @property
+    def progress(self):
+        """Percentage of frames processed, capped at 100."""
+        if not self.total_frames:
+            return 0
+        return int(min(1, self.total_frames_done / self.total_frames) * 100)
+
     # String representation of the model
     def __str__(self) -> str:
         return self.status
+
+
+
+# Cached ffprobe metadata of a source file
+class MediaProbe(models.Model):
+    # Media cache entry name, derived from the S3 bucket, key and ETag
+    cache_key = models.CharField(max_length=255, unique=True)
+
+    # Parsed probe result (see merger.tools.probe.VideoMetadata)
+    metadata = models.JSONField()
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    # String representation of the model
+    def __str__(self) -> str:
+        return self.cache_key
+
+
+
+# Stored source video, deduplicated by content across tasks and apps
+class MediaObject(models.Model):
+    # SHA-256 of the file content, computed while it was uploaded
+    sha256 = models.CharField(max_length=64, unique=True)
+
+    # S3 key of the stored copy every task with this content reuses
+    s3_key = models.CharField(max_length=1024)
+
+    size = models.BigIntegerField(default=0)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    # String representation of the model
+    def __str__(self) -> str:
+        return self.sha256
+
+
+# Preprocessed copy of a MediaObject at a target resolution
+class MediaRendition(models.Model):
+    media_object = models.ForeignKey(MediaObject, on_delete=models.CASCADE, related_name='renditions')
+
+    width = models.IntegerField()
+    height = models.IntegerField()
+
+    # Encoding settings version; renditions of another profile are never reused
+    profile = models.CharField(max_length=50)
+
+    s3_key = models.CharField(max_length=1024)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('media_object', 'width', 'height', 'profile')
+
+    # String representation of the model
+    def __str__(self) -> str:
+        return f"{self.media_object_id} {self.width}x{self.height} {self.profile}"
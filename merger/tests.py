@@ -1,3 +1,197 @@
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+from django.test import SimpleTestCase, override_settings
+
+from merger import views
+from merger.tools import progress as progress_module
+from merger.tools.probe import VideoMetadata
+from merger.tools.progress import ProgressAccumulator, ffmpeg_frame_reporter
+
+
+def ffprobe_output(video=None, audio=None, container=None):
+    video_stream = {
+        'codec_type': 'video', 'codec_name': 'h264', 'profile': 'High', 'level': 40,
+        'width': 1080, 'height': 1920, 'pix_fmt': 'yuv420p',
+        'r_frame_rate': '30/1', 'avg_frame_rate': '30/1', 'time_base': '1/15360',
+        'sample_aspect_ratio': '1:1', 'nb_frames': '300', 'duration': '10.000000',
+        'extradata_hash': 'SHA256:video',
+    }
+    audio_stream = {
+        'codec_type': 'audio', 'codec_name': 'aac', 'sample_rate': '44100',
+        'channels': 2, 'channel_layout': 'stereo', 'extradata_hash': 'SHA256:audio',
+    }
+    video_stream.update(video or {})
+    audio_stream.update(audio or {})
+    return {
+        'streams': [video_stream, audio_stream],
+        'format': {'duration': '10.050000', 'bit_rate': '4000000', 'size': '5000000', **(container or {})},
+    }
+
+
+class VideoMetadataTests(SimpleTestCase):
+    def test_from_ffprobe(self):
+        metadata = VideoMetadata.from_ffprobe(ffprobe_output())
+
+        self.assertEqual((metadata.width, metadata.height), (1080, 1920))
+        self.assertEqual(metadata.nb_frames, 300)
+        self.assertEqual(metadata.duration, 10.0)
+        self.assertEqual(metadata.size, 5000000)
+        self.assertEqual(metadata.rotation, 0)
+        self.assertEqual(metadata.video_extradata_hash, 'SHA256:video')
+        self.assertTrue(metadata.has_audio)
+        self.assertEqual(metadata.fps, 30.0)
+        self.assertEqual(metadata.frame_count, 300)
+
+    def test_missing_values(self):
+        data = ffprobe_output(video={'nb_frames': 'N/A', 'duration': None})
+        data['streams'] = data['streams'][:1]
+        metadata = VideoMetadata.from_ffprobe(data)
+
+        self.assertIsNone(metadata.nb_frames)
+        # Falls back to the container duration, and the frame count to duration x fps
+        self.assertEqual(metadata.duration, 10.05)
+        self.assertEqual(metadata.frame_count, 302)
+        self.assertFalse(metadata.has_audio)
+
+    def test_rotation(self):
+        cases = [
+            ({'side_data_list': [{'side_data_type': 'Display Matrix', 'rotation': -90}]}, 270),
+            ({'tags': {'rotate': '90'}}, 90),
+            ({'side_data_list': [{'rotation': 180}], 'tags': {'rotate': '90'}}, 180),
+        ]
+        for video, rotation in cases:
+            with self.subTest(video=video):
+                self.assertEqual(VideoMetadata.from_ffprobe(ffprobe_output(video=video)).rotation, rotation)
+
+    def test_stored_probes_round_trip(self):
+        metadata = VideoMetadata.from_ffprobe(ffprobe_output())
+        self.assertEqual(VideoMetadata.from_dict(metadata.to_dict()), metadata)
+
+
+class StreamSignatureTests(SimpleTestCase):
+    def signature(self, **kwargs):
+        return VideoMetadata.from_ffprobe(ffprobe_output(**kwargs)).stream_signature
+
+    def test_same_parameters_match(self):
+        self.assertIsNotNone(self.signature())
+        self.assertEqual(self.signature(), self.signature(container={'size': '123'}))
+
+    def test_any_stream_parameter_differs(self):
+        cases = [
+            {'video': {'width': 720}},
+            {'video': {'profile': 'Main'}},
+            {'video': {'r_frame_rate': '25/1'}},
+            {'video': {'time_base': '1/90000'}},
+            {'video': {'tags': {'rotate': '90'}}},
+            {'video': {'extradata_hash': 'SHA256:other-encoder'}},
+            {'audio': {'sample_rate': '48000'}},
+            {'audio': {'extradata_hash': 'SHA256:other-audio'}},
+        ]
+        for kwargs in cases:
+            with self.subTest(**kwargs):
+                self.assertNotEqual(self.signature(**kwargs), self.signature())
+
+    def test_no_signature(self):
+        no_audio = ffprobe_output()
+        no_audio['streams'] = no_audio['streams'][:1]
+        self.assertIsNone(VideoMetadata.from_ffprobe(no_audio).stream_signature)
+        # Probes stored before the extradata was read are never stream-copied
+        self.assertIsNone(self.signature(video={'extradata_hash': None}))
+
+    def test_empty_input_list_is_not_stream_copyable(self):
+        self.assertFalse(views.can_stream_copy([]))
+
+
+class FFmpegFrameReporterTests(SimpleTestCase):
+    def test_nothing_to_report_to(self):
+        self.assertIsNone(ffmpeg_frame_reporter(None))
+
+    def test_reports_frames_since_the_previous_update(self):
+        progress = mock.Mock()
+        on_progress = ffmpeg_frame_reporter(progress)
+        for frame in (10, 25, None, 25, 20, 40):
+            on_progress({'frame': frame})
+        self.assertEqual([call.args[0] for call in progress.add.call_args_list], [10, 15, 15])
+
+    def test_counts_frames_once_per_output(self):
+        progress = mock.Mock()
+        on_progress = ffmpeg_frame_reporter(progress, outputs=3)
+        on_progress({'frame': 10})
+        progress.add.assert_called_once_with(30)
+
+
+class ProgressAccumulatorTests(SimpleTestCase):
+    def setUp(self):
+        patcher = mock.patch.object(progress_module, 'MergeTask')
+        self.merge_task = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.update = self.merge_task.objects.filter.return_value.update
+
+    def test_increments_are_summed_into_one_update(self):
+        progress = ProgressAccumulator('task')
+        progress.add(10)
+        progress.add(5)
+        progress.add(-3)
+        progress.add(0)
+        progress.flush()
+
+        self.merge_task.objects.filter.assert_called_once_with(task_id='task')
+        self.assertEqual(self.update.call_count, 1)
+        self.assertEqual(self.update.call_args.kwargs['total_frames_done'].rhs.value, 15)
+
+        progress.flush()
+        self.assertEqual(self.update.call_count, 1)
+
+    def test_failed_flush_keeps_the_frames(self):
+        self.update.side_effect = [Exception('database is gone'), 1]
+        progress = ProgressAccumulator('task')
+        progress.add(10)
+        progress.flush()
+        progress.add(5)
+        progress.flush()
+
+        self.assertEqual(self.update.call_args.kwargs['total_frames_done'].rhs.value, 15)
+
+
+@override_settings(MERGER_ENCODER_FRAMES_IN_FLIGHT=1)
+class PlanMultiOutputBatchesTests(SimpleTestCase):
+    """
+    Intros are batched by duration for as long as the batch fits the memory budget.
+    """
+
+    # 100x100 yuv420p frames of 15000 bytes at 10 fps
+    PROBES = {
+        'large.mp4': VideoMetadata(width=100, height=100, avg_frame_rate='10/1', duration=60.0),
+        'intro_c.mp4': VideoMetadata(width=100, height=100, duration=10.0),
+        'intro_a.mp4': VideoMetadata(width=100, height=100, duration=1.0),
+        'intro_b.mp4': VideoMetadata(width=100, height=100, duration=2.0),
+        'intro_unknown.mp4': None,
+    }
+    SHORT_FILES = ['intro_c.mp4', 'intro_a.mp4', 'intro_b.mp4']
+
+    def plan(self, short_files, memory_budget):
+        with mock.patch.object(views, 'probe_media', self.PROBES.get):
+            return views.plan_multi_output_batches(short_files, 'large.mp4', memory_budget)
+
+    def test_memory_estimate(self):
+        with mock.patch.object(views, 'probe_media', self.PROBES.get):
+            # intro_b queues 1s x 10 fps behind intro_a, plus one frame in flight per output
+            self.assertEqual(
+                views.multi_output_memory_bytes(['intro_a.mp4', 'intro_b.mp4'], 'large.mp4'),
+                (10 + 2) * 15000
+            )
+
+    def test_batches_follow_the_budget(self):
+        cases = [
+            (0, [[1], [2], [0]]),
+            (12 * 15000, [[1, 2], [0]]),
+            (103 * 15000, [[1, 2, 0]]),
+        ]
+        for memory_budget, batches in cases:
+            with self.subTest(memory_budget=memory_budget):
+                self.assertEqual(self.plan(self.SHORT_FILES, memory_budget), batches)
+
+    def test_unknown_duration_runs_alone(self):
+        self.assertEqual(
+            self.plan(['intro_a.mp4', 'intro_unknown.mp4'], 10 ** 12), [[1], [0]]
+        )
@@ -0,0 +1,43 @@
+# Reuse of the preprocessed renditions of deduplicated sources (see hooks_app.dedupe)
+import logging
+
+from django.conf import settings
+
+from hooks_app.metrics import record_cache_lookup
+from hooks_app.storage import upload_to_s3
+from merger.models import MediaRendition
+
+logger = logging.getLogger(__name__)
+
+# Encoding settings of preprocess_video; bump it when they change so older renditions
+# are no longer reused
+RENDITION_PROFILE = 'x264-yuv420p-30fps-aac-44k-stereo-v1'
+
+
+def find_rendition(media_object, resolution):
+    """
+    S3 key of the preprocessed copy of ``media_object`` at ``resolution``, or None.
+    """
+    width, height = resolution
+    rendition = MediaRendition.objects.filter(
+        media_object=media_object, width=width, height=height, profile=RENDITION_PROFILE
+    ).first()
+    record_cache_lookup('rendition', rendition is not None)
+    return rendition.s3_key if rendition else None
+
+
+def store_rendition(media_object, resolution, file_path):
+    """
+    Upload a preprocessed copy of ``media_object`` and record it for later tasks.
+    Best effort: failures are logged, the current task doesn't depend on it.
+    """
+    width, height = resolution
+    s3_key = f"media_renditions/{media_object.sha256}/{width}x{height}_{RENDITION_PROFILE}.mp4"
+    try:
+        upload_to_s3(file_path, settings.AWS_STORAGE_BUCKET_NAME, s3_key)
+        MediaRendition.objects.get_or_create(
+            media_object=media_object, width=width, height=height, profile=RENDITION_PROFILE,
+            defaults={'s3_key': s3_key}
+        )
+    except Exception as e:
+        logger.warning(f"Could not store rendition of {media_object.sha256}: {e}")
@@ -0,0 +1,235 @@
+# Single-pass ffprobe metadata with a persistent cache
+import collections
+import dataclasses
+import json
+import logging
+import os
+import subprocess
+import threading
+from fractions import Fraction
+
+from django.conf import settings
+
+from hooks_app.metrics import FFMPEG_PROCESSES, record_cache_lookup, time_stage
+from merger.models import MediaProbe
+
+logger = logging.getLogger(__name__)
+
+
+@dataclasses.dataclass
+class VideoMetadata:
+    """
+    Stream and container metadata of a media file, parsed from one ffprobe call.
+    """
+    width: int = None
+    height: int = None
+    video_codec: str = None
+    profile: str = None
+    level: int = None
+    pix_fmt: str = None
+    r_frame_rate: str = None
+    avg_frame_rate: str = None
+    time_base: str = None
+    sample_aspect_ratio: str = None
+    # Display rotation in degrees (0, 90, 180, 270); None for probes cached before it was read
+    rotation: int = None
+    # SHA-256 of the codec extradata (H.264 SPS/PPS, AAC config); None for probes cached
+    # before it was read
+    video_extradata_hash: str = None
+    nb_frames: int = None
+    duration: float = None
+    bit_rate: int = None
+    size: int = None
+    has_audio: bool = False
+    audio_codec: str = None
+    sample_rate: str = None
+    channels: int = None
+    channel_layout: str = None
+    audio_extradata_hash: str = None
+
+    @property
+    def has_video(self):
+        return bool(self.width and self.height)
+
+    @property
+    def fps(self):
+        """Average frame rate as a float, or None when ffprobe didn't report one."""
+        for rate in (self.avg_frame_rate, self.r_frame_rate):
+            try:
+                value = Fraction(rate)
+            except (TypeError, ValueError, ZeroDivisionError):
+                continue
+            if value > 0:
+                return float(value)
+        return None
+
+    @property
+    def frame_count(self):
+        """
+        Number of video frames, from the container's nb_frames when present and
+        estimated as duration x fps otherwise. No frames are decoded.
+        """
+        if self.nb_frames:
+            return self.nb_frames
+        if self.duration and self.fps:
+            return int(round(self.duration * self.fps))
+        return 0
+
+    @property
+    def stream_signature(self):
+        """
+        Parameters that must match for two files to be joined without re-encoding.
+        The extradata is compared too: the joined file keeps the first file's decoder
+        configuration, so files from different encoders decode corrupt past the join even
+        when all other parameters agree.
+        None if the file lacks a video or audio stream, or its extradata wasn't probed.
+        """
+        if not self.has_video or not self.has_audio or not self.video_extradata_hash:
+            return None
+        return (
+            (self.video_codec, self.profile, self.level, self.width, self.height, self.pix_fmt,
+             self.r_frame_rate, self.time_base, self.sample_aspect_ratio, self.rotation,
+             self.video_extradata_hash),
+            (self.audio_codec, self.sample_rate, self.channels, self.channel_layout,
+             self.audio_extradata_hash),
+        )
+
+    @classmethod
+    def from_ffprobe(cls, data):
+        streams = data.get('streams', [])
+        container = data.get('format', {})
+        video = next((s for s in streams if s.get('codec_type') == 'video'), {})
+        audio = next((s for s in streams if s.get('codec_type') == 'audio'), {})
+
+        def number(value, cast):
+            try:
+                return cast(value)
+            except (TypeError, ValueError):
+                return None
+
+        return cls(
+            width=video.get('width'),
+            height=video.get('height'),
+            video_codec=video.get('codec_name'),
+            profile=video.get('profile'),
+            level=video.get('level'),
+            pix_fmt=video.get('pix_fmt'),
+            r_frame_rate=video.get('r_frame_rate'),
+            avg_frame_rate=video.get('avg_frame_rate'),
+            time_base=video.get('time_base'),
+            sample_aspect_ratio=video.get('sample_aspect_ratio'),
+            rotation=stream_rotation(video),
+            video_extradata_hash=video.get('extradata_hash'),
+            nb_frames=number(video.get('nb_frames'), int),
+            duration=number(video.get('duration') or container.get('duration'), float),
+            bit_rate=number(container.get('bit_rate'), int),
+            size=number(container.get('size'), int),
+            has_audio=bool(audio),
+            audio_codec=audio.get('codec_name'),
+            sample_rate=audio.get('sample_rate'),
+            channels=audio.get('channels'),
+            channel_layout=audio.get('channel_layout'),
+            audio_extradata_hash=audio.get('extradata_hash'),
+        )
+
+    def to_dict(self):
+        return dataclasses.asdict(self)
+
+    @classmethod
+    def from_dict(cls, data):
+        fields = {field.name for field in dataclasses.fields(cls)}
+        return cls(**{key: value for key, value in data.items() if key in fields})
+
+
+def stream_rotation(stream):
+    """
+    Display rotation of a video stream in degrees, normalized to 0-359: the display
+    matrix side data of current ffmpeg versions, or the legacy ``rotate`` tag.
+    """
+    rotation = None
+    for side_data in stream.get('side_data_list') or []:
+        if 'rotation' in side_data:
+            rotation = side_data['rotation']
+            break
+    if rotation is None:
+        rotation = (stream.get('tags') or {}).get('rotate', 0)
+    try:
+        return int(round(float(rotation))) % 360
+    except (TypeError, ValueError):
+        return 0
+
+
+# Metadata of local files that live outside the media cache (intermediates),
+# keyed by (path, size, mtime) so a rewritten file is probed again
+LOCAL_PROBES_MAX_ENTRIES = 1024
+_local_probes = collections.OrderedDict()
+_local_probes_lock = threading.Lock()
+
+
+def run_ffprobe(video_file):
+    """
+    Probe streams and container of ``video_file`` in one ffprobe call.
+    Returns None if ffprobe fails.
+    """
+    command = [
+        "ffprobe", "-v", "error",
+        "-show_streams", "-show_format",
+        "-show_data_hash", "sha256",
+        "-of", "json",
+        video_file
+    ]
+    try:
+        with FFMPEG_PROCESSES.track_inprogress(), time_stage('ffprobe'):
+            result = subprocess.run(
+                command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, check=True
+            )
+        return VideoMetadata.from_ffprobe(json.loads(result.stdout))
+    except subprocess.CalledProcessError as e:
+        logger.error(f"FFprobe error for {video_file}: {e.stderr.strip()}")
+    except ValueError as e:
+        logger.error(f"Unreadable ffprobe output for {video_file}: {e}")
+    return None
+
+
+def probe_media(video_file):
+    """
+    Return the VideoMetadata of a local file, probing it at most once.
+
+    Files in the media cache are named after their S3 key and ETag, so their metadata is
+    stored in the database and shared by every node and task. Other files are cached in
+    memory for the lifetime of the process.
+    """
+    video_file = os.path.abspath(video_file)
+    media_cache_dir = os.path.abspath(settings.MEDIA_CACHE_DIR)
+
+    if os.path.dirname(video_file) == media_cache_dir:
+        cache_key = os.path.basename(video_file)
+        stored = MediaProbe.objects.filter(cache_key=cache_key).first()
+        record_cache_lookup('probe', stored is not None)
+        if stored:
+            return VideoMetadata.from_dict(stored.metadata)
+        metadata = run_ffprobe(video_file)
+        if metadata:
+            MediaProbe.objects.update_or_create(
+                cache_key=cache_key, defaults={'metadata': metadata.to_dict()}
+            )
+        return metadata
+
+    try:
+        stat = os.stat(video_file)
+    except FileNotFoundError:
+        logger.error(f"Cannot probe missing file: {video_file}")
+        return None
+    local_key = (video_file, stat.st_size, stat.st_mtime_ns)
+    with _local_probes_lock:
+        metadata = _local_probes.get(local_key)
+    record_cache_lookup('probe', metadata is not None)
+    if metadata:
+        return metadata
+    metadata = run_ffprobe(video_file)
+    if metadata:
+        with _local_probes_lock:
+            _local_probes[local_key] = metadata
+            if len(_local_probes) > LOCAL_PROBES_MAX_ENTRIES:
+                _local_probes.popitem(last=False)
+    return metadata
@@ -0,0 +1,110 @@
+# Progress accounting shared by the merger's worker threads
+import logging
+import threading
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import F
+
+from merger.models import MergeTask
+
+logger = logging.getLogger(__name__)
+
+
+class ProgressAccumulator:
+    """
+    Collects processed-frame increments from any number of threads and writes them to
+    ``MergeTask.total_frames_done`` in batches.
+
+    Increments are summed in memory and flushed on a timer with a single
+    ``UPDATE ... SET total_frames_done = total_frames_done + n`` so concurrent workers
+    never overwrite each other and no other column is touched.
+
+    Usage:
+        with ProgressAccumulator(task_id) as progress:
+            progress.add(150)
+    """
+
+    def __init__(self, task_id, flush_interval=None):
+        self.task_id = task_id
+        self.flush_interval = flush_interval or getattr(settings, 'MERGER_PROGRESS_FLUSH_INTERVAL', 2.0)
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def add(self, frames):
+        """
+        Record ``frames`` newly processed frames. Negative values are ignored so
+        progress only ever moves forward.
+        """
+        if frames <= 0:
+            return
+        with self._lock:
+            self._pending += frames
+
+    def flush(self):
+        """
+        Write the pending increment to the database, if any.
+        """
+        with self._lock:
+            pending, self._pending = self._pending, 0
+        if not pending:
+            return
+        try:
+            MergeTask.objects.filter(task_id=self.task_id).update(
+                total_frames_done=F('total_frames_done') + pending
+            )
+        except Exception as e:
+            # Keep the frames so the next flush retries them
+            logger.error(f"Error flushing progress for merge task {self.task_id}: {e}")
+            with self._lock:
+                self._pending += pending
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread:
+            self._thread.join()
+        self.flush()
+
+    def _run(self):
+        try:
+            while not self._stopped.wait(self.flush_interval):
+                self.flush()
+        finally:
+            # Each thread gets its own connection, don't leak it
+            connection.close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+
+def ffmpeg_frame_reporter(progress, outputs=1):
+    """
+    Build an ``on_progress`` callback for run_ffmpeg that forwards the frames encoded
+    since the previous update to ``progress``. Returns None when there is nothing to report to.
+
+    outputs: number of outputs written in lockstep by the ffmpeg run; ffmpeg reports the
+             frames of its first output, which are counted once per output
+    """
+    if progress is None:
+        return None
+
+    last_frame = 0
+
+    def on_progress(stats):
+        nonlocal last_frame
+        frame = stats.get('frame')
+        if frame is not None and frame > last_frame:
+            progress.add((frame - last_frame) * outputs)
+            last_frame = frame
+
+    return on_progress
@@ -12,6 +12,11 @@ urlpatterns = [
     # Upload files page
     path('upload/', views.upload_files, name='upload_files'),
     
+    # Presigned multipart uploads straight from the browser to S3
+    path('direct-upload/start/', views.direct_upload_start, name='direct_upload_start'),
+    path('direct-upload/complete/', views.direct_upload_complete, name='direct_upload_complete'),
+    path('direct-upload/abort/', views.direct_upload_abort, name='direct_upload_abort'),
+    
     # Processing page for a specific task
     path('processing/<str:task_id>/', views.processing, name='processing'),
     
@@ -21,6 +26,9 @@ urlpatterns = [
     # Check status of a specific task
     path('check_status/<str:task_id>/', views.check_task_status, name='check_status'),
     
+    # Server-Sent Events stream of a specific task's status and progress
+    path('events/<str:task_id>/', views.task_events, name='task_events'),
+    
     # Download zip file for a specific task
     path('download_zip/<str:task_id>/', views.download_zip, name='download_zip'),
     
@@ -1,26 +1,38 @@
 # merger/views.py
-import boto3
+import contextlib
 import os
-import subprocess
-import zipfile
+import json
 import re
-import io
-import shutil
 import logging
 import threading
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from django.urls import reverse
 from django.conf import settings
-from django.http import HttpResponse, FileResponse, JsonResponse
+from django.db import connection
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.shortcuts import redirect, render, get_object_or_404
 from django.contrib import messages
 from django.views.decorators.http import require_POST
 from django.contrib.auth.decorators import login_required
+from django.utils import timezone
 from urllib.parse import unquote  # Corrected import
-import requests
-from urllib.parse import urlparse
 from .forms import VideoUploadForm
 from .models import MergeTask
+from .tools.dedupe import find_rendition, store_rendition
+from .tools.probe import probe_media
+from .tools.progress import ProgressAccumulator, ffmpeg_frame_reporter
+from hooks_app.dedupe import dedupe_stored_upload, media_object_for_url, store_upload
+from hooks_app.downloads import download_response, zip_download_response
+from hooks_app.events import TaskStatePoller, is_authenticated, task_event_stream
+from hooks_app.ffmpeg import run_ffmpeg
+from hooks_app.media_cache import get_media_cache
+from hooks_app.storage import (
+    UploadStage, VideoLinkRecorder, start_multipart_upload, complete_multipart_upload,
+    abort_multipart_upload, parse_upload_size,
+)
+from hooks_app.thumbnails import result_page, thumbnail_outputs
+from hooks_app.timeline import TaskTimeline, bind, track
+from hooks_app.workspaces import get_workspace_manager
 import uuid
 from datetime import datetime
 
@@ -33,16 +45,6 @@ logging.basicConfig(
 
 
 
-# Creating a connection to the aws s3 bucket 
-# aws_access_key_id: aws secret key 
-# aws_secret_access_key: aws s3 secret key
-# region_name: aws region obtained from aws bucket name
-s3_client = boto3.client(
-    's3',
-    aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
-    aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
-    region_name=settings.AWS_S3_REGION_NAME
-)
 
 
 def generate_task_id():
@@ -71,101 +73,127 @@ def has_audio(video_file):
     """
     Check if the video file has an audio stream.
     """
-    command = [
-        "ffprobe", "-v", "error",
-        "-select_streams", "a:0",
-        "-show_entries", "stream=codec_type",
-        "-of", "csv=p=0",
-        video_file
-    ]
-    try:
-        result = subprocess.run(
-            command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, check=True
-        )
-        output = result.stdout.strip()
-        return output == "audio"
-    except subprocess.CalledProcessError as e:
-        logging.error(f"FFprobe error when checking audio for {video_file}: {e.stderr.strip()}")
-        return False
+    metadata = probe_media(video_file)
+    return bool(metadata and metadata.has_audio)
     
     
 
 def ffprobe_get_frame_count(video_filepath):
     """
-    Uses ffprobe to count the number of video frames in a video file.
+    Returns the number of video frames in a video file.
+    Uses the container's frame count or duration x fps from the probe, without decoding.
     """
-    command = [
-        'ffprobe',
-        '-v', 'error',
-        '-select_streams', 'v:0',
-        '-count_frames',
-        '-show_entries', 'stream=nb_read_frames',
-        '-of', 'csv=p=0',
-        video_filepath,
-    ]
-    try:
-        result = subprocess.run(
-            command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, check=True
-        )
-        output = result.stdout.strip()
-        if output.isdigit():
-            return int(output)
-        else:
-            logging.error(f"Couldn't get frame count for {video_filepath}: {result.stderr.strip()}")
-            return 0
-    except subprocess.CalledProcessError as e:
-        logging.error(f"FFprobe error for {video_filepath}: {e.stderr.strip()}")
+    metadata = probe_media(video_filepath)
+    if not metadata or not metadata.frame_count:
+        logging.error(f"Couldn't get frame count for {video_filepath}")
         return 0
+    return metadata.frame_count
     
     
 
 def check_video_format_resolution(video_file):
     """
-    Uses ffprobe to retrieve the width and height of the first video stream.
+    Retrieves the width and height of the first video stream from the probe.
     Ensures that both width and height are even numbers.
     """
-    command = [
-        "ffprobe", "-v", "error",
-        "-select_streams", "v:0",
-        "-show_entries", "stream=width,height",
-        "-of", "csv=p=0:s=x",
-        video_file
-    ]
-    try:
-        result = subprocess.run(
-            command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, check=True
-        )
-        output = result.stdout.strip().split('\n')
-        resolutions = [line.strip() for line in output if 'x' in line and line.strip()]
-        if resolutions:
-            try:
-                width_str, height_str = resolutions[0].split('x')[:2]
-                width = int(width_str.strip())
-                height = int(height_str.strip())
-                # Ensure dimensions are even
-                width = width if width % 2 == 0 else width + 1
-                height = height if height % 2 == 0 else height + 1
-                return width, height
-            except ValueError as e:
-                logging.error(f"Error parsing resolution: {resolutions[0]} - {e}")
-                return None, None
-        else:
-            logging.error(f"Could not determine resolution for video: {video_file}")
-            return None, None
-    except subprocess.CalledProcessError as e:
-        logging.error(f"FFprobe error for {video_file}: {e.stderr.strip()}")
+    metadata = probe_media(video_file)
+    if not metadata or not metadata.has_video:
+        logging.error(f"Could not determine resolution for video: {video_file}")
         return None, None
+    width, height = metadata.width, metadata.height
+    # Ensure dimensions are even
+    width = width if width % 2 == 0 else width + 1
+    height = height if height % 2 == 0 else height + 1
+    return width, height
     
     
 
-def preprocess_video(input_file, output_file, reference_resolution=None, merge_task=None):
+def video_conforms(metadata, reference_resolution):
+    """
+    True if the video stream already is what preprocess_video would produce: H.264 in
+    yuv420p at the reference resolution, square pixels, 30 fps and no display rotation.
+    Decoders turn rotated phone footage upright, so its frames would no longer match.
+    """
+    width, height = reference_resolution
+    return (
+        metadata.has_video
+        and metadata.video_codec == 'h264'
+        and metadata.pix_fmt == 'yuv420p'
+        and (metadata.width, metadata.height) == (width, height)
+        and metadata.sample_aspect_ratio in (None, '1:1', '0:1')
+        and metadata.fps is not None and abs(metadata.fps - 30) < 0.01
+        and metadata.rotation == 0
+    )
+
+
+def audio_conforms(metadata):
+    """
+    True if the audio stream already is stereo AAC at 44.1 kHz.
+    """
+    return (
+        metadata.has_audio
+        and metadata.audio_codec == 'aac'
+        and str(metadata.sample_rate) == '44100'
+        and metadata.channels == 2
+    )
+
+
+def conform_audio(input_file, output_file, metadata):
+    """
+    Copies the (already conforming) video stream and only normalizes the audio to stereo
+    AAC at 44.1 kHz, adding a silent track when there is none.
+    """
+    command = ['ffmpeg', '-y', '-i', input_file]
+    if metadata.has_audio:
+        command += ['-map', '0:v:0', '-map', '0:a:0']
+    else:
+        command += [
+            '-f', 'lavfi', '-i', 'anullsrc=channel_layout=stereo:sample_rate=44100',
+            '-map', '0:v:0', '-map', '1:a:0', '-shortest',
+        ]
+    command += [
+        '-c:v', 'copy',
+        '-c:a', 'aac',
+        '-ar', '44100',
+        '-ac', '2',
+        '-movflags', '+faststart',
+        output_file
+    ]
+
+    logging.debug(f"Audio conform command: {' '.join(command)}")
+    result = run_ffmpeg(command)
+    if not result.ok:
+        logging.error(f"FFmpeg failed while conforming the audio of {input_file}.")
+        logging.error(f"FFmpeg error output: {result.stderr_tail}")
+        if os.path.exists(output_file):
+            os.remove(output_file)
+            logging.info(f"Removed invalid preprocessed file: {output_file}")
+        return
+
+    logging.info(f"Conformed audio only (video copied): {output_file}")
+
+
+def preprocess_video(input_file, output_file, reference_resolution=None, progress=None):
     """
     Preprocesses a video by scaling it to the reference resolution and ensuring consistent encoding.
     Ensures that the output dimensions are even and that audio streams are present.
     If the input video lacks an audio stream, adds a silent audio track.
+    progress: optional ProgressAccumulator receiving the processed frame counts
     """
     logging.info(f"Preprocessing video: {input_file}")
 
+    metadata = probe_media(input_file)
+    if metadata and reference_resolution and video_conforms(metadata, reference_resolution):
+        if audio_conforms(metadata):
+            # Already in the target format: no ffmpeg run at all
+            get_media_cache().link_into(input_file, output_file)
+            logging.info(f"Input already conforms, passed through: {input_file}")
+        else:
+            conform_audio(input_file, output_file, metadata)
+        if progress and os.path.exists(output_file):
+            progress.add(metadata.frame_count)
+        return
+
     # Check if the input video has an audio stream
     input_has_audio = has_audio(input_file)
 
@@ -179,6 +207,7 @@ def preprocess_video(input_file, output_file, reference_resolution=None, merge_t
             vf_filter = (
                 f"scale={width}:{height}:force_original_aspect_ratio=decrease,"
                 f"pad={width}:{height}:(ow-iw)/2:(oh-ih)/2,"
+                f"setsar=1,"
                 f"format=yuv420p"
             )
             command += ["-vf", vf_filter]
@@ -188,6 +217,8 @@ def preprocess_video(input_file, output_file, reference_resolution=None, merge_t
             "-c:v", "libx264",
             "-preset", "ultrafast",
             "-c:a", "aac",
+            "-ar", "44100",  # Same audio format as the silent track, keeps outputs stream-copy compatible
+            "-ac", "2",
             "-pix_fmt", "yuv420p",
             "-r", "30",  # Enforce frame rate
             output_file
@@ -204,6 +235,7 @@ def preprocess_video(input_file, output_file, reference_resolution=None, merge_t
             vf_filter = (
                 f"scale={width}:{height}:force_original_aspect_ratio=decrease,"
                 f"pad={width}:{height}:(ow-iw)/2:(oh-ih)/2,"
+                f"setsar=1,"
                 f"format=yuv420p"
             )
             command += ["-vf", vf_filter]
@@ -220,54 +252,149 @@ def preprocess_video(input_file, output_file, reference_resolution=None, merge_t
         ]
 
     logging.debug(f"Preprocess command: {' '.join(command)}")
-    process = subprocess.Popen(
-        command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True
-    )
-
-    frames_processed = 0
-    prev_frames_processed = 0
-    while True:
-        output = process.stderr.readline()
-        if output == '' and process.poll() is not None:
-            break
-        if output:
-            logging.debug(output.strip())
-            match = re.search(r"frame=\s*(\d+)", output)
-            if match:
-                frames_processed = int(match.group(1))
-                if frames_processed - prev_frames_processed >= 150:
-                    if merge_task:
-                        merge_task.total_frames_done += (frames_processed - prev_frames_processed)
-                        merge_task.save()
-                    prev_frames_processed = frames_processed
-
-    return_code = process.wait()
-    if return_code != 0:
-        logging.error(f"FFmpeg failed during preprocessing of {input_file}. Check logs above for details.")
+    result = run_ffmpeg(command, on_progress=ffmpeg_frame_reporter(progress))
+    if not result.ok:
+        logging.error(f"FFmpeg failed during preprocessing of {input_file}.")
+        logging.error(f"FFmpeg error output: {result.stderr_tail}")
         # Remove the invalid output file if FFmpeg failed
         if os.path.exists(output_file):
             os.remove(output_file)
             logging.info(f"Removed invalid preprocessed file: {output_file}")
         return
 
-    if merge_task:
-        merge_task.total_frames_done += (frames_processed - prev_frames_processed)
-        merge_task.save()
+    logging.info(f"Finished preprocessing: {output_file} (speed {result.stats.get('speed')}x)")
+
+
+
+def preprocess_source(video_url, input_file, output_file, reference_resolution, progress=None,
+                      rendition_executor=None):
+    """
+    Preprocesses an uploaded source, reusing the rendition stored by an earlier task for
+    the same content and resolution when there is one. New renditions of deduplicated
+    sources are stored for later tasks on ``rendition_executor``.
+    """
+    metadata = probe_media(input_file)
+    if metadata and video_conforms(metadata, reference_resolution) and audio_conforms(metadata):
+        # Passed through as is, a rendition would be a copy of the source
+        preprocess_video(input_file, output_file, reference_resolution, progress)
+        return
 
-    logging.info(f"Finished preprocessing: {output_file}")
+    media_object = media_object_for_url(video_url)
+    if media_object:
+        rendition_key = find_rendition(media_object, reference_resolution)
+        if rendition_key:
+            try:
+                media_cache = get_media_cache()
+                cached = media_cache.fetch(settings.AWS_STORAGE_BUCKET_NAME, rendition_key)
+                media_cache.link_into(cached, output_file)
+                logging.info(f"Reusing preprocessed rendition {rendition_key} for {video_url}")
+                return
+            except Exception as e:
+                logging.warning(f"Could not reuse rendition {rendition_key}, preprocessing again: {e}")
+
+    preprocess_video(input_file, output_file, reference_resolution, progress)
+
+    if media_object and rendition_executor and os.path.exists(output_file):
+        rendition_executor.submit(bind(store_rendition), media_object, reference_resolution, output_file)
     
     
     
 
-def concatenate_videos(input_files, output_file, merge_task):
+def can_stream_copy(input_files):
+    """
+    True if all input files share the same stream parameters and can be joined with the
+    concat demuxer and -c copy.
+    """
+    if not input_files:
+        return False
+    signatures = []
+    for input_file in input_files:
+        metadata = probe_media(input_file)
+        signatures.append(metadata.stream_signature if metadata else None)
+    return signatures[0] is not None and all(sig == signatures[0] for sig in signatures)
+
+
+
+def concatenate_videos_stream_copy(input_files, output_file, progress=None):
     """
-    Concatenates multiple video files into a single output file using FFmpeg's concat filter.
+    Joins parameter-compatible files with the concat demuxer without re-encoding.
+    Returns True on success.
+    """
+    list_file = f"{output_file}.txt"
+    with open(list_file, 'w') as f:
+        for input_file in input_files:
+            # The concat demuxer list syntax needs single quotes escaped as '\''
+            escaped = os.path.abspath(input_file).replace("'", "'\\''")
+            f.write(f"file '{escaped}'\n")
+
+    command = [
+        'ffmpeg', '-y',
+        '-f', 'concat', '-safe', '0',
+        '-i', list_file,
+        '-map', '0:v', '-map', '0:a',
+        '-c', 'copy',
+        '-movflags', '+faststart',
+        output_file
+    ]
+    logging.debug(f"Stream copy concatenate command: {' '.join(command)}")
+    try:
+        result = run_ffmpeg(command, stage='remux')
+    finally:
+        os.remove(list_file)
+
+    if not result.ok:
+        logging.warning(f"Stream copy concatenation failed for {output_file}: {result.stderr_tail}")
+        if os.path.exists(output_file):
+            os.remove(output_file)
+        return False
+
+    # A remux takes a moment, so progress is reported once at the end
+    if progress and result.stats.get('frame'):
+        progress.add(result.stats['frame'])
+    logging.info(f"Finished concatenating (stream copy): {output_file}")
+    return True
+
+
+
+def probed_size(video_file):
+    """
+    Size of a media file in bytes, as reported by its (cached) probe.
+    """
+    metadata = probe_media(video_file)
+    if metadata and metadata.size:
+        return metadata.size
+    return os.path.getsize(video_file)
+
+
+def estimate_workspace_bytes(short_sources, large_sources):
+    """
+    Estimate the scratch space a merge needs, from the probed size of its sources.
+    Preprocessing writes one re-encoded copy of every source, and every short/large
+    pair becomes an output about as large as its two parts; the whole is padded by
+    WORKSPACE_SIZE_FACTOR since re-encoding can grow a file.
+    """
+    short_sizes = [probed_size(video) for video in short_sources]
+    large_sizes = [probed_size(video) for video in large_sources]
+    preprocessed = sum(short_sizes) + sum(large_sizes)
+    outputs = sum(short_sizes) * len(large_sizes) + sum(large_sizes) * len(short_sizes)
+    return int((preprocessed + outputs) * getattr(settings, 'WORKSPACE_SIZE_FACTOR', 1.5))
+
+
+def concatenate_videos(input_files, output_file, progress=None):
+    """
+    Concatenates multiple video files into a single output file.
+    Files with identical stream parameters (such as preprocessed inputs) are remuxed with the
+    concat demuxer; anything else is re-encoded through FFmpeg's concat filter.
+    progress: optional ProgressAccumulator receiving the processed frame counts
     """
     logging.info(f"Concatenating videos into: {output_file}")
     if len(input_files) < 2:
         logging.error("Need at least two files to concatenate")
         return
 
+    if can_stream_copy(input_files) and concatenate_videos_stream_copy(input_files, output_file, progress):
+        return
+
     # Build FFmpeg command with filter_complex 'concat'
     command = ['ffmpeg', '-y']
     for input_file in input_files:
@@ -278,10 +405,13 @@ def concatenate_videos(input_files, output_file, merge_task):
     for i in range(len(input_files)):
         filter_complex += f"[{i}:v][{i}:a]"
     filter_complex += f"concat=n={len(input_files)}:v=1:a=1[outv][outa]"
+    # Poster and preview clip come out of the same pass
+    thumbnail_filters, thumbnail_args, video_out = thumbnail_outputs('outv', output_file)
+    filter_complex += ';' + ';'.join(thumbnail_filters)
 
     command += [
         '-filter_complex', filter_complex,
-        '-map', '[outv]',
+        '-map', f'[{video_out}]',
         '-map', '[outa]',
         '-c:v', 'libx264',
         '-preset', 'superfast',
@@ -289,128 +419,268 @@ def concatenate_videos(input_files, output_file, merge_task):
         '-pix_fmt', 'yuv420p',
         '-r', '30',
         output_file
-    ]
+    ] + thumbnail_args
 
     logging.debug(f"Concatenate command: {' '.join(command)}")
-    process = subprocess.Popen(
-        command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True
-    )
-
-    frames_processed = 0
-    prev_frames_processed = 0
-    ffmpeg_error = ""
-    while True:
-        output = process.stderr.readline()
-        if output == '' and process.poll() is not None:
-            break
-        if output:
-            logging.debug(output.strip())
-            ffmpeg_error += output
-            match = re.search(r"frame=\s*(\d+)", output)
-            if match:
-                frames_processed = int(match.group(1))
-                if frames_processed - prev_frames_processed >= 150:
-                    if merge_task:
-                        merge_task.total_frames_done += (frames_processed - prev_frames_processed)
-                        merge_task.save()
-                    prev_frames_processed = frames_processed
-
-    return_code = process.wait()
-    if return_code != 0:
+    result = run_ffmpeg(command, on_progress=ffmpeg_frame_reporter(progress))
+    if not result.ok:
         logging.error(f"FFmpeg failed during concatenation of {output_file}.")
-        logging.error(f"FFmpeg error output: {ffmpeg_error}")
+        logging.error(f"FFmpeg error output: {result.stderr_tail}")
         # Remove the invalid output file if FFmpeg failed
         if os.path.exists(output_file):
             os.remove(output_file)
             logging.info(f"Removed invalid concatenated file: {output_file}")
         return
 
-    if merge_task:
-        merge_task.total_frames_done += (frames_processed - prev_frames_processed)
-        merge_task.save()
+    logging.info(f"Finished concatenating: {output_file} (speed {result.stats.get('speed')}x)")
 
-    logging.info(f"Finished concatenating: {output_file}")
-    
-    
-    
-    
-    
-def generate_presigned_url(bucket_name, object_key, expiration=3600):
+
+
+def merge_videos_fused(input_files, output_file, reference_resolution, progress=None):
     """
-    Generate a presigned URL to download the S3 object.
-    object_key: aws media link 
-    expiration: expiration time in seconds (default: 3600 seconds)
+    Scales, pads and conforms the frame rate and audio of the original input files and
+    concatenates them in one filtergraph, the same result as preprocess_video followed
+    by concatenate_videos without the intermediate files and their extra x264 pass.
+    progress: optional ProgressAccumulator receiving the processed frame counts
     """
-    try:
-        response = s3_client.generate_presigned_url(
-            'get_object',
-            Params={'Bucket': bucket_name, 'Key': object_key},
-            ExpiresIn=expiration
+    logging.info(f"Merging {len(input_files)} videos in a single pass into: {output_file}")
+    width, height = reference_resolution
+
+    command = ['ffmpeg', '-y']
+    for input_file in input_files:
+        command += ['-i', input_file]
+
+    filters = []
+    for i, input_file in enumerate(input_files):
+        metadata = probe_media(input_file)
+        filters.append(
+            f"[{i}:v]scale={width}:{height}:force_original_aspect_ratio=decrease,"
+            f"pad={width}:{height}:(ow-iw)/2:(oh-ih)/2,"
+            f"setsar=1,fps=30,format=yuv420p[v{i}]"
         )
-        return response
-    except Exception as e:
-        print(f"Error generating presigned URL: {e}")
+        if metadata and metadata.has_audio:
+            filters.append(
+                f"[{i}:a]aresample=44100,"
+                f"aformat=sample_fmts=fltp:channel_layouts=stereo[a{i}]"
+            )
+        else:
+            # Silent track as long as the video
+            duration = metadata.duration if metadata and metadata.duration else 0
+            filters.append(
+                f"anullsrc=channel_layout=stereo:sample_rate=44100,"
+                f"atrim=duration={duration},aformat=sample_fmts=fltp[a{i}]"
+            )
+    filters.append(
+        ''.join(f"[v{i}][a{i}]" for i in range(len(input_files)))
+        + f"concat=n={len(input_files)}:v=1:a=1[outv][outa]"
+    )
+    thumbnail_filters, thumbnail_args, video_out = thumbnail_outputs('outv', output_file)
+    filters += thumbnail_filters
+
+    command += [
+        '-filter_complex', ';'.join(filters),
+        '-map', f'[{video_out}]',
+        '-map', '[outa]',
+        '-c:v', 'libx264',
+        '-preset', 'superfast',
+        '-c:a', 'aac',
+        '-pix_fmt', 'yuv420p',
+        '-r', '30',
+        output_file
+    ] + thumbnail_args
+
+    logging.debug(f"Fused merge command: {' '.join(command)}")
+    result = run_ffmpeg(command, on_progress=ffmpeg_frame_reporter(progress))
+    if not result.ok:
+        logging.error(f"FFmpeg failed during fused merge of {output_file}.")
+        logging.error(f"FFmpeg error output: {result.stderr_tail}")
+        # Remove the invalid output file if FFmpeg failed
+        if os.path.exists(output_file):
+            os.remove(output_file)
+            logging.info(f"Removed invalid merged file: {output_file}")
+        return
+
+    logging.info(f"Finished fused merge: {output_file} (speed {result.stats.get('speed')}x)")
+
+
+def multi_output_memory_bytes(short_files, large_file):
+    """
+    Estimate the memory a single-decode merge of ``short_files`` with ``large_file`` needs.
+
+    split hands every decoded frame of the large video to all outputs, but an output
+    only starts consuming them once its own intro has ended, so frames are queued for
+    every output whose intro is longer than the shortest one. On top of that, each
+    output keeps an encoder's worth of frames in flight.
+    """
+    large = probe_media(large_file)
+    if not large or not large.has_video:
         return None
-    
-    
+    frame_bytes = large.width * large.height * 3 // 2  # yuv420p
+    fps = large.fps or 30
 
-def download_video_from_s3(s3_url, local_folder):
+    durations = []
+    for short_file in short_files:
+        metadata = probe_media(short_file)
+        if not metadata or metadata.duration is None:
+            return None
+        durations.append(metadata.duration)
+
+    queued_frames = sum((duration - min(durations)) * fps for duration in durations)
+    encoder_frames = len(short_files) * getattr(settings, 'MERGER_ENCODER_FRAMES_IN_FLIGHT', 60)
+    return int((queued_frames + encoder_frames) * frame_bytes)
+
+
+def plan_multi_output_batches(short_files, large_file, memory_budget):
+    """
+    Group ``short_files`` into batches that are merged with ``large_file`` in one ffmpeg
+    each, keeping every batch under ``memory_budget``. Intros are grouped by duration,
+    which keeps the queued frames between them small. Returns lists of indexes into
+    ``short_files``; a batch of one is an ordinary per-pair job.
+    """
+    durations = [probe_media(short_file) for short_file in short_files]
+    order = sorted(
+        range(len(short_files)),
+        key=lambda i: durations[i].duration if durations[i] and durations[i].duration else 0
+    )
+
+    batches = []
+    for index in order:
+        if batches:
+            candidate = batches[-1] + [index]
+            estimate = multi_output_memory_bytes([short_files[i] for i in candidate], large_file)
+            if estimate is not None and estimate <= memory_budget:
+                batches[-1] = candidate
+                continue
+        batches.append([index])
+    return batches
+
+
+def concatenate_videos_multi_output(short_files, large_file, output_files, progress=None):
     """
-    Download an S3 file to a local folder using a presigned URL.
-    s3_url: The presigned URL to download the file from S3
-    local_folder: The local folder to save the downloaded file
+    Writes ``short_files[i] + large_file`` to ``output_files[i]`` for every i from one
+    ffmpeg run, which decodes the large video once and splits it into every output
+    instead of decoding it again per intro.
+    progress: optional ProgressAccumulator receiving the processed frame counts
     """
-    # Parse the S3 URL
-    parsed_url = urlparse(s3_url)
-    bucket_name = parsed_url.netloc.split('.')[0]  # Extract the bucket name
-    bucket_name = bucket_name if bucket_name else settings.AWS_STORAGE_BUCKET_NAME
-    object_key = parsed_url.path.lstrip('/')       # Extract the object key
+    if len(short_files) == 1:
+        return concatenate_videos([short_files[0], large_file], output_files[0], progress)
 
-    # Generate a presigned URL
-    presigned_url = generate_presigned_url(bucket_name, object_key)
-    if not presigned_url:
-        print("Failed to generate a presigned URL")
+    logging.info(f"Concatenating {len(short_files)} videos with a single decode of: {large_file}")
+    count = len(short_files)
+    command = ['ffmpeg', '-y']
+    for short_file in short_files:
+        command += ['-i', short_file]
+    command += ['-i', large_file]
+
+    # [count] is the large video; its split copies are appended to each intro
+    filters = [
+        f"[{count}:v]split={count}" + ''.join(f"[lv{i}]" for i in range(count)),
+        f"[{count}:a]asplit={count}" + ''.join(f"[la{i}]" for i in range(count)),
+    ]
+    output_args = []
+    for i, output_file in enumerate(output_files):
+        filters.append(f"[{i}:v][{i}:a][lv{i}][la{i}]concat=n=2:v=1:a=1[outv{i}][outa{i}]")
+        thumbnail_filters, thumbnail_args, video_out = thumbnail_outputs(f'outv{i}', output_file)
+        filters += thumbnail_filters
+        output_args += [
+            '-map', f'[{video_out}]',
+            '-map', f'[outa{i}]',
+            '-c:v', 'libx264',
+            '-preset', 'superfast',
+            '-c:a', 'aac',
+            '-pix_fmt', 'yuv420p',
+            '-r', '30',
+            output_file
+        ] + thumbnail_args
+    command += ['-filter_complex', ';'.join(filters)] + output_args
+
+    logging.debug(f"Multi-output concatenate command: {' '.join(command)}")
+    result = run_ffmpeg(command, on_progress=ffmpeg_frame_reporter(progress, outputs=count))
+    if not result.ok:
+        logging.error(f"FFmpeg failed during multi-output concatenation of {large_file}.")
+        logging.error(f"FFmpeg error output: {result.stderr_tail}")
+        # Remove the invalid output files if FFmpeg failed
+        for output_file in output_files:
+            if os.path.exists(output_file):
+                os.remove(output_file)
+                logging.info(f"Removed invalid concatenated file: {output_file}")
         return
 
-    # Fetch the file and save it locally
-    local_file_path = os.path.join(local_folder, os.path.basename(object_key))
-    try:
-        response = requests.get(presigned_url, stream=True)
-        if response.status_code == 200:
-            with open(local_file_path, 'wb') as file:
-                for chunk in response.iter_content(chunk_size=1024):
-                    file.write(chunk)
-            print(f"File downloaded successfully: {local_file_path}")
-        else:
-            print(f"Failed to download file. Status code: {response.status_code}")
-    except Exception as e:
-        print(f"Error downloading the file: {e}")
+    logging.info(f"Finished concatenating {count} outputs of {large_file} (speed {result.stats.get('speed')}x)")
 
+
+def available_memory_bytes():
+    """
+    Memory the system can hand out right now, from /proc/meminfo (MemAvailable).
+    """
+    try:
+        with open('/proc/meminfo') as meminfo:
+            for line in meminfo:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
     
     
-def upload_to_s3(file_path, bucket_name, s3_key):
+    
+    
+def probe_uploaded_videos(task_id, short_video_urls, large_video_urls):
     """
-    Uploads a file to an S3 bucket.
-    file_path: The path to the local file to be uploaded
-    bucket_name: The S3 bucket where the file will be uploaded
-    s3_key: The key under which the file will be stored in S3
+    Probes the uploaded videos in parallel and records the total number of frames
+    the merge will process, for progress tracking. Runs outside the upload request.
     """
     try:
-        s3_client.upload_file(file_path, bucket_name, s3_key)
-        file_url = f"https://{bucket_name}.s3.{settings.AWS_S3_REGION_NAME}.amazonaws.com/{s3_key}"
-        logging.info(f"Uploaded preprocessed video to S3: {file_url}")
-        return file_url
+        media_cache = get_media_cache()
+
+        def frame_count(url):
+            return ffprobe_get_frame_count(media_cache.fetch_url(url))
+
+        with ThreadPoolExecutor() as executor:
+            short_frames = list(executor.map(frame_count, short_video_urls))
+            large_frames = list(executor.map(frame_count, large_video_urls))
+
+        total_short_video_frames = sum(short_frames)
+        total_long_video_frames = sum(large_frames)
+        total_frames = (
+            total_short_video_frames
+            + (len(large_video_urls) * total_short_video_frames)
+            + (len(short_video_urls) * total_long_video_frames)
+        )
+        MergeTask.objects.filter(task_id=task_id).update(
+            total_frames=total_frames if total_frames > 0 else 1
+        )
+        logging.info(f"Merge task {task_id} probed: {total_frames} frames to process")
     except Exception as e:
-        logging.error(f"Error uploading to S3: {e}")
-        raise
-    
-    
+        logging.error(f"Error probing uploaded videos for merge task {task_id}: {e}")
+    finally:
+        connection.close()
+
+
+
+def source_display_names(source_names, role, video_urls):
+    """
+    Names the outputs get for the sources of ``role`` ('short' or 'large'): the file names
+    they were uploaded as, or the object names for tasks recorded without them.
+    """
+    names = (source_names or {}).get(role) or []
+    if len(names) != len(video_urls):
+        names = [os.path.splitext(os.path.basename(video))[0] for video in video_urls]
+    return names
+
+
 
 def process_videos(task_id):
     """
     Orchestrates the preprocessing and concatenation of videos for a given task.
     
     """
+    # Stage spans of every source and pair, saved on the task when the run ends
+    with TaskTimeline(MergeTask.objects.filter(task_id=task_id)).activate():
+        _process_videos(task_id)
+
+
+def _process_videos(task_id):
     logging.info("Starting video processing...")
 
     try:
@@ -419,166 +689,255 @@ def process_videos(task_id):
         logging.error(f"MergeTask with task_id {task_id} does not exist.")
         return
 
-    short_videos = merge_task.short_video_path
-    large_videos = merge_task.large_video_paths
-
-    if not large_videos:
-        logging.error("No large videos found for merging.")
-        merge_task.status = 'failed'
-        merge_task.save()
-        return
-
-    # Determine reference resolution from the first large video
-    ref_resolution = check_video_format_resolution(large_videos[0])
-    if not ref_resolution or not ref_resolution[0] or not ref_resolution[1]:
-        logging.error("Invalid reference resolution. Cannot preprocess videos.")
-        merge_task.status = 'failed'
-        merge_task.save()
-        return
-
-    reference_resolution = ref_resolution
-    logging.info(f"Reference resolution: {reference_resolution}")
-
-    # Preprocess short videos
-    preprocessed_short_files = []
-    short_video_names = []
-    with ThreadPoolExecutor() as executor:
-        futures = []
-        for video in short_videos:
-            short_name = os.path.splitext(os.path.basename(video))[0]
-            short_video_names.append(short_name)
-            preprocessed_filename = f"preprocessed_{os.path.basename(video)}"
-            output_file = os.path.join(settings.OUTPUT_FOLDER, preprocessed_filename)
-            download_video_from_s3(video, output_file) # function to download video to the temporary local folder for processing
-            futures.append(executor.submit(preprocess_video, video, output_file, reference_resolution, merge_task))
-            preprocessed_short_files.append(output_file)
-
-        for future in futures:
-            try:
-                future.result()
-            except Exception as e:
-                logging.error(f"Error during preprocessing: {e}")
-                merge_task.status = 'failed'
-                merge_task.save()
-                return
-
-    # Preprocess large videos
-    preprocessed_large_files = []
-    large_video_names = []
-    with ThreadPoolExecutor() as executor:
-        futures = []
-        for video in large_videos:
-            large_name = os.path.splitext(os.path.basename(video))[0]
-            large_video_names.append(large_name)
-            preprocessed_filename = f"preprocessed_{os.path.basename(video)}"
-            output_file = os.path.join(settings.OUTPUT_FOLDER, preprocessed_filename)
-            download_video_from_s3(video, output_file)
-            futures.append(executor.submit(preprocess_video, video, output_file, reference_resolution, merge_task))
-            preprocessed_large_files.append(output_file)
-
-        for future in futures:
-            try:
-                future.result()
-            except Exception as e:
-                logging.error(f"Error during preprocessing: {e}")
-                merge_task.status = 'failed'
-                merge_task.save()
-                return
-
-    # Validate that preprocessed videos have video and audio streams
-    valid_preprocessed_short_files = []
-    valid_short_names = []
-    for pre_file, sname in zip(preprocessed_short_files, short_video_names):
-        w, h = check_video_format_resolution(pre_file)
-        if w and h:
-            valid_preprocessed_short_files.append(pre_file)
-            valid_short_names.append(sname)
-        else:
-            logging.error(f"Preprocessed file {pre_file} does not contain a valid video stream.")
-
-    if not valid_preprocessed_short_files:
-        logging.error("No valid preprocessed short videos available for concatenation.")
-        merge_task.status = 'failed'
-        merge_task.save()
-        return
+    # Frame counts from all worker threads are batched into a few atomic UPDATEs
+    progress = ProgressAccumulator(task_id).start()
+    # Media cache entries of the sources, kept from eviction until the task ends
+    source_pins = contextlib.ExitStack()
+    try:
+        short_videos = merge_task.short_video_path
+        large_videos = merge_task.large_video_paths
+
+        if not large_videos:
+            logging.error("No large videos found for merging.")
+            merge_task.status = 'failed'
+            merge_task.save(update_fields=['status'])
+            return
+
+        # Named before deduplication below may move the sources to another upload's key
+        short_names = source_display_names(merge_task.source_names, 'short', short_videos)
+        large_names = source_display_names(merge_task.source_names, 'large', large_videos)
+
+        # Bring every source onto local disk once; preprocessing and probing read the cached copies
+        media_cache = get_media_cache()
+
+        def fetch_source(video):
+            with track(f"source {os.path.basename(video)}"), contextlib.ExitStack() as pin:
+                path = media_cache.fetch_url(video, pins=pin)
+                # Direct uploads reach the bucket without being hashed; a repeat of stored
+                # content is swapped for the stored copy, whose renditions are then reused
+                try:
+                    video = dedupe_stored_upload(video, path)
+                except Exception as e:
+                    logging.warning(f"Could not deduplicate {video}: {e}")
+                return video, path, pin.pop_all()
+
+        local_sources = {}
+        stored_videos = []
+        with ThreadPoolExecutor() as executor:
+            for video, path, pin in executor.map(bind(fetch_source), short_videos + large_videos):
+                source_pins.enter_context(pin)
+                local_sources[video] = path
+                stored_videos.append(video)
+        if stored_videos != short_videos + large_videos:
+            short_videos, large_videos = stored_videos[:len(short_videos)], stored_videos[len(short_videos):]
+            MergeTask.objects.filter(task_id=task_id).update(
+                short_video_path=short_videos, large_video_paths=large_videos
+            )
 
-    valid_preprocessed_large_files = []
-    valid_large_names = []
-    for pre_file, lname in zip(preprocessed_large_files, large_video_names):
-        w, h = check_video_format_resolution(pre_file)
-        if w and h:
-            valid_preprocessed_large_files.append(pre_file)
-            valid_large_names.append(lname)
-        else:
-            logging.error(f"Preprocessed file {pre_file} does not contain a valid video stream.")
+        # Determine reference resolution from the first large video
+        ref_resolution = check_video_format_resolution(local_sources[large_videos[0]])
+        if not ref_resolution or not ref_resolution[0] or not ref_resolution[1]:
+            logging.error("Invalid reference resolution. Cannot preprocess videos.")
+            merge_task.status = 'failed'
+            merge_task.save(update_fields=['status'])
+            return
+
+        reference_resolution = ref_resolution
+        logging.info(f"Reference resolution: {reference_resolution}")
+
+        # Intermediates and outputs go to a workspace of this task only, admitted once the
+        # scratch volume has room for them
+        required_bytes = estimate_workspace_bytes(
+            [local_sources[video] for video in short_videos],
+            [local_sources[video] for video in large_videos]
+        )
 
-    if not valid_preprocessed_large_files:
-        logging.error("No valid preprocessed large videos available for concatenation.")
-        merge_task.status = 'failed'
-        merge_task.save()
+        # Small merges skip the intermediates: every output is scaled, conformed and
+        # concatenated from the original sources in a single filtergraph. Larger ones
+        # preprocess each source once and reuse it for all of its pairs.
+        fused = len(short_videos) * len(large_videos) <= getattr(settings, 'MERGER_FUSED_MAX_PAIRS', 4)
+
+        def mark_queued():
+            MergeTask.objects.filter(task_id=task_id).update(status='queued')
+
+        with get_workspace_manager().workspace(task_id, required_bytes, on_wait=mark_queued) as workspace, \
+                ThreadPoolExecutor(max_workers=2) as rendition_executor:
+            MergeTask.objects.filter(task_id=task_id).update(status='processing')
+            # Preprocessed clips stay on disk with the outputs: upscaled to the reference
+            # resolution they can be several times the size of their sources, too large to
+            # estimate for the RAM scratch tier
+            preprocessed_dir = os.path.join(workspace, 'preprocessed')
+            os.makedirs(preprocessed_dir, exist_ok=True)
+
+            if fused:
+                valid_preprocessed_short_files = [local_sources[video] for video in short_videos]
+                valid_short_names = short_names
+                valid_preprocessed_large_files = [local_sources[video] for video in large_videos]
+                valid_large_names = large_names
+            else:
+                # Preprocess short videos
+                preprocessed_short_files = []
+                short_video_names = []
+                with ThreadPoolExecutor() as executor:
+                    futures = []
+                    for i, (video, short_name) in enumerate(zip(short_videos, short_names)):
+                        short_video_names.append(short_name)
+                        # Indexed, as deduplicated sources can share their object name
+                        preprocessed_filename = f"preprocessed_short{i}_{os.path.basename(video)}"
+                        output_file = os.path.join(preprocessed_dir, preprocessed_filename)
+                        futures.append(executor.submit(bind(preprocess_source, f"source {os.path.basename(video)}"), video, local_sources[video], output_file, reference_resolution, progress, rendition_executor))
+                        preprocessed_short_files.append(output_file)
+
+                    for future in futures:
+                        try:
+                            future.result()
+                        except Exception as e:
+                            logging.error(f"Error during preprocessing: {e}")
+                            merge_task.status = 'failed'
+                            merge_task.save(update_fields=['status'])
+                            return
+
+                # Preprocess large videos
+                preprocessed_large_files = []
+                large_video_names = []
+                with ThreadPoolExecutor() as executor:
+                    futures = []
+                    for i, (video, large_name) in enumerate(zip(large_videos, large_names)):
+                        large_video_names.append(large_name)
+                        preprocessed_filename = f"preprocessed_large{i}_{os.path.basename(video)}"
+                        output_file = os.path.join(preprocessed_dir, preprocessed_filename)
+                        futures.append(executor.submit(bind(preprocess_source, f"source {os.path.basename(video)}"), video, local_sources[video], output_file, reference_resolution, progress, rendition_executor))
+                        preprocessed_large_files.append(output_file)
+
+                    for future in futures:
+                        try:
+                            future.result()
+                        except Exception as e:
+                            logging.error(f"Error during preprocessing: {e}")
+                            merge_task.status = 'failed'
+                            merge_task.save(update_fields=['status'])
+                            return
+
+                # Validate that preprocessed videos have video and audio streams
+                valid_preprocessed_short_files = []
+                valid_short_names = []
+                for pre_file, sname in zip(preprocessed_short_files, short_video_names):
+                    w, h = check_video_format_resolution(pre_file)
+                    if w and h:
+                        valid_preprocessed_short_files.append(pre_file)
+                        valid_short_names.append(sname)
+                    else:
+                        logging.error(f"Preprocessed file {pre_file} does not contain a valid video stream.")
+
+                if not valid_preprocessed_short_files:
+                    logging.error("No valid preprocessed short videos available for concatenation.")
+                    merge_task.status = 'failed'
+                    merge_task.save(update_fields=['status'])
+                    return
+
+                valid_preprocessed_large_files = []
+                valid_large_names = []
+                for pre_file, lname in zip(preprocessed_large_files, large_video_names):
+                    w, h = check_video_format_resolution(pre_file)
+                    if w and h:
+                        valid_preprocessed_large_files.append(pre_file)
+                        valid_large_names.append(lname)
+                    else:
+                        logging.error(f"Preprocessed file {pre_file} does not contain a valid video stream.")
+
+                if not valid_preprocessed_large_files:
+                    logging.error("No valid preprocessed large videos available for concatenation.")
+                    merge_task.status = 'failed'
+                    merge_task.save(update_fields=['status'])
+                    return
+
+            # Now, concatenate each preprocessed short video with each preprocessed large video.
+            # Each output is uploaded as soon as it is written, while the other pairs keep encoding.
+            final_output_names = []
+            recorder = VideoLinkRecorder(MergeTask.objects.filter(task_id=task_id))
+            # Pairs that can be remuxed never decode anything and run one job per pair. Otherwise
+            # each large video is decoded once and split into a batch of outputs, with batches
+            # sized to the memory available to each of the concurrent jobs.
+            single_decode = not fused and not can_stream_copy(
+                valid_preprocessed_short_files + valid_preprocessed_large_files
+            )
+            concat_jobs = getattr(settings, 'MERGER_MULTI_OUTPUT_JOBS', 2) if single_decode else None
+            memory_budget = (
+                getattr(settings, 'MERGER_MULTI_OUTPUT_MEMORY_BYTES', None)
+                or available_memory_bytes() // 2
+            ) // (concat_jobs or 1)
+
+            with UploadStage(on_uploaded=recorder, thumbnails=True) as uploads, ThreadPoolExecutor(concat_jobs) as executor:
+                concat_futures = {}
+                for large_video, large_name in zip(valid_preprocessed_large_files, valid_large_names):
+                    outputs = []
+                    # Concatenate each short video with the large video
+                    for short_file, sname in zip(valid_preprocessed_short_files, valid_short_names):
+                        final_output_name = f"{sname}_{large_name}.mp4"
+                        final_output = os.path.join(workspace, final_output_name)
+                        outputs.append((final_output, final_output_name))
+                        final_output_names.append(final_output_name)
+
+                    if single_decode:
+                        batches = plan_multi_output_batches(valid_preprocessed_short_files, large_video, memory_budget)
+                    else:
+                        batches = [[i] for i in range(len(outputs))]
+                    for batch in batches:
+                        # Each job is a timeline track named after the pairs it writes
+                        pairs = f"pair {', '.join(os.path.splitext(outputs[i][1])[0] for i in batch)}"
+                        if fused:
+                            future = executor.submit(
+                                bind(merge_videos_fused, pairs),
+                                [valid_preprocessed_short_files[batch[0]], large_video],
+                                outputs[batch[0]][0],
+                                reference_resolution,
+                                progress
+                            )
+                            concat_futures[future] = [outputs[batch[0]]]
+                            continue
+                        future = executor.submit(
+                            bind(concatenate_videos_multi_output, pairs),
+                            [valid_preprocessed_short_files[i] for i in batch],
+                            large_video,
+                            [outputs[i][0] for i in batch],
+                            progress
+                        )
+                        concat_futures[future] = [outputs[i] for i in batch]
+
+                for future in as_completed(concat_futures):
+                    try:
+                        future.result()
+                    except Exception as e:
+                        logging.error(f"Error during concatenation: {e}")
+                        merge_task.status = 'failed'
+                        merge_task.save(update_fields=['status'])
+                        return
+                    for final_output, final_output_name in concat_futures[future]:
+                        # A failed concatenation removes its output, there is nothing to upload then
+                        if os.path.exists(final_output):
+                            s3_key = f"output_merger_videos/task_{task_id}/{final_output_name}"
+                            with track(f"pair {os.path.splitext(final_output_name)[0]}"):
+                                uploads.submit(final_output, s3_key, final_output_name)
+
+            # Keep the links in the order of the merge matrix
+            uploaded = {video['file_name']: video for video in recorder.video_links}
+            updated_video_links = [uploaded[name] for name in final_output_names if name in uploaded]
+    except Exception as e:
+        # Source downloads, workspace admission and uploads raise out of the pipeline;
+        # the task must still end so its progress stream closes
+        logging.error(f"Error processing merge task {task_id}: {e}")
+        MergeTask.objects.filter(task_id=task_id).update(status='failed')
         return
-
-    # Now, concatenate each preprocessed short video with each preprocessed large video
-    final_output_files = []
-    with ThreadPoolExecutor() as executor:
-        concat_futures = []
-        for large_video, large_name in zip(valid_preprocessed_large_files, valid_large_names):
-            # Concatenate each short video with the large video
-            for short_file, sname in zip(valid_preprocessed_short_files, valid_short_names):
-                # Remove 'preprocessed_' prefix for naming
-                short_base = os.path.splitext(os.path.basename(short_file))[0].replace('preprocessed_', '')
-                large_base = os.path.splitext(os.path.basename(large_video))[0].replace('preprocessed_', '')
-                final_output_name = f"{short_base}_{large_base}.mp4"
-                final_output = os.path.join(settings.OUTPUT_FOLDER, final_output_name)
-                concat_futures.append(
-                    executor.submit(concatenate_videos, [short_file, large_video], final_output, merge_task)
-                )
-
-                # Store relative paths
-                relative_output = os.path.relpath(final_output, settings.MEDIA_ROOT)
-                final_output_files.append({
-                    'video_link': relative_output.replace('\\', '/'),  # Ensure URL-friendly paths
-                    'file_name': final_output_name
-                })
-
-        for future in concat_futures:
-            try:
-                future.result()
-            except Exception as e:
-                logging.error(f"Error during concatenation: {e}")
-                merge_task.status = 'failed'
-                merge_task.save()
-                return
-    updated_video_links = []
-    for video in final_output_files:
-            video_file_path = video.get('video_link')
-            video_file_name = video.get('file_name')
-            if video_file_path:
-                s3_key = f"output_merger_videos/task_{task_id}/{video_file_name}"
-                video_url = upload_to_s3(video_file_path, settings.AWS_STORAGE_BUCKET_NAME, s3_key)
-                updated_video_links.append({
-                    "file_name": video_file_name,
-                    "video_link": video_url
-                })
+    finally:
+        progress.stop()
+        source_pins.close()
 
     logging.info("Video processing complete!")
     merge_task.status = 'completed'
     merge_task.video_links = updated_video_links
-    merge_task.save()
-    
-    try:
-        # Delete temporary files
-        if os.path.exists(settings.OUTPUT_FOLDER):
-            shutil.rmtree(settings.OUTPUT_FOLDER)
-            print(f"Directory '{settings.OUTPUT_FOLDER}' removed successfully.")
-        else:
-            print(f"Directory '{settings.OUTPUT_FOLDER}' does not exist.")
-    except Exception as e:
-        print(f"Error removing directory '{settings.OUTPUT_FOLDER}': {e}")
-        
-        
-        
-        
+    merge_task.save(update_fields=['status', 'video_links'])
+
+
 
 
 @login_required
@@ -592,38 +951,6 @@ def index(request):
 
 
 
-def upload_to_s3(file_path, bucket_name, s3_key):
-    """
-    Upload a file to an S3 bucket and return the URL.
-    Args:
-        file_path: Path to the file on the local filesystem.
-        bucket_name: Name of the S3 bucket.
-        s3_key: Path in the S3 bucket where the file will be stored.
-
-    Returns:
-        str: URL of the uploaded file.
-    """
-    try:
-        s3_client = boto3.client(
-            's3',
-            aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
-            aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
-            region_name=settings.AWS_S3_REGION_NAME
-        )
-        s3_client.upload_file(
-            Filename=file_path,
-            Bucket=bucket_name,
-            Key=s3_key
-        )
-        file_url = f"https://{bucket_name}.s3.{settings.AWS_S3_REGION_NAME}.amazonaws.com/{s3_key}"
-        logging.info(f"File uploaded to S3: {file_url}")
-        return file_url
-    except Exception as e:
-        logging.error(f"Error uploading to S3: {e}")
-        raise
-
-
-
 @require_POST
 @login_required
 def upload_files(request):
@@ -631,7 +958,7 @@ def upload_files(request):
     Handles the upload of short and large videos and saves them to S3.
     """
     # Validate file sizes
-    max_upload_size = getattr(settings, 'FILE_UPLOAD_MAX_MEMORY_SIZE', 10485760)  # Default 10MB
+    max_upload_size = getattr(settings, 'MERGER_MAX_UPLOAD_SIZE', 1073741824)  # Default 1GB
     for file in request.FILES.getlist('large_videos'):
         if file.size > max_upload_size:
             messages.error(request, "One of the large videos exceeds the maximum allowed size.")
@@ -651,47 +978,37 @@ def upload_files(request):
 
     short_video_urls = []
     large_video_urls = []
+    source_names = {'short': [], 'large': []}
 
-    bucket_name = settings.AWS_STORAGE_BUCKET_NAME  # Replace with your S3 bucket name
     upload_dir = f"merger_upload_video/{task_id}"  # Directory in S3 for this task
 
     # Save and upload short videos to S3
     for file in short_videos:
         original_filename = sanitize_filename(file.name)
-        local_file_path = f"/tmp/{original_filename}"
-        with open(local_file_path, 'wb+') as f:
-            for chunk in file.chunks():
-                f.write(chunk)
-
         s3_key = f"{upload_dir}/short_videos/{original_filename}"
         try:
-            url = upload_to_s3(local_file_path, bucket_name, s3_key)
+            # Stored once per content; a repeat upload reuses the stored copy
+            url = store_upload(file, s3_key)
             short_video_urls.append(url)
+            source_names['short'].append(os.path.splitext(original_filename)[0])
         except Exception as e:
             logging.error(f"Error uploading short video {original_filename}: {e}")
             messages.error(request, f"Error uploading short video {original_filename}.")
             return redirect(reverse('merger:index'))
-        finally:
-            os.remove(local_file_path)  # Clean up the temporary file
 
     # Save and upload large videos to S3
     for file in large_videos:
         original_filename = sanitize_filename(file.name)
-        local_file_path = f"/tmp/{original_filename}"
-        with open(local_file_path, 'wb+') as f:
-            for chunk in file.chunks():
-                f.write(chunk)
-
         s3_key = f"{upload_dir}/large_videos/{original_filename}"
         try:
-            url = upload_to_s3(local_file_path, bucket_name, s3_key)
+            # Stored once per content; a repeat upload reuses the stored copy
+            url = store_upload(file, s3_key)
             large_video_urls.append(url)
+            source_names['large'].append(os.path.splitext(original_filename)[0])
         except Exception as e:
             logging.error(f"Error uploading large video {original_filename}: {e}")
             messages.error(request, f"Error uploading large video {original_filename}.")
             return redirect(reverse('merger:index'))
-        finally:
-            os.remove(local_file_path)  # Clean up the temporary file
 
     logging.info(f'Short video URLs: {short_video_urls}')
     logging.info(f'Large video URLs: {large_video_urls}')
@@ -700,20 +1017,168 @@ def upload_files(request):
     merge_task = MergeTask.objects.get(task_id=task_id)
     merge_task.short_video_path = short_video_urls
     merge_task.large_video_paths = large_video_urls
+    merge_task.source_names = source_names
     merge_task.save()
 
-    # Calculate total frames for progress tracking
-    total_short_video_frames = sum(ffprobe_get_frame_count(url) for url in short_video_urls)
-    total_long_video_frames = sum(ffprobe_get_frame_count(url) for url in large_video_urls)
-    total_frames = total_short_video_frames + (len(large_videos) * total_short_video_frames) + (len(short_videos) * total_long_video_frames)
-    merge_task.total_frames = total_frames if total_frames > 0 else 1
-    merge_task.save()
+    # Probe in the background so the browser gets its taskId as soon as the files are stored
+    thread = threading.Thread(
+        target=probe_uploaded_videos, args=(task_id, short_video_urls, large_video_urls)
+    )
+    thread.start()
 
     return JsonResponse({'taskId': task_id})
 
 
 
 
+def merger_upload_prefix(task_id, role):
+    """
+    S3 prefix under which a task's uploads of the given role ('short' or 'large') are stored.
+    """
+    return f"merger_upload_video/{task_id}/{role}_videos/"
+
+
+
+def abort_direct_uploads(uploads):
+    """
+    Aborts multipart uploads ({"key", "uploadId"}), logging the ones S3 refuses to abort.
+    """
+    for upload in uploads:
+        try:
+            abort_multipart_upload(upload['key'], upload['uploadId'])
+        except Exception as e:
+            logging.error(f"Error aborting upload {upload['key']}: {e}")
+
+
+
+@require_POST
+@login_required
+def direct_upload_start(request):
+    """
+    Creates a merge task and presigned multipart uploads so the browser can send the
+    videos straight to S3, in parallel parts, without streaming them through Django.
+    Expects JSON: {"files": [{"name", "size", "type", "role": "short" | "large"}]}
+    """
+    try:
+        files = json.loads(request.body).get('files', [])
+    except ValueError:
+        return JsonResponse({'error': 'Invalid request body.'}, status=400)
+
+    if not any(f.get('role') == 'short' for f in files) or not any(f.get('role') == 'large' for f in files):
+        return JsonResponse({'error': 'Upload at least one hook and one large video.'}, status=400)
+
+    max_upload_size = getattr(settings, 'MERGER_MAX_UPLOAD_SIZE', 1073741824)
+    sizes = []
+    for f in files:
+        if f.get('role') not in ('short', 'large'):
+            return JsonResponse({'error': 'Invalid file role.'}, status=400)
+        size = parse_upload_size(f.get('size'))
+        if size is None:
+            return JsonResponse({'error': 'Invalid file size.'}, status=400)
+        if f.get('role') == 'large' and size > max_upload_size:
+            return JsonResponse({'error': 'One of the large videos exceeds the maximum allowed size.'}, status=400)
+        sizes.append(size)
+
+    task_id = generate_task_id()
+    MergeTask.objects.create(task_id=task_id, status='processing')
+    logging.info(f'A Merge Task object created for direct upload, merge task id --> {task_id}')
+
+    uploads = []
+    for f, size in zip(files, sizes):
+        s3_key = merger_upload_prefix(task_id, f['role']) + sanitize_filename(f.get('name', 'video.mp4'))
+        upload = start_multipart_upload(
+            s3_key, size, f.get('type') or 'application/octet-stream'
+        )
+        upload['role'] = f['role']
+        uploads.append(upload)
+
+    return JsonResponse({'taskId': task_id, 'uploads': uploads})
+
+
+
+@require_POST
+@login_required
+def direct_upload_complete(request):
+    """
+    Completes the multipart uploads started by direct_upload_start and registers the
+    objects on the merge task.
+    Expects JSON: {"taskId", "uploads": [{"key", "uploadId", "role", "parts": [{"PartNumber", "ETag"}]}]}
+    """
+    try:
+        body = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({'error': 'Invalid request body.'}, status=400)
+
+    task_id = body.get('taskId')
+    merge_task = get_object_or_404(MergeTask, task_id=task_id)
+
+    uploads = body.get('uploads', [])
+    for upload in uploads:
+        role = upload.get('role')
+        if role not in ('short', 'large') or not upload.get('key', '').startswith(merger_upload_prefix(task_id, role)) \
+                or not upload.get('uploadId'):
+            return JsonResponse({'error': 'Invalid upload key.'}, status=400)
+
+    short_video_urls = []
+    large_video_urls = []
+    source_names = {'short': [], 'large': []}
+    for i, upload in enumerate(uploads):
+        role = upload['role']
+        try:
+            url = complete_multipart_upload(upload['key'], upload['uploadId'], upload.get('parts', []))
+        except Exception as e:
+            logging.error(f"Error completing upload {upload['key']}: {e}")
+            # The task can't run without this source: drop the parts of the uploads left
+            abort_direct_uploads(uploads[i:])
+            merge_task.status = 'failed'
+            merge_task.save(update_fields=['status'])
+            return JsonResponse({'error': 'Error completing the upload.'}, status=500)
+        (short_video_urls if role == 'short' else large_video_urls).append(url)
+        # Keys are named after the uploaded files (see direct_upload_start); they are
+        # deduplicated once processing has the sources on disk
+        source_names[role].append(os.path.splitext(os.path.basename(upload['key']))[0])
+
+    merge_task.short_video_path = short_video_urls
+    merge_task.large_video_paths = large_video_urls
+    merge_task.source_names = source_names
+    merge_task.save(update_fields=['short_video_path', 'large_video_paths', 'source_names'])
+
+    thread = threading.Thread(
+        target=probe_uploaded_videos, args=(task_id, short_video_urls, large_video_urls)
+    )
+    thread.start()
+
+    return JsonResponse({'taskId': task_id})
+
+
+
+@require_POST
+@login_required
+def direct_upload_abort(request):
+    """
+    Aborts the multipart uploads of a failed direct upload so no orphaned parts stay stored.
+    Expects JSON: {"taskId", "uploads": [{"key", "uploadId", "role"}]}
+    """
+    try:
+        body = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({'error': 'Invalid request body.'}, status=400)
+
+    task_id = body.get('taskId')
+    merge_task = get_object_or_404(MergeTask, task_id=task_id)
+    abort_direct_uploads([
+        upload for upload in body.get('uploads', [])
+        if upload.get('role') in ('short', 'large')
+        and upload.get('key', '').startswith(merger_upload_prefix(task_id, upload['role']))
+    ])
+
+    merge_task.status = 'failed'
+    merge_task.save(update_fields=['status'])
+    return JsonResponse({'taskId': task_id})
+
+
+
+
 @login_required
 def processing(request, task_id):
     """
@@ -730,6 +1195,7 @@ def processing(request, task_id):
             "You don't have enough merge credits, buy and try again!", status=403
         )
 
+    MergeTask.objects.filter(task_id=task_id).update(queued_at=timezone.now())
     thread = threading.Thread(target=process_videos, args=(task_id,))
     thread.start()
 
@@ -749,12 +1215,7 @@ def get_progress(request, task_id):
     Returns the progress of the video processing task.
     """
     merge_task = get_object_or_404(MergeTask, task_id=task_id)
-    if merge_task.total_frames == 0:
-        progress = 0
-    else:
-        progress = int(min(1, (merge_task.total_frames_done / merge_task.total_frames)) * 100)
-
-    return JsonResponse({'progress': progress})
+    return JsonResponse({'progress': merge_task.progress})
 
 
 
@@ -772,6 +1233,45 @@ def check_task_status(request, task_id):
 
 
 
+
+def fetch_task_states(task_ids):
+    merge_tasks = MergeTask.objects.filter(task_id__in=task_ids).only(
+        'task_id', 'status', 'video_links', 'total_frames', 'total_frames_done'
+    )
+    return {
+        merge_task.task_id: {
+            'status': merge_task.status,
+            'progress': merge_task.progress,
+            'video_links': merge_task.video_links,
+        }
+        for merge_task in merge_tasks
+    }
+
+
+# One status query per interval for all open task_events streams
+task_state_poller = TaskStatePoller(fetch_task_states)
+
+
+async def task_events(request, task_id):
+    """
+    Server-Sent Events stream pushing status, progress and newly finished videos.
+    Replaces client polling of get_progress/check_status; runs as an async view under ASGI.
+    """
+    if not await is_authenticated(request):
+        return HttpResponse("Authentication required", status=401)
+
+    if task_id not in await task_state_poller.fetch([task_id]):
+        return HttpResponse("Task not found.", status=404)
+
+    response = StreamingHttpResponse(
+        task_event_stream(task_state_poller, task_id), content_type='text/event-stream'
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # disable proxy buffering (nginx)
+    return response
+
+
+
 @login_required
 def processing_successful(request, task_id):
     """
@@ -781,7 +1281,8 @@ def processing_successful(request, task_id):
     return render(
         request, 'merger/processing_successful.html', {
             'task_id': task_id,
-            'video_links': task.video_links
+            'video_links': task.video_links,
+            'page_obj': result_page(task.video_links, request.GET.get('page')),
         }
     )
 
@@ -790,29 +1291,17 @@ def processing_successful(request, task_id):
 @login_required
 def download_video(request):
     """
-    Downloads a video from S3 using a pre-signed URL.
-    
+    Download one output video of a task.
+    Redirects to a short-lived presigned S3 URL instead of streaming the file through
+    the web worker; local outputs are served with Range support.
     """
     videopath = request.GET.get('videopath', None)
     if not videopath:
         return HttpResponse("No video path provided", status=400)
-    parsed_url = urlparse(videopath)
-    bucket_name = parsed_url.netloc.split('.')[0]
-    object_key = parsed_url.path.lstrip('/')
-    presigned_url = generate_presigned_url(bucket_name, object_key)
-    if not presigned_url:
-        return HttpResponse("Unable to generate download link", status=500)
-    try:
-        response = requests.get(presigned_url, stream=True)
-        if response.status_code == 200:
-            content_type = response.headers.get('Content-Type', 'application/octet-stream')
-            response_stream = HttpResponse(response.iter_content(chunk_size=1024), content_type=content_type)
-            response_stream['Content-Disposition'] = f'attachment; filename="{os.path.basename(object_key)}"'
-            return response_stream
-        else:
-            return HttpResponse("Failed to download video from S3", status=response.status_code)
-    except Exception as e:
-        return HttpResponse(f"Error while downloading the file: {str(e)}", status=500)   
+    # Only links recorded on a task can be downloaded
+    if not MergeTask.objects.filter(video_links__contains=[{'video_link': videopath}]).exists():
+        raise Http404("Unknown video")
+    return download_response(request, videopath, "output_merger_videos/")
 
 
 
@@ -820,28 +1309,10 @@ def download_video(request):
 @login_required
 def download_zip(request, task_id):
     """
-    Creates and serves a ZIP archive of all processed videos for a given task.
+    Streams a ZIP archive of all processed videos for a given task, reading them
+    from storage as the archive is sent.
     """
     task = get_object_or_404(MergeTask, task_id=task_id)
     videos = task.video_links or []
 
-    zip_buffer = io.BytesIO()
-    with zipfile.ZipFile(zip_buffer, 'w') as zip_file:
-        for video in videos:
-            # process the video for each video link
-            video_link = video.get('video_link')
-            if video_link:
-                absolute_video_path = os.path.join(settings.MEDIA_ROOT, video_link)
-                if os.path.exists(absolute_video_path):
-                    file_name = os.path.basename(absolute_video_path)
-                    try:
-                        zip_file.write(absolute_video_path, file_name)
-                    except Exception as e:
-                        logging.error(f"Error adding {absolute_video_path} to zip: {e}")
-                else:
-                    logging.warning(f"Video file for zipping not found: {absolute_video_path}")
-
-    zip_buffer.seek(0)
-    response = HttpResponse(zip_buffer, content_type='application/zip')
-    response['Content-Disposition'] = 'attachment; filename="final_videos.zip"'
-    return response
\ No newline at end of file
+    return zip_download_response(request, videos, 'final_videos.zip')
\ No newline at end of file